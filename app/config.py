@@ -1,29 +1,123 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv('.local.env', override=True)
-
-class Config:
-    AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-    AZURE_OPENAI_URL = os.getenv("AZURE_OPENAI_URL")
-    AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_EASTUS2_API_VERSION", "2024-02-15-preview")
-    AZURE_OPENAI_MODEL = os.getenv("AZURE_OPENAI_MODEL", "gpt-4o")
-    AZURE_STORAGE_ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
-    AZURE_STORAGE_ACCOUNT_KEY = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
-    AZURE_STORAGE_ENDPOINT_SUFFIX = "core.windows.net"
-    AZURE_STORAGE_USERS_TABLE_NAME = "users"
-    AZURE_STORAGE_PROJECTS_TABLE_NAME = "projects"
-    AZURE_STORAGE_MESSAGES_TABLE_NAME = "messages"
-    AZURE_STORAGE_CONTEXTS_TABLE_NAME = "contexts"
-    AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER = "contexts"
-    AZURE_STORAGE_CONVERSATIONS_TABLE_NAME = "conversations"
-    AZURE_STORAGE_SIGNUP_CODES_TABLE_NAME = "signupCodes"
-    SECRET_KEY = os.getenv("SECRET_KEY")
-    TOKEN_DURATION = int(os.getenv("TOKEN_DURATION", 0))
-    MAX_TOKENS = int(os.getenv("MAX_TOKENS", 0))
-    MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", 16000))
-
-    @classmethod
-    def serialize(cls):
-        return {key: value for key, value in cls.__dict__.items() if not key.startswith('__') and not callable(value)}
-
+import os
+from dotenv import load_dotenv
+
+load_dotenv('.local.env', override=True)
+
+class Config:
+    AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+    AZURE_OPENAI_URL = os.getenv("AZURE_OPENAI_URL")
+    AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_EASTUS2_API_VERSION", "2024-02-15-preview")
+    AZURE_OPENAI_MODEL = os.getenv("AZURE_OPENAI_MODEL", "gpt-4o")
+    AZURE_STORAGE_ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+    AZURE_STORAGE_ACCOUNT_KEY = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+    AZURE_STORAGE_ENDPOINT_SUFFIX = "core.windows.net"
+    AZURE_STORAGE_USERS_TABLE_NAME = "users"
+    AZURE_STORAGE_PROJECTS_TABLE_NAME = "projects"
+    AZURE_STORAGE_MESSAGES_TABLE_NAME = "messages"
+    AZURE_STORAGE_CONTEXTS_TABLE_NAME = "contexts"
+    AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER = "contexts"
+    AZURE_STORAGE_CONVERSATIONS_TABLE_NAME = "conversations"
+    AZURE_STORAGE_SIGNUP_CODES_TABLE_NAME = "signupCodes"
+    SECRET_KEY = os.getenv("SECRET_KEY")
+    TOKEN_DURATION = int(os.getenv("TOKEN_DURATION", 0))
+    MAX_TOKENS = int(os.getenv("MAX_TOKENS", 0))
+    MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", 16000))
+    # "stable_prefix" keeps the system prompt and project contexts ahead of the conversation so prompt caching can hit, "legacy" appends them to the last user message
+    PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "stable_prefix")
+    # usage (and so cached prompt tokens) on streamed replies; needs api version 2024-09-01-preview or later, so it
+    # is on by default only with such a version, older ones reject the request
+    AZURE_OPENAI_STREAM_INCLUDE_USAGE = os.getenv(
+        "AZURE_OPENAI_STREAM_INCLUDE_USAGE", str(AZURE_OPENAI_API_VERSION[:10] >= "2024-09-01")).lower() == "true"
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR")  # optional on-disk tier that survives restarts
+    LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", 10000))
+    LLM_CACHE_DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+    SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", 50))
+    SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", 512))
+    SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+    SSE_DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", 1))
+    CONVERSATION_CACHE_MAX_ENTRIES = int(os.getenv("CONVERSATION_CACHE_MAX_ENTRIES", 256))
+    CONVERSATION_CACHE_TTL_SECONDS = int(os.getenv("CONVERSATION_CACHE_TTL_SECONDS", 900))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))  # 0 disables the token budget
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+    # JSON list of {"name", "url", "api_key", "api_version", "deployment", "weight"}, defaults to the single deployment above
+    AZURE_OPENAI_ENDPOINTS = os.getenv("AZURE_OPENAI_ENDPOINTS")
+    LLM_ENDPOINT_FAILURE_THRESHOLD = int(os.getenv("LLM_ENDPOINT_FAILURE_THRESHOLD", 3))
+    LLM_ENDPOINT_EJECTION_SECONDS = float(os.getenv("LLM_ENDPOINT_EJECTION_SECONDS", 30))
+    TITLE_WORKER_CONCURRENCY = int(os.getenv("TITLE_WORKER_CONCURRENCY", 4))
+    TITLE_REQUESTS_PER_MINUTE = int(os.getenv("TITLE_REQUESTS_PER_MINUTE", 60))
+    TITLE_QUEUE_MAX_SIZE = int(os.getenv("TITLE_QUEUE_MAX_SIZE", 1000))
+    TITLE_PROMPT_MAX_TOKENS = int(os.getenv("TITLE_PROMPT_MAX_TOKENS", 256))
+    TITLE_MAX_OUTPUT_TOKENS = int(os.getenv("TITLE_MAX_OUTPUT_TOKENS", 24))
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "text" for the plain one-line format
+    LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", 2000))
+    LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", 10000))
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+    # per-module overrides, e.g. "llm_service=0.1,conversation_service=0.5"
+    LOG_DEBUG_SAMPLE_RATES = os.getenv("LOG_DEBUG_SAMPLE_RATES", "")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    # the store always keeps the capture it just wrote
+    PROFILE_MAX_CAPTURES = max(1, int(os.getenv("PROFILE_MAX_CAPTURES", 20)))
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))  # applies to newly hashed passwords only
+    BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", 2))
+    BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", 32))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 1024))
+    USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+    JIRA_TIMEOUT_SECONDS = float(os.getenv("JIRA_TIMEOUT_SECONDS", 10))
+    JIRA_MAX_CONNECTIONS = int(os.getenv("JIRA_MAX_CONNECTIONS", 20))
+    JIRA_CACHE_MAX_ENTRIES = int(os.getenv("JIRA_CACHE_MAX_ENTRIES", 1000))
+    JIRA_CACHE_TTL_SECONDS = int(os.getenv("JIRA_CACHE_TTL_SECONDS", 3600))
+    JIRA_CACHE_FRESH_SECONDS = int(os.getenv("JIRA_CACHE_FRESH_SECONDS", 30))  # served without revalidation
+    JIRA_BASE_URL = os.getenv("JIRA_BASE_URL", "https://nextech.atlassian.net").rstrip("/")
+    JIRA_SEARCH_PAGE_SIZE = int(os.getenv("JIRA_SEARCH_PAGE_SIZE", 50))
+    JIRA_SEARCH_CONCURRENCY = int(os.getenv("JIRA_SEARCH_CONCURRENCY", 4))
+    JIRA_IMPORT_MAX_ISSUES = int(os.getenv("JIRA_IMPORT_MAX_ISSUES", 500))
+    JIRA_ENRICHMENT_ENABLED = os.getenv("JIRA_ENRICHMENT_ENABLED", "true").lower() == "true"
+    JIRA_ENRICHMENT_TIMEOUT_SECONDS = float(os.getenv("JIRA_ENRICHMENT_TIMEOUT_SECONDS", 1.5))
+    JIRA_ENRICHMENT_MAX_KEYS = int(os.getenv("JIRA_ENRICHMENT_MAX_KEYS", 5))
+    JIRA_ENRICHMENT_CACHE_MAX_ENTRIES = int(os.getenv("JIRA_ENRICHMENT_CACHE_MAX_ENTRIES", 2000))
+    JIRA_ENRICHMENT_CACHE_TTL_SECONDS = int(os.getenv("JIRA_ENRICHMENT_CACHE_TTL_SECONDS", 600))
+    JIRA_ENRICHMENT_FAILURE_TTL_SECONDS = int(os.getenv("JIRA_ENRICHMENT_FAILURE_TTL_SECONDS", 3600))
+    # e.g. "SHN,OPS": only keys of these projects are looked up, so "UTF-16" or "SHA-256" never are; none disables enrichment
+    JIRA_PROJECT_KEYS = os.getenv("JIRA_PROJECT_KEYS", "")
+    WEB_SCRAPE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("WEB_SCRAPE_CONNECT_TIMEOUT_SECONDS", 5))
+    WEB_SCRAPE_READ_TIMEOUT_SECONDS = float(os.getenv("WEB_SCRAPE_READ_TIMEOUT_SECONDS", 10))
+    WEB_SCRAPE_TOTAL_TIMEOUT_SECONDS = float(os.getenv("WEB_SCRAPE_TOTAL_TIMEOUT_SECONDS", 20))
+    WEB_SCRAPE_MAX_BYTES = int(os.getenv("WEB_SCRAPE_MAX_BYTES", 5 * 1024 * 1024))  # longer pages are cut off
+    WEB_SCRAPE_MAX_CONNECTIONS = int(os.getenv("WEB_SCRAPE_MAX_CONNECTIONS", 20))
+    WEB_SCRAPE_PARSE_WORKERS = int(os.getenv("WEB_SCRAPE_PARSE_WORKERS", 2))
+    WEB_SCRAPE_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SCRAPE_CACHE_MAX_ENTRIES", 500))
+    WEB_SCRAPE_CACHE_TTL_SECONDS = int(os.getenv("WEB_SCRAPE_CACHE_TTL_SECONDS", 3600))
+    WEB_SCRAPE_CACHE_FRESH_SECONDS = int(os.getenv("WEB_SCRAPE_CACHE_FRESH_SECONDS", 300))  # served without revalidation
+    WEB_CRAWL_CONCURRENCY = int(os.getenv("WEB_CRAWL_CONCURRENCY", 8))
+    WEB_CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("WEB_CRAWL_PER_HOST_CONCURRENCY", 2))
+    WEB_CRAWL_HOST_DELAY_SECONDS = float(os.getenv("WEB_CRAWL_HOST_DELAY_SECONDS", 0.5))  # between request starts per host
+    WEB_CRAWL_MAX_PAGES = int(os.getenv("WEB_CRAWL_MAX_PAGES", 200))
+    WEB_CRAWL_MAX_DEPTH = int(os.getenv("WEB_CRAWL_MAX_DEPTH", 3))
+    CONTEXT_RETRIEVAL_ENABLED = os.getenv("CONTEXT_RETRIEVAL_ENABLED", "true").lower() == "true"
+    # projects whose contexts fit in this many tokens still send every context in full
+    CONTEXT_RETRIEVAL_MIN_TOKENS = int(os.getenv("CONTEXT_RETRIEVAL_MIN_TOKENS", 8000))
+    CONTEXT_RETRIEVAL_TOKEN_BUDGET = int(os.getenv("CONTEXT_RETRIEVAL_TOKEN_BUDGET", 6000))
+    CONTEXT_RETRIEVAL_TOP_K = int(os.getenv("CONTEXT_RETRIEVAL_TOP_K", 12))
+    CONTEXT_CHUNK_TOKENS = int(os.getenv("CONTEXT_CHUNK_TOKENS", 400))
+    CONTEXT_INDEX_MAX_PROJECTS = int(os.getenv("CONTEXT_INDEX_MAX_PROJECTS", 200))
+    CONTEXT_INDEX_TTL_SECONDS = int(os.getenv("CONTEXT_INDEX_TTL_SECONDS", 3600))
+    SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search/search.db")
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 50))
+    CONVERSATION_SNAPSHOTS_ENABLED = os.getenv("CONVERSATION_SNAPSHOTS_ENABLED", "false").lower() == "true"
+    CONVERSATION_SNAPSHOT_CONTAINER = os.getenv("CONVERSATION_SNAPSHOT_CONTAINER", AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER)
+    CONVERSATION_SNAPSHOT_INLINE_CHARS = int(os.getenv("CONVERSATION_SNAPSHOT_INLINE_CHARS", 100000))  # larger context contents stay in their own blobs
+    EXPORT_READ_WORKERS = int(os.getenv("EXPORT_READ_WORKERS", 8))
+    EXPORT_PREFETCH = int(os.getenv("EXPORT_PREFETCH", 16))
+    IMPORT_BATCH_SIZE = min(int(os.getenv("IMPORT_BATCH_SIZE", 100)), 100)  # table transactions take at most 100 operations
+    IMPORT_BATCH_MAX_BYTES = int(os.getenv("IMPORT_BATCH_MAX_BYTES", 3 * 1024 * 1024))  # and at most 4 MiB, request framing included
+    IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", 2.0))
+
+    @classmethod
+    def serialize(cls):
+        return {key: value for key, value in cls.__dict__.items() if not key.startswith('__') and not callable(value)}
+
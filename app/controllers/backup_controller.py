@@ -0,0 +1,41 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from services import AuthService
+from services.backup_service import backup_service, export_line
+from utils.logger import logger
+
+router = APIRouter()
+
+@router.get("/export/")
+async def export_data(username: Optional[str] = None, token_data: dict = Depends(AuthService.verify_jwt_token)):
+    """Streams the user's projects, conversations, messages and contexts as NDJSON; admins may export any user"""
+    target_username = username or token_data.get("username")
+    if target_username != token_data.get("username") and not token_data.get("is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized to export this user's data")
+
+    async def line_generator():
+        try:
+            async for line in backup_service.export_user(target_username):
+                yield line
+        except Exception as e:
+            # the response has started, report the failure in the stream itself
+            logger.error(f"Error exporting data for user {target_username}: {str(e)}")
+            yield export_line("error", {"detail": "Export failed"})
+
+    return StreamingResponse(
+        line_generator(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{target_username}-export.ndjson"'}
+    )
+
+@router.post("/import/")
+async def import_data(request: Request, token_data: dict = Depends(AuthService.verify_jwt_token)):
+    """Imports an export (the NDJSON request body) into the caller's account under new ids"""
+    try:
+        return await backup_service.import_user(token_data.get("username"), request.stream())
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error importing data: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
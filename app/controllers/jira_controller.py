@@ -1,19 +1,46 @@
-from fastapi import APIRouter, HTTPException, Depends
-from integrations.jira import JiraIntegration
-from models.chat import User
-from services.user_service import UserService
-
-router = APIRouter()
-jira_integration = JiraIntegration()
-user_service = UserService()
-
-@router.get("/jira/story/{story_key}")
-async def get_story_description(
-    story_key: str, 
-    current_user: User = Depends(user_service.get_current_user)
-):
-    try:
-        description = jira_integration.get_story_description(story_key, current_user)
-        return {"description": description}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+from fastapi import APIRouter, HTTPException, Depends
+from integrations.jira import JiraIntegration, issue_to_context
+from models import JiraImportRequest
+from models.chat import User
+from services import ContextService, ProjectService
+from services.user_service import UserService
+from utils.logger import logger
+
+router = APIRouter()
+jira_integration = JiraIntegration()
+user_service = UserService()
+context_service = ContextService()
+project_service = ProjectService()
+
+@router.get("/jira/story/{story_key}")
+async def get_story_description(
+    story_key: str, 
+    current_user: User = Depends(user_service.get_current_user)
+):
+    try:
+        description = await jira_integration.get_story_description(story_key, current_user)
+        return {"description": description}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jira/import/")
+async def import_issues(
+    request: JiraImportRequest,
+    current_user: User = Depends(user_service.get_current_user)
+):
+    try:
+        project = await project_service.get_project_metadata(request.project_id)
+        if project.username != current_user.username and not current_user.is_admin:
+            raise HTTPException(status_code=403, detail="Not authorized to add contexts to this project")
+        jql = request.jql or jira_integration.issues_jql(request.keys)
+        issues = await jira_integration.search_issues(jql, current_user, max_results=request.max_issues)
+        contexts = [issue_to_context(issue, request.project_id, request.pinned) for issue in issues]
+        saved = await context_service.save_contexts(contexts)
+        logger.info(f"Imported {len(saved)} Jira issues into project {request.project_id}")
+        return {"imported": len(saved), "contexts": saved}
+    except HTTPException as e:
+        raise e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,64 +1,208 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
-from models import ChatRequest, ChatResponse, DescriptionRequest, Context
-from services.llm_service import chat_with_llm_stream, query_llm, generate_conversation_description_with_llm
-from services import AuthService, ProjectService, ContextService
-from utils.logger import logger
-
-router = APIRouter()
-context_service = ContextService()
-project_service = ProjectService()
-
-async def get_project_contexts(project_id: str):
-    project_contexts = await context_service.get_contexts_by_project_id(project_id)
-    project = await project_service.get_project(project_id)
-    project_contexts.append(Context(
-        type="project_description",
-        content=project.description,
-        name=project.name,
-        project_id=project.project_id
-    ))
-    
-    return project_contexts
-
-@router.post("/llm-query/", response_model=ChatResponse)
-async def llm_query(request: ChatRequest, token_data: dict = Depends(AuthService.verify_jwt_token)):
-    logger.info(f"Received chat request")
-    try:
-        response = await query_llm(request.prompt)
-        logger.info("Successfully processed chat request")
-        return ChatResponse(response=response)
-    except Exception as e:
-        logger.error(f"Error processing chat request: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-
-@router.post("/llm-query/stream/")
-async def llm_query_stream(request: ChatRequest, token_data: dict = Depends(AuthService.verify_jwt_token)):
-    logger.info(f"Received streaming chat request")
-    try:
-        project_contexts = await get_project_contexts(request.project_id) if request.project_id else []
-
-        async def event_generator():
-            async for token in chat_with_llm_stream(request.messages, project_contexts):
-                yield f"{token}"
-            yield "[DONE]"
-            
-        return StreamingResponse(
-            event_generator(),
-            media_type="text/event-stream"
-        )
-    except Exception as e:
-        logger.error(f"Error processing streaming chat request: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-
-@router.post("/llm-query/description")
-async def llm_generate_description(request: DescriptionRequest, token_data: dict = Depends(AuthService.verify_jwt_token)):
-    logger.info(f"Received request to generate description")
-    project_contexts = await get_project_contexts(request.project_id) if request.project_id else []
-    try:
-        description = await generate_conversation_description_with_llm(request.prompt, project_contexts)
-        logger.info("Successfully generated description")
-        return {"description": description}
-    except Exception as e:
-        logger.error(f"Error generating description: {str(e)}")
+import asyncio
+import time
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from fastapi.responses import StreamingResponse
+from models import ChatRequest, ChatResponse, DescriptionRequest, Context, Message
+from services.llm_service import chat_with_llm_stream, query_llm, generate_conversation_description_with_llm
+from services.prompt_packer import count_tokens
+from services import AuthService, ProjectService, ContextService, ConversationService
+from services.jira_enrichment import jira_story_contexts
+from services.context_index import context_index
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.sse import SSEStream, ClientDisconnected
+from config import Config
+from typing import Optional
+
+router = APIRouter()
+context_service = ContextService()
+project_service = ProjectService()
+conversation_service = ConversationService()
+# keeps fire-and-forget tasks referenced until they finish
+background_tasks = set()
+
+async def get_project_contexts(project_id: str):
+    project_contexts = await context_service.get_contexts_by_project_id(project_id)
+    project = await project_service.get_project(project_id)
+    project_contexts.append(Context(
+        type="project_description",
+        content=project.description,
+        name=project.name,
+        project_id=project.project_id
+    ))
+    
+    return project_contexts
+
+async def save_streamed_turn(conversation_id: str, user_message: Message, reply: str, is_partial: bool) -> Optional[list[Message]]:
+    assistant_message = Message(role="assistant", content=reply, sequence=user_message.sequence + 1, is_partial=is_partial)
+    try:
+        return await conversation_service.append_messages(conversation_id, [user_message, assistant_message])
+    except Exception as e:
+        logger.error(f"Error saving streamed reply for conversation {conversation_id}: {str(e)}")
+        return None
+
+def turn_message_ids(saved_messages: Optional[list[Message]]) -> Optional[dict]:
+    return {message.role: message.message_id for message in saved_messages} if saved_messages else None
+
+def save_partial_turn_in_background(conversation_id: str, user_message: Optional[Message], sse: SSEStream):
+    # the client went away: keep what it saw, marked as partial, from a separate task so the write
+    # survives the cancellation of the response
+    if user_message is not None:
+        task = asyncio.create_task(save_streamed_turn(conversation_id, user_message, ''.join(sse.text), True))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+def record_cancelled_stream(sse: SSEStream):
+    received_tokens = count_tokens(''.join(sse.text))
+    # what the rest of the answer would have cost, judged by the completions that did finish
+    expected_tokens = metrics.average("llm.stream.completion_tokens", Config.MAX_OUTPUT_TOKENS)
+    saved_tokens = max(0, round(expected_tokens - received_tokens))
+    metrics.increment("llm.stream.cancelled")
+    metrics.increment("llm.stream.cancelled_saved_tokens", saved_tokens)
+    logger.info(f"Client disconnected from stream after {received_tokens} tokens, cancelled upstream completion (~{saved_tokens} tokens saved)")
+
+# Clients can skip the LLM response cache with "X-LLM-Cache: bypass" or "Cache-Control: no-cache"
+def use_llm_cache(x_llm_cache: Optional[str] = Header(None), cache_control: Optional[str] = Header(None)) -> bool:
+    return (x_llm_cache or '').lower() != 'bypass' and 'no-cache' not in (cache_control or '').lower()
+
+@router.post("/llm-query/", response_model=ChatResponse)
+async def llm_query(request: ChatRequest, token_data: dict = Depends(AuthService.verify_jwt_token), use_cache: bool = Depends(use_llm_cache)):
+    logger.info(f"Received chat request")
+    try:
+        response = await query_llm(request.prompt, use_cache, token_data.get("username"))
+        logger.info("Successfully processed chat request")
+        return ChatResponse(response=response)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error processing chat request: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def parse_chat_request(http_request: Request) -> ChatRequest:
+    # validated by hand so the cost of large, history-carrying bodies shows up in the logs
+    body = await http_request.body()
+    started = time.perf_counter()
+    try:
+        request = ChatRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    validation_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Chat request body: {len(body)} bytes, validated in {validation_ms:.1f} ms, "
+                f"{'conversation id' if request.message is not None else 'full history'} request")
+    metrics.observe("llm.request.body_bytes", len(body))
+    metrics.observe("llm.request.validation_ms", validation_ms)
+    return request
+
+@router.post("/llm-query/stream/")
+async def llm_query_stream(http_request: Request, token_data: dict = Depends(AuthService.verify_jwt_token), use_cache: bool = Depends(use_llm_cache)):
+    logger.info(f"Received streaming chat request")
+    request = await parse_chat_request(http_request)
+    try:
+        user_message = None
+        messages = request.messages
+        project_id = request.project_id
+        if request.message is not None:
+            # history comes from the conversation cache, the client only sent the new turn
+            conversation = await conversation_service.get_cached_conversation(request.conversation_id)
+            if conversation.username != token_data.get("username"):
+                raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
+            user_message = request.message
+            if user_message.role != 'user':
+                raise HTTPException(status_code=400, detail="Only user messages can be sent")
+            if conversation.messages and user_message.sequence <= conversation.messages[-1].sequence:
+                user_message.sequence = conversation.messages[-1].sequence + 1
+            messages = conversation.messages + [user_message]
+            project_id = project_id or conversation.project_id
+        elif request.conversation_id:
+            conversation = await conversation_service.get_conversation_summary(request.conversation_id)
+            if conversation.username != token_data.get("username"):
+                raise HTTPException(status_code=403, detail="Not authorized to update this conversation")
+            new_user_messages = [message for message in request.messages if message.role == 'user' and message.message_id is None]
+            if not new_user_messages:
+                raise HTTPException(status_code=400, detail="No new user message to save")
+            user_message = max(new_user_messages, key=lambda message: message.sequence)
+
+        # Jira stories mentioned in the new message are fetched while the project contexts load
+        latest_user_message = user_message or next((message for message in reversed(messages) if message.role == 'user'), None)
+        query = latest_user_message.content if latest_user_message else ""
+        project_contexts, story_contexts = await asyncio.gather(
+            get_project_contexts(project_id) if project_id else asyncio.sleep(0, []),
+            jira_story_contexts(query, token_data.get("username"))
+        )
+        # stories already imported into the project are not attached twice
+        imported = {context.name.split(':', 1)[0] for context in project_contexts if context.type == "jira" and context.name}
+        # mentioned in this message, so they go with it rather than into the prompt prefix shared by every turn
+        turn_contexts = [context for context in story_contexts if context.name.split(':', 1)[0] not in imported]
+        if project_id:
+            # large projects only send the chunks relevant to the new message, also with the message
+            project_contexts, retrieved_contexts = await context_index.select(project_id, project_contexts, query)
+            turn_contexts = retrieved_contexts + turn_contexts
+
+        async def event_generator():
+            sse = SSEStream(Config.SSE_COALESCE_MS, Config.SSE_COALESCE_BYTES, Config.SSE_HEARTBEAT_SECONDS,
+                            http_request.is_disconnected, Config.SSE_DISCONNECT_POLL_SECONDS)
+            stream_info = {}
+            error = None
+            try:
+                async for event in sse.events(chat_with_llm_stream(messages, project_contexts, use_cache, stream_info, token_data.get("username"), turn_contexts)):
+                    yield event
+            except ClientDisconnected:
+                record_cancelled_stream(sse)
+                save_partial_turn_in_background(request.conversation_id, user_message, sse)
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                # the server cancelled the response because the client went away
+                record_cancelled_stream(sse)
+                save_partial_turn_in_background(request.conversation_id, user_message, sse)
+                raise
+            except HTTPException as e:
+                logger.error(f"Error during streaming chat request: {e.detail}")
+                error = {"error": e.detail, "status": e.status_code, "retry_after": (e.headers or {}).get("Retry-After")}
+            except Exception as e:
+                logger.error(f"Error during streaming chat request: {str(e)}")
+                error = {"error": "Internal server error"}
+            if error is not None:
+                # a turn that failed before any reply (admission, upstream errors) is not saved, the client
+                # sends it again; one that failed midway is kept as partial and the client gets its ids
+                message_ids = None
+                if user_message is not None and sse.text:
+                    message_ids = turn_message_ids(await save_streamed_turn(request.conversation_id, user_message, ''.join(sse.text), True))
+                yield sse.event({**error, "message_ids": message_ids}, event="error")
+                return
+            message_ids = None
+            if user_message is not None:
+                message_ids = turn_message_ids(await save_streamed_turn(request.conversation_id, user_message, ''.join(sse.text), False))
+            usage = stream_info.get('usage') or {"completion_tokens": count_tokens(''.join(sse.text)), "estimated": True}
+            metrics.observe("llm.stream.completion_tokens", usage["completion_tokens"])
+            timing = sse.timing()
+            metrics.observe("llm.stream.events", timing["events"])
+            metrics.observe("llm.stream.tokens", timing["tokens"])
+            if timing["time_to_first_token_ms"] is not None:
+                metrics.observe("llm.stream.time_to_first_token_ms", timing["time_to_first_token_ms"])
+            yield sse.event({"usage": usage, "timing": timing, "cached": stream_info.get('cached', False), "message_ids": message_ids}, event="done")
+
+        return StreamingResponse(
+            event_generator(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error processing streaming chat request: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/llm-query/description")
+async def llm_generate_description(request: DescriptionRequest, token_data: dict = Depends(AuthService.verify_jwt_token), use_cache: bool = Depends(use_llm_cache)):
+    logger.info(f"Received request to generate description")
+    try:
+        description = await generate_conversation_description_with_llm(request.prompt, use_cache, token_data.get("username"))
+        logger.info("Successfully generated description")
+        return {"description": description}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error generating description: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error") 
\ No newline at end of file
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, HTTPException, Depends
+from services import AuthService
+from utils.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/metrics/")
+async def get_metrics(token_data: dict = Depends(AuthService.verify_jwt_token)):
+    if not token_data.get("is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized to view metrics")
+    return metrics.snapshot()
@@ -0,0 +1,55 @@
+import re
+import time
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse
+from models import ProfilingRule
+from services import AuthService
+from utils.profiling import profiling, CaptureRule
+
+router = APIRouter()
+
+def require_admin(token_data: dict = Depends(AuthService.verify_jwt_token)) -> dict:
+    if not token_data.get("is_admin", False):
+        raise HTTPException(status_code=403, detail="Not authorized to manage profiling")
+    return token_data
+
+@router.get("/profiling/")
+async def get_profiling(token_data: dict = Depends(require_admin)):
+    rule = profiling.rule
+    return {
+        "rule": rule.describe() if rule is not None else None,
+        "captures": profiling.store.list()
+    }
+
+@router.put("/profiling/")
+async def enable_profiling(request: ProfilingRule, token_data: dict = Depends(require_admin)):
+    try:
+        re.compile(request.route)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid route pattern: {str(e)}")
+    rule = CaptureRule(
+        mode=request.mode,
+        route=request.route,
+        min_duration_ms=request.min_duration_ms,
+        expires_at=time.monotonic() + request.duration_seconds,
+        max_captures=request.max_captures,
+        sample_interval_ms=request.sample_interval_ms
+    )
+    profiling.enable(rule)
+    return {"rule": rule.describe()}
+
+@router.delete("/profiling/")
+async def disable_profiling(token_data: dict = Depends(require_admin)):
+    profiling.disable()
+    return {"message": "Profiling disabled"}
+
+@router.get("/profiling/captures/{capture_id}")
+async def download_capture(capture_id: str, token_data: dict = Depends(require_admin)):
+    capture = profiling.store.get(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    meta, path = capture
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Capture not found")
+    media_type = "application/json" if meta["mode"] == "sampling" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=meta["file"])
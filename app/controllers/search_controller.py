@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from services import AuthService, ConversationService
+from services.search_index import search_index
+from config import Config
+from utils.logger import logger
+
+router = APIRouter()
+conversation_service = ConversationService()
+
+@router.get("/search/")
+async def search_conversations(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, gt=0),
+    token_data: dict = Depends(AuthService.verify_jwt_token)
+):
+    try:
+        results = await search_index.search(token_data.get("username"), q, min(limit, Config.SEARCH_MAX_RESULTS))
+        return {"query": q, "results": results}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error searching conversations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/search/reindex/")
+async def reindex_conversations(token_data: dict = Depends(AuthService.verify_jwt_token)):
+    try:
+        count = await conversation_service.reindex_search(token_data.get("username"))
+        return {"message": f"Indexed {count} conversations"}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unexpected error reindexing conversations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
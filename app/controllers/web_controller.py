@@ -1,22 +1,59 @@
-from fastapi import APIRouter, HTTPException
-import requests
-from bs4 import BeautifulSoup
-import re
-
-router = APIRouter()
-
-@router.get("/web/scrape/")
-async def scrape_web_content(url: str):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        # Extract the desired content, e.g., all text
-        content = soup.get_text()
-        # change any number of consecutive newlines to a single newline
-        content = re.sub(r'\n+', '\n', content)
-        # change any number of consecutive spaces to a single space
-        content = re.sub(r'\s+', ' ', content)
-        return {"content": content}
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Error scraping the web: {str(e)}") 
\ No newline at end of file
+import json
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from models import Context, WebBatchRequest
+from services import AuthService, ContextService, ProjectService
+from services.web_crawler import WebCrawler
+from services.web_scraper import web_scraper
+from utils.logger import logger
+
+router = APIRouter()
+context_service = ContextService()
+project_service = ProjectService()
+
+@router.get("/web/scrape/")
+async def scrape_web_content(url: str):
+    try:
+        return await web_scraper.scrape(url)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error scraping the web: {str(e)}")
+
+@router.post("/web/batch/")
+async def scrape_web_batch(request: WebBatchRequest, token_data: dict = Depends(AuthService.verify_jwt_token)):
+    """
+    Pages are streamed back as NDJSON lines as they finish. With a project_id the pages are saved as
+    project contexts instead: the lines leave out the content and a final line lists the saved contexts.
+    """
+    try:
+        if request.project_id:
+            project = await project_service.get_project_metadata(request.project_id)
+            if project.username != token_data.get("username") and not token_data.get("is_admin", False):
+                raise HTTPException(status_code=403, detail="Not authorized to add contexts to this project")
+    except HTTPException as e:
+        raise e
+
+    crawler = WebCrawler(request.max_pages, request.depth if request.seed_url else 0)
+
+    async def line_generator():
+        contexts = []
+        async for page in crawler.run(request.urls, request.seed_url, request.sitemap):
+            if request.project_id and "content" in page:
+                contexts.append(Context(
+                    type="web",
+                    name=page["title"] or page["url"],
+                    content=f"{page['url']}\n\n{page['content']}",
+                    project_id=request.project_id
+                ))
+                page = {key: value for key, value in page.items() if key != "content"}
+            yield json.dumps(page) + "\n"
+        if request.project_id:
+            try:
+                saved = await context_service.save_contexts(contexts)
+                logger.info(f"Saved {len(saved)} scraped pages to project {request.project_id}")
+                yield json.dumps({"saved": [{"context_id": context.context_id, "name": context.name} for context in saved]}) + "\n"
+            except HTTPException as e:
+                yield json.dumps({"error": e.detail, "status": e.status_code}) + "\n"
+
+    return StreamingResponse(line_generator(), media_type="application/x-ndjson")
@@ -1,68 +1,271 @@
-import os
-import re
-import requests
-from typing import Optional
-from models.chat import User
-
-class JiraIntegration:
-    def __init__(self):
-        self.base_url = 'https://nextech.atlassian.net'
-
-    def _make_request(self, method: str, endpoint: str, api_key: str, data: Optional[dict] = None) -> dict:
-        """Make a request to the Jira API"""
-        headers = {
-            "Authorization": f"Basic {api_key}",
-            "Content-Type": "application/json"
-        }
-        url = f"{self.base_url}/rest/api/latest/{endpoint}"
-        
-        try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=data,
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Error making request to Jira API: {str(e)}")
-
-    def parse_story_key(self, story: str) -> str:
-        """
-        Parse a story key from various formats:
-        - XXX-1234
-        - https://nextech.atlassian.net/browse/XXX-1234
-        - git checkout -b XXX-1234-some-text
-        """
-        # Direct format (XXX-1234)
-        if re.match(r'^[A-Z]{3}-\d{2,}$', story):
-            return story
-        
-        # URL format
-        url_match = re.search(r'https://nextech.atlassian.net/browse/([A-Z]{3}-\d{2,})', story)
-        if url_match:
-            return url_match.group(1)
-        
-        # Git branch format
-        git_match = re.search(r'git checkout -b ([A-Z]{3}-\d{2,})', story)
-        if git_match:
-            return git_match.group(1)
-        
-        raise ValueError(
-            "Invalid story format. Expected formats: "
-            "XXX-1234, https://nextech.atlassian.net/browse/XXX-1234, "
-            "or git checkout -b XXX-1234-story-summary"
-        )
-
-    def get_story_details(self, story_key: str, user: User) -> dict:
-        """Get the details of a Jira story"""
-        story_key = self.parse_story_key(story_key)
-        api_key = user.get_api_key('jira')
-        return self._make_request('GET', f'issue/{story_key}', api_key)
-
-    def get_story_description(self, story_key: str, user: User) -> str:
-        """Get just the description of a Jira story"""
-        story_details = self.get_story_details(story_key, user)
-        return story_details.get('fields', {}).get('description', '')
+import asyncio
+import hashlib
+import re
+import time
+import httpx
+from typing import Collection, List, Optional, Union
+from config import Config
+from models.chat import User
+from models.context import Context
+from utils.cache import TTLCache
+from utils.logger import logger
+from utils.metrics import metrics
+
+ISSUE_KEY_PATTERN = re.compile(r'^[A-Z][A-Z0-9]+-\d+$')
+# same shape parse_story_key accepts; browse URLs and branch names contain the key itself
+STORY_KEY_PATTERN = re.compile(r'(?<![A-Za-z0-9])([A-Z]{3}-\d{2,})(?!\d)')
+
+# wiki markup (API v2 / latest) rules, applied in order
+WIKI_RULES = [
+    (re.compile(r'\{\{([^}]+)\}\}'), r'`\1`'),
+    (re.compile(r'\{(?:code|noformat)(?::[^}]*)?\}'), ''),
+    (re.compile(r'\{(?:color|panel|quote)(?::[^}]*)?\}'), ''),
+    (re.compile(r'^h[1-6]\.\s*', re.MULTILINE), ''),
+    (re.compile(r'^bq\.\s*', re.MULTILINE), '> '),
+    (re.compile(r'^([*#]+)\s+', re.MULTILINE), lambda m: '  ' * (len(m.group(1)) - 1) + '- '),
+    (re.compile(r'\[([^|\]]+)\|([^\]]+)\]'), r'\1 (\2)'),
+    (re.compile(r'\[(https?://[^\]]+)\]'), r'\1'),
+    (re.compile(r'\[~([^\]]+)\]'), r'@\1'),
+    (re.compile(r'!([^!\s|]+)(?:\|[^!]*)?!'), ''),
+    (re.compile(r'(?<![\w*])\*(\S[^*\n]*?)\*(?![\w*])'), r'\1'),
+    (re.compile(r'(?<![\w_])_(\S[^_\n]*?)_(?![\w_])'), r'\1'),
+    (re.compile(r'^\|\|?|\|\|?$', re.MULTILINE), ''),
+    (re.compile(r'\|\|?'), ' | '),
+]
+
+ADF_BLOCKS = {"paragraph", "heading", "blockquote", "codeBlock", "rule", "panel", "tableRow", "mediaSingle"}
+
+def compact_text(text: str) -> str:
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').split('\n')]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+def wiki_to_text(markup: str) -> str:
+    """Plain text from Jira wiki markup, keeping link targets and list structure"""
+    for pattern, replacement in WIKI_RULES:
+        markup = pattern.sub(replacement, markup)
+    return compact_text(markup)
+
+def _adf_parts(node: dict, parts: list, depth: int = 0):
+    node_type = node.get("type")
+    if node_type == "text":
+        text = node.get("text", "")
+        link = next((mark.get("attrs", {}).get("href") for mark in node.get("marks", []) if mark.get("type") == "link"), None)
+        parts.append(f"{text} ({link})" if link and link != text else text)
+        return
+    if node_type == "hardBreak":
+        parts.append("\n")
+        return
+    if node_type in ("mention", "emoji", "status"):
+        parts.append(node.get("attrs", {}).get("text", ""))
+        return
+    if node_type in ("inlineCard", "blockCard"):
+        parts.append(node.get("attrs", {}).get("url", ""))
+        return
+    if node_type == "listItem":
+        parts.append("  " * (depth - 1) + "- ")
+    if node_type in ("tableCell", "tableHeader"):
+        parts.append(" | ")
+    child_depth = depth + 1 if node_type in ("bulletList", "orderedList") else depth
+    for child in node.get("content", []):
+        _adf_parts(child, parts, child_depth)
+    if node_type in ADF_BLOCKS or (node_type == "listItem" and not "".join(parts[-1:]).endswith("\n")):
+        parts.append("\n")
+
+def adf_to_text(document: dict) -> str:
+    """Plain text from an Atlassian document (API v3), keeping link targets and list structure"""
+    parts = []
+    _adf_parts(document, parts)
+    return compact_text("".join(parts))
+
+def jira_to_text(value: Union[dict, str, None]) -> str:
+    """Rich text fields arrive as ADF documents from API v3 and as wiki markup from v2 / latest"""
+    if not value:
+        return ""
+    if isinstance(value, dict):
+        return adf_to_text(value)
+    return wiki_to_text(value)
+
+def issue_to_context(issue: dict, project_id: Optional[str] = None, pinned: bool = False) -> Context:
+    fields = issue.get("fields", {})
+    summary = fields.get("summary") or ""
+    description = jira_to_text(fields.get("description"))
+    return Context(
+        type="jira",
+        name=f"{issue['key']}: {summary}",
+        content=f"{issue['key']}: {summary}\n\n{description}".strip(),
+        project_id=project_id,
+        pinned=pinned
+    )
+
+class JiraIntegration:
+    """
+    Jira REST client on one pooled async HTTP client shared by every instance.
+    GET responses are cached per user: within JIRA_CACHE_FRESH_SECONDS they are served without a
+    request, after that they are revalidated with If-None-Match / If-Modified-Since so an unchanged
+    issue costs a 304 instead of a full body.
+    """
+
+    _client: Optional[httpx.AsyncClient] = None
+    _cache = TTLCache(Config.JIRA_CACHE_MAX_ENTRIES, Config.JIRA_CACHE_TTL_SECONDS)
+
+    def __init__(self):
+        self.base_url = Config.JIRA_BASE_URL
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(Config.JIRA_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=Config.JIRA_MAX_CONNECTIONS, max_keepalive_connections=Config.JIRA_MAX_CONNECTIONS)
+            )
+        return cls._client
+
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
+    def _cache_key(self, api_key: str, url: str, params: Optional[dict]) -> str:
+        # keyed by credential, so one user's cached issues are never served to another
+        user = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+        return f"{user}:{url}?{sorted((params or {}).items())}"
+
+    async def _make_request(self, method: str, endpoint: str, api_key: str, data: Optional[dict] = None,
+                            params: Optional[dict] = None) -> dict:
+        """Make a request to the Jira API"""
+        headers = {
+            "Authorization": f"Basic {api_key}",
+            "Content-Type": "application/json"
+        }
+        url = f"{self.base_url}/rest/api/latest/{endpoint}"
+
+        cache_key = self._cache_key(api_key, url, params) if method == 'GET' else None
+        cached = self._cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            if time.monotonic() - cached["validated_at"] < Config.JIRA_CACHE_FRESH_SECONDS:
+                metrics.increment("jira.cache.fresh_hits")
+                return cached["data"]
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            response = await self.client().request(method=method, url=url, headers=headers, json=data, params=params)
+            if response.status_code == 304 and cached is not None:
+                metrics.increment("jira.cache.revalidated")
+                logger.debug(f"Jira {endpoint} not modified, serving the cached response")
+                cached["validated_at"] = time.monotonic()
+                self._cache.set(cache_key, cached)
+                return cached["data"]
+            response.raise_for_status()
+            result = response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"Error making {method} request to Jira {endpoint}: {str(e)}")
+            raise Exception(f"Error making request to Jira API: {str(e)}")
+
+        if cache_key:
+            metrics.increment("jira.cache.misses")
+            self._cache.set(cache_key, {
+                "data": result,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "validated_at": time.monotonic()
+            })
+        return result
+
+    def parse_story_key(self, story: str) -> str:
+        """
+        Parse a story key from various formats:
+        - XXX-1234
+        - https://nextech.atlassian.net/browse/XXX-1234
+        - git checkout -b XXX-1234-some-text
+        """
+        # Direct format (XXX-1234)
+        if re.match(r'^[A-Z]{3}-\d{2,}$', story):
+            return story
+        
+        # URL format
+        url_match = re.search(r'https://nextech.atlassian.net/browse/([A-Z]{3}-\d{2,})', story)
+        if url_match:
+            return url_match.group(1)
+        
+        # Git branch format
+        git_match = re.search(r'git checkout -b ([A-Z]{3}-\d{2,})', story)
+        if git_match:
+            return git_match.group(1)
+        
+        raise ValueError(
+            "Invalid story format. Expected formats: "
+            "XXX-1234, https://nextech.atlassian.net/browse/XXX-1234, "
+            "or git checkout -b XXX-1234-story-summary"
+        )
+
+    def find_story_keys(self, text: str, limit: int, project_keys: Collection[str]) -> List[str]:
+        """Distinct story keys of the given projects mentioned in free text, in order of appearance"""
+        keys = []
+        for key in STORY_KEY_PATTERN.findall(text or ""):
+            if key.split('-', 1)[0] in project_keys and key not in keys:
+                keys.append(key)
+                if len(keys) == limit:
+                    break
+        return keys
+
+    def api_key(self, user: User) -> str:
+        # keys saved through ApiKeyUpdate are stored as 'JIRA'
+        if key := user.api_keys.get('JIRA'):
+            return key
+        return user.get_api_key('jira')
+
+    async def get_story_details(self, story_key: str, user: User, fields: str = "description,summary") -> dict:
+        """Get the details of a Jira story, limited to the given fields"""
+        story_key = self.parse_story_key(story_key)
+        api_key = self.api_key(user)
+        return await self._make_request('GET', f'issue/{story_key}', api_key, params={"fields": fields})
+
+    async def get_story_description(self, story_key: str, user: User) -> str:
+        """Get just the description of a Jira story"""
+        story_details = await self.get_story_details(story_key, user)
+        return story_details.get('fields', {}).get('description', '')
+
+    def issues_jql(self, keys: List[str]) -> str:
+        invalid = [key for key in keys if not ISSUE_KEY_PATTERN.match(key)]
+        if invalid:
+            raise ValueError(f"Invalid issue keys: {', '.join(invalid)}")
+        return f"key in ({', '.join(keys)}) ORDER BY key"
+
+    async def search_issues(self, jql: str, user: User, fields: str = "summary,description",
+                            max_results: Optional[int] = None) -> List[dict]:
+        """
+        All issues matching a JQL query, up to max_results. The first page gives the total, the
+        remaining pages are fetched concurrently, at most JIRA_SEARCH_CONCURRENCY at a time.
+        """
+        api_key = self.api_key(user)
+        max_results = min(max_results or Config.JIRA_IMPORT_MAX_ISSUES, Config.JIRA_IMPORT_MAX_ISSUES)
+        page_size = min(Config.JIRA_SEARCH_PAGE_SIZE, max_results)
+
+        async def fetch_page(start_at: int) -> dict:
+            params = {"jql": jql, "fields": fields, "startAt": start_at, "maxResults": page_size}
+            return await self._make_request('GET', 'search', api_key, params=params)
+
+        first = await fetch_page(0)
+        metrics.increment("jira.search.pages")
+        issues = first.get("issues", [])
+        total = min(first.get("total", len(issues)), max_results)
+        # Jira may cap maxResults below what we asked for, so step by what it actually returned
+        step = first.get("maxResults") or page_size
+        if step <= 0 or len(issues) >= total:
+            return issues[:total]
+
+        semaphore = asyncio.Semaphore(Config.JIRA_SEARCH_CONCURRENCY)
+
+        async def fetch_limited(start_at: int) -> dict:
+            async with semaphore:
+                return await fetch_page(start_at)
+
+        pages = await asyncio.gather(*(fetch_limited(start_at) for start_at in range(step, total, step)))
+        for page in pages:
+            issues.extend(page.get("issues", []))
+        metrics.increment("jira.search.pages", len(pages))
+        return issues[:total]
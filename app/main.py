@@ -1,38 +1,87 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from controllers.jira_controller import router as jira_router
-from controllers.users_controller import router as users_router
-from controllers.conversations_controller import router as conversations_router
-from controllers.account_controller import router as account_router
-from controllers.llm_controller import router as llm_router
-from controllers.web_controller import router as web_router
-from controllers.project_controller import router as project_router
-from utils.logger import logger
-from config import Config
-import json
-app = FastAPI()
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    # Angular allowed origins, controlled by azure deployment
-    allow_origins=["*"],  
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
-
-# Include the routers
-app.include_router(jira_router, prefix="/api")
-app.include_router(users_router, prefix="/api")
-app.include_router(conversations_router, prefix="/api")
-app.include_router(account_router, prefix="/api")
-app.include_router(llm_router, prefix="/api")
-app.include_router(web_router, prefix="/api")
-app.include_router(project_router, prefix="/api")
-
-@app.get("/")
-async def root():
-    logger.info("Health check endpoint called")
-    # need to get print version of config
+import time
+import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from controllers.jira_controller import router as jira_router
+from controllers.users_controller import router as users_router
+from controllers.conversations_controller import router as conversations_router
+from controllers.account_controller import router as account_router
+from controllers.llm_controller import router as llm_router
+from controllers.web_controller import router as web_router
+from controllers.project_controller import router as project_router
+from controllers.metrics_controller import router as metrics_router
+from controllers.profiling_controller import router as profiling_router
+from controllers.search_controller import router as search_router
+from controllers.backup_controller import router as backup_router
+from services import storage
+from services.prompt_packer import get_encoding
+from services.title_service import title_worker
+from utils.logger import logger
+from utils.profiling import ProfilingMiddleware
+from integrations.jira import JiraIntegration
+from services.web_scraper import web_scraper
+from config import Config
+import json
+
+# the budget itself is enforced by tests/test_startup.py, this is for comparing deployments
+logger.info(f"Imported the app in {time.perf_counter() - import_started:.2f}s")
+
+def warm_up():
+    # load the heavy resources that are otherwise created on first use
+    started = time.perf_counter()
+    try:
+        get_encoding()
+        storage.warm_up()
+        import lxml.html
+        logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Error warming up: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm up in the background so health checks pass as soon as uvicorn is listening; the task is
+    # held so it is not garbage collected, and left running on shutdown since cancelling it would
+    # not stop the thread it waits on
+    app.state.warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    title_worker.start()
+    yield
+    await title_worker.stop()
+    await JiraIntegration.close()
+    await web_scraper.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    # Angular allowed origins, controlled by azure deployment
+    allow_origins=["*"],  
+    allow_credentials=True,
+    allow_methods=["*"],  # Allows all methods
+    allow_headers=["*"],  # Allows all headers
+)
+
+# Profiles requests matching the rule an admin set through /api/profiling/, a no-op otherwise
+app.add_middleware(ProfilingMiddleware)
+
+# Include the routers
+app.include_router(jira_router, prefix="/api")
+app.include_router(users_router, prefix="/api")
+app.include_router(conversations_router, prefix="/api")
+app.include_router(account_router, prefix="/api")
+app.include_router(llm_router, prefix="/api")
+app.include_router(web_router, prefix="/api")
+app.include_router(project_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
+app.include_router(profiling_router, prefix="/api")
+app.include_router(search_router, prefix="/api")
+app.include_router(backup_router, prefix="/api")
+
+@app.get("/")
+async def root():
+    logger.info("Health check endpoint called")
+    # need to get print version of config
     return {"message": "Welcome to the Enterprise LLM Chat API. Config:" + Config.AZURE_STORAGE_ACCOUNT_NAME}
\ No newline at end of file
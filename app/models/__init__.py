@@ -1,5 +1,8 @@
-from .message import *
-from .conversation import *
-from .context import *
-from .project import *
-from .chat import *
+from .message import *
+from .conversation import *
+from .context import *
+from .project import *
+from .chat import *
+from .profiling import *
+from .jira import *
+from .web import *
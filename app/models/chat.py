@@ -1,45 +1,56 @@
-from pydantic import BaseModel
-from typing import List, Literal, Dict, Optional
-from .message import Message
-from datetime import datetime
-
-class ChatRequest(BaseModel):
-    messages: List[Message]
-    project_id: Optional[str] = None
-
-class ChatResponse(BaseModel):
-    response: str
-
-class DescriptionRequest(BaseModel):
-    prompt: str
-    project_id: Optional[str] = None
-
-class User(BaseModel):
-    username: str
-    password: Optional[str] = None
-    email: str
-    first_name: str
-    last_name: str
-    api_keys: Dict[str, str] = {}
-    is_admin: bool = False
-    theme: Optional[str] = None  # New field for theme preference
-
-    def get_api_key(self, service: str) -> str:
-        if not (key := self.api_keys.get(service)):
-            raise ValueError(f"No API key found for service: {service}")
-        return key
-
-class ApiKeyUpdate(BaseModel):
-    service: Literal['JIRA', 'GITHUB', 'SLACK', 'CONFLUENCE']  # We can add more services later
-    key: str
-
-class ApiKeys(BaseModel):
-    jira: Optional[str] = None 
-
-class SignupRequest(BaseModel):
-    username: str
-    password: str
-    email: str
-    first_name: str
-    last_name: str
+from pydantic import BaseModel, model_validator
+from typing import List, Literal, Dict, Optional
+from .message import Message
+from datetime import datetime
+
+class ChatRequest(BaseModel):
+    # either the full history in messages, or conversation_id plus only the new user message
+    messages: List[Message] = []
+    message: Optional[Message] = None
+    project_id: Optional[str] = None
+    conversation_id: Optional[str] = None  # when set, the new user turn and the streamed reply are saved to this conversation
+
+    @model_validator(mode='after')
+    def check_history_source(self):
+        if self.message is not None and self.conversation_id is None:
+            raise ValueError("conversation_id is required when sending a single message")
+        if self.message is None and not self.messages:
+            raise ValueError("Either messages or conversation_id and message are required")
+        return self
+
+class ChatResponse(BaseModel):
+    response: str
+
+class DescriptionRequest(BaseModel):
+    prompt: str
+    project_id: Optional[str] = None
+
+class User(BaseModel):
+    username: str
+    password: Optional[str] = None
+    email: str
+    first_name: str
+    last_name: str
+    api_keys: Dict[str, str] = {}
+    is_admin: bool = False
+    theme: Optional[str] = None  # New field for theme preference
+
+    def get_api_key(self, service: str) -> str:
+        if not (key := self.api_keys.get(service)):
+            raise ValueError(f"No API key found for service: {service}")
+        return key
+
+class ApiKeyUpdate(BaseModel):
+    service: Literal['JIRA', 'GITHUB', 'SLACK', 'CONFLUENCE']  # We can add more services later
+    key: str
+
+class ApiKeys(BaseModel):
+    jira: Optional[str] = None 
+
+class SignupRequest(BaseModel):
+    username: str
+    password: str
+    email: str
+    first_name: str
+    last_name: str
     signup_code: str  # New field
\ No newline at end of file
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+
+class JiraImportRequest(BaseModel):
+    # either a JQL query or a list of issue keys
+    project_id: str
+    jql: Optional[str] = None
+    keys: List[str] = []
+    max_issues: int = Field(100, gt=0)  # capped by JIRA_IMPORT_MAX_ISSUES
+    pinned: bool = False
+
+    @model_validator(mode='after')
+    def check_issue_source(self):
+        if not self.jql and not self.keys:
+            raise ValueError("Either jql or keys is required")
+        if self.jql and self.keys:
+            raise ValueError("Provide either jql or keys, not both")
+        return self
@@ -1,13 +1,14 @@
-from pydantic import BaseModel
-from typing import Optional, List, Literal
-from .context import Context
-from datetime import datetime
-
-class Message(BaseModel):
-    message_id: Optional[str] = None
-    conversation_id: Optional[str] = None
-    content: str
-    contexts: List[Context] = []
-    sequence: int = 0
-    role: Literal['user', 'assistant', 'system']
-    timestamp: str | datetime = datetime.now().isoformat()
\ No newline at end of file
+from pydantic import BaseModel
+from typing import Optional, List, Literal
+from .context import Context
+from datetime import datetime
+
+class Message(BaseModel):
+    message_id: Optional[str] = None
+    conversation_id: Optional[str] = None
+    content: str
+    contexts: List[Context] = []
+    sequence: int = 0
+    role: Literal['user', 'assistant', 'system']
+    timestamp: str | datetime = datetime.now().isoformat()
+    is_partial: bool = False  # set on assistant replies whose stream was cut short
\ No newline at end of file
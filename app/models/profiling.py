@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+from typing import Literal
+
+class ProfilingRule(BaseModel):
+    mode: Literal['cprofile', 'sampling'] = 'cprofile'
+    route: str = Field(..., description="Regular expression searched in the request path, e.g. ^/api/project/")
+    min_duration_ms: float = 0  # only keep captures of requests at least this slow
+    duration_seconds: float = Field(600, gt=0, le=86400)  # capture is switched off again after this
+    max_captures: int = Field(10, gt=0, le=1000)
+    sample_interval_ms: float = Field(5, ge=1)
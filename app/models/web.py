@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+
+class WebBatchRequest(BaseModel):
+    # either a list of URLs, or a seed URL to crawl from
+    urls: List[str] = []
+    seed_url: Optional[str] = None
+    depth: int = Field(1, ge=0)  # link hops followed from the seed, capped by WEB_CRAWL_MAX_DEPTH
+    sitemap: bool = False  # also crawl the pages listed in the seed site's /sitemap.xml
+    max_pages: int = Field(50, gt=0)  # capped by WEB_CRAWL_MAX_PAGES
+    project_id: Optional[str] = None  # when set, pages are saved as contexts of this project
+
+    @model_validator(mode='after')
+    def check_page_source(self):
+        if not self.urls and not self.seed_url:
+            raise ValueError("Either urls or seed_url is required")
+        if self.urls and self.seed_url:
+            raise ValueError("Provide either urls or seed_url, not both")
+        return self
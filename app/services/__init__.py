@@ -1,5 +1,5 @@
-from .message_service import MessageService
-from .conversation_service import ConversationService
-from .project_service import ProjectService
-from .context_service import ContextService
-from .auth_service import AuthService
+from .message_service import MessageService
+from .conversation_service import ConversationService
+from .project_service import ProjectService
+from .context_service import ContextService
+from .auth_service import AuthService
@@ -1,39 +1,87 @@
-import jwt
-from fastapi import HTTPException, Header, Depends
-from config import Config
-import bcrypt
-import datetime
-
-class AuthService:
-    secret_key = Config.SECRET_KEY
-    token_duration = int(Config.TOKEN_DURATION) if Config.TOKEN_DURATION else 1
-
-    @classmethod
-    def verify_jwt_token(cls, authorization: str = Header(...)):
-        try:
-            token = authorization.split(" ")[1]
-            payload = jwt.decode(token, cls.secret_key, algorithms=["HS256"])
-            return payload
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(status_code=401, detail="Token expired")
-        except jwt.InvalidTokenError:
-            raise HTTPException(status_code=401, detail="Invalid token") 
-
-    @classmethod
-    def create_jwt_token(cls, username: str, is_admin: bool) -> str:
-        payload = {
-            "username": username,
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=cls.token_duration * 24),
-            "is_admin": is_admin,
-            # Add other claims as needed
-        }
-        return jwt.encode(payload, cls.secret_key, algorithm="HS256")
-        return token
-
-    @staticmethod
-    def hash_password(password: str) -> str:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-    @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
\ No newline at end of file
+import jwt
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Header, Depends
+from config import Config
+from utils.metrics import metrics
+import bcrypt
+import datetime
+
+class PasswordHashPool:
+    """
+    Runs bcrypt on a small dedicated thread pool (bcrypt releases the GIL), so a burst of logins
+    doesn't stall the event loop. At most max_workers hashes run at once and max_queue more may
+    wait; past that callers get a 503 instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.limit = max_workers + max_queue
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            metrics.set_gauge("auth.hash_pending", self.pending)
+
+    async def run(self, function, *args):
+        with self._lock:
+            if self.pending >= self.limit:
+                metrics.increment("auth.hash_rejected")
+                raise HTTPException(status_code=503, detail="Too many concurrent logins, try again shortly",
+                                    headers={"Retry-After": "1"})
+            self.pending += 1
+            metrics.set_gauge("auth.hash_pending", self.pending)
+        started = time.perf_counter()
+        # released when the hash finishes, even if the request waiting for it was cancelled
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(self._release)
+        result = await asyncio.wrap_future(future)
+        metrics.observe("auth.hash_ms", (time.perf_counter() - started) * 1000)
+        return result
+
+class AuthService:
+    secret_key = Config.SECRET_KEY
+    token_duration = int(Config.TOKEN_DURATION) if Config.TOKEN_DURATION else 1
+    password_pool = PasswordHashPool(Config.BCRYPT_MAX_WORKERS, Config.BCRYPT_MAX_QUEUE)
+
+    @classmethod
+    def verify_jwt_token(cls, authorization: str = Header(...)):
+        try:
+            token = authorization.split(" ")[1]
+            payload = jwt.decode(token, cls.secret_key, algorithms=["HS256"])
+            return payload
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token") 
+
+    @classmethod
+    def create_jwt_token(cls, username: str, is_admin: bool) -> str:
+        payload = {
+            "username": username,
+            "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=cls.token_duration * 24),
+            "is_admin": is_admin,
+            # Add other claims as needed
+        }
+        return jwt.encode(payload, cls.secret_key, algorithm="HS256")
+        return token
+
+    @staticmethod
+    def hash_password(password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS)).decode('utf-8')
+
+    @staticmethod
+    def verify_password(plain_password: str, hashed_password: str) -> bool:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    @classmethod
+    async def hash_password_async(cls, password: str) -> str:
+        return await cls.password_pool.run(cls.hash_password, password)
+
+    @classmethod
+    async def verify_password_async(cls, plain_password: str, hashed_password: str) -> bool:
+        return await cls.password_pool.run(cls.verify_password, plain_password, hashed_password)
@@ -0,0 +1,311 @@
+import asyncio
+import json
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, List
+from azure.core.exceptions import ResourceNotFoundError
+from fastapi import HTTPException
+from models import Project, Conversation, Message, Context
+from config import Config
+from services.context_service import ContextService
+from services.conversation_service import ConversationService
+from services.message_service import MessageService
+from services.project_service import ProjectService
+from services.search_index import search_index
+from services.storage import get_table_client, get_blob_container_client
+from services.title_service import PLACEHOLDER_DESCRIPTION
+from utils.logger import logger
+from utils.metrics import metrics
+
+EXPORT_VERSION = 1
+# storage bookkeeping that is rebuilt on import
+STORAGE_FIELDS = ("PartitionKey", "RowKey", "username", "blob_name", "snapshot_etag")
+MAX_REPORTED_ERRORS = 20
+# parents before children: a row is written only after the rows it refers to
+TABLE_ORDER = ("projects", "conversations", "messages", "contexts")
+_DONE = object()
+
+def export_line(kind: str, data: dict) -> str:
+    return json.dumps({"type": kind, "data": data}, default=str, ensure_ascii=False) + "\n"
+
+def entity_data(entity: dict, **extra) -> dict:
+    data = {key: value for key, value in entity.items() if key not in STORAGE_FIELDS}
+    data.update(extra)
+    return data
+
+async def prefetch_ordered(items: Iterable, load: Callable, depth: int, executor: ThreadPoolExecutor) -> AsyncIterator:
+    """
+    Yields load(item) for every item, in order, while the loads of up to `depth` later items already
+    run on the executor. The items are pulled on the executor too: table queries fetch their pages lazily.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(items)
+    pending = deque()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < depth:
+                item = await loop.run_in_executor(executor, next, iterator, _DONE)
+                if item is _DONE:
+                    exhausted = True
+                else:
+                    pending.append(loop.run_in_executor(executor, load, item))
+            if not pending:
+                return
+            yield await pending.popleft()
+    finally:
+        # the client went away: don't start the reads nobody will write out
+        for future in pending:
+            future.cancel()
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line.decode("utf-8")
+    if buffer.strip():
+        yield buffer.decode("utf-8")
+
+class BackupService:
+    """
+    Export and import of everything a user owns, as NDJSON lines of {"type": ..., "data": ...}:
+    each project followed by its contexts, then each conversation followed by its messages, each
+    message followed by its contexts. Parents always come before their children, so an import can
+    remap ids in one pass.
+    """
+
+    def __init__(self, workers: int = None, prefetch: int = None, batch_size: int = None):
+        self.prefetch = prefetch or Config.EXPORT_PREFETCH
+        self.batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+        self.executor = ThreadPoolExecutor(max_workers=workers or Config.EXPORT_READ_WORKERS, thread_name_prefix="backup")
+        self.project_service = ProjectService()
+        self.conversation_service = ConversationService()
+        self.message_service = MessageService()
+        self.context_service = ContextService()
+
+    @property
+    def projects_table(self):
+        return get_table_client(Config.AZURE_STORAGE_PROJECTS_TABLE_NAME)
+
+    @property
+    def conversations_table(self):
+        return get_table_client(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME)
+
+    @property
+    def messages_table(self):
+        return get_table_client(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+
+    @property
+    def contexts_table(self):
+        return get_table_client(Config.AZURE_STORAGE_CONTEXTS_TABLE_NAME)
+
+    @property
+    def contexts_blob_container(self):
+        return get_blob_container_client(Config.AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER)
+
+    # the loaders run on the executor threads
+
+    def _load_project(self, entity: dict) -> tuple[str, list]:
+        contexts = self.contexts_table.query_entities(f"PartitionKey eq 'contexts' and project_id eq '{entity['RowKey']}'")
+        # contexts attached to a message are exported with the message
+        contexts = [context for context in contexts if not context.get('message_id')]
+        return export_line("project", entity_data(entity, project_id=entity['RowKey'])), contexts
+
+    def _load_context(self, entity: dict) -> str:
+        data = entity_data(entity, context_id=entity['RowKey'])
+        try:
+            blob_client = self.contexts_blob_container.get_blob_client(entity['blob_name'])
+            data["content"] = json.loads(blob_client.download_blob().readall())["content"]
+        except ResourceNotFoundError:
+            data["content"] = ""
+            data["error"] = "Context content not found"
+        return export_line("context", data)
+
+    def _load_conversation(self, entity: dict) -> List[str]:
+        lines = [export_line("conversation", entity_data(entity, conversation_id=entity['RowKey']))]
+        messages = self.messages_table.query_entities(f"PartitionKey eq 'messages' and conversation_id eq '{entity['RowKey']}'")
+        for message in sorted(messages, key=lambda message: message.get('sequence', 0)):
+            lines.append(export_line("message", entity_data(message, message_id=message['RowKey'])))
+            for context in self.contexts_table.query_entities(f"PartitionKey eq 'contexts' and message_id eq '{message['RowKey']}'"):
+                lines.append(self._load_context(context))
+        return lines
+
+    async def export_user(self, username: str) -> AsyncIterator[str]:
+        """
+        The user's data as NDJSON lines. Only `prefetch` projects, contexts or conversations are held
+        at a time, so memory stays flat however much the user has.
+        """
+        yield export_line("export", {"version": EXPORT_VERSION, "username": username, "exported_at": datetime.now().isoformat()})
+        counts = defaultdict(int)
+        projects = self.projects_table.query_entities(f"PartitionKey eq 'projects' and username eq '{username}'")
+        async for project_line, contexts in prefetch_ordered(projects, self._load_project, self.prefetch, self.executor):
+            yield project_line
+            counts["project"] += 1
+            async for context_line in prefetch_ordered(contexts, self._load_context, self.prefetch, self.executor):
+                yield context_line
+                counts["context"] += 1
+        conversations = self.conversations_table.query_entities(f"PartitionKey eq 'conversations' and username eq '{username}'")
+        async for lines in prefetch_ordered(conversations, self._load_conversation, self.prefetch, self.executor):
+            for line in lines:
+                yield line
+            counts["conversation"] += 1
+        metrics.increment("backup.exports")
+        logger.info(f"Exported {dict(counts)} for user {username}")
+
+    async def import_user(self, username: str, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        Imports an export into the user's account under new ids. Rows are written in table transactions
+        of `batch_size` and context contents are uploaded in parallel. Lines that don't parse or whose
+        parent isn't in the import are skipped and reported.
+        """
+        batch = ImportBatch(self, username)
+        line_number = 0
+        try:
+            async for line in ndjson_lines(chunks):
+                line_number += 1
+                await batch.add(line_number, line)
+            await batch.flush_all()
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            logger.error(f"Error importing line {line_number} for user {username}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Import failed at line {line_number}, {dict(batch.counts)} were imported: {str(e)}")
+        metrics.increment("backup.imports")
+        logger.info(f"Imported {dict(batch.counts)} for user {username}, skipped {batch.skipped} lines")
+        return {"imported": dict(batch.counts), "skipped": batch.skipped, "errors": batch.errors}
+
+class ImportBatch:
+    """Id remapping and the rows and uploads of one import that haven't been written yet"""
+
+    def __init__(self, service: BackupService, username: str):
+        self.service = service
+        self.username = username
+        self.loop = asyncio.get_running_loop()
+        self.ids = {"project": {}, "conversation": {}, "message": {}}
+        self.rows = defaultdict(list)
+        self.row_bytes = defaultdict(int)
+        self.uploads = []
+        self.search_conversations = []
+        self.search_messages = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.skipped = 0
+        self.errors = []
+
+    def skip(self, line_number: int, reason: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line_number}: {reason}")
+
+    async def add(self, line_number: int, line: str):
+        try:
+            record = json.loads(line)
+            kind = record["type"]
+            # unset fields take the models' defaults
+            data = {key: value for key, value in record["data"].items() if value is not None}
+            if kind == "export":
+                return
+            handler = getattr(self, f"add_{kind}", None)
+            if handler is None:
+                return self.skip(line_number, f"unknown type {kind}")
+            reason = await handler(data)
+        except (ValueError, TypeError, KeyError) as e:
+            # pydantic's ValidationError is a ValueError
+            return self.skip(line_number, f"invalid record: {str(e)[:200]}")
+        if reason:
+            self.skip(line_number, reason)
+        else:
+            self.counts[kind] += 1
+
+    async def add_project(self, data: dict):
+        project = Project(**{**data, "username": self.username, "contexts": [], "conversations": []})
+        old_id, project.project_id = project.project_id, str(uuid.uuid4())
+        self.ids["project"][old_id] = project.project_id
+        await self.queue("projects", self.service.project_service.create_project_entity(project))
+
+    async def add_conversation(self, data: dict):
+        conversation = Conversation(**{**data, "username": self.username, "messages": []})
+        old_id, conversation.conversation_id = conversation.conversation_id, str(uuid.uuid4())
+        self.ids["conversation"][old_id] = conversation.conversation_id
+        # conversations may belong to another user's public project, those keep the link
+        conversation.project_id = self.ids["project"].get(conversation.project_id, conversation.project_id)
+        # stored as the exported string, like save_conversation does
+        conversation.updated_at = data.get("updated_at", conversation.updated_at)
+        description = conversation.description if conversation.description != PLACEHOLDER_DESCRIPTION else None
+        # indexed once the row is written, search never points at a conversation that isn't there
+        self.search_conversations.append((conversation.conversation_id, self.username, description, conversation.updated_at))
+        await self.queue("conversations", self.service.conversation_service.create_conversation_entity(conversation))
+
+    async def add_message(self, data: dict):
+        message = Message(**{**data, "contexts": []})
+        conversation_id = self.ids["conversation"].get(message.conversation_id)
+        if conversation_id is None:
+            return "message of a conversation that is not in the import"
+        old_id = message.message_id
+        entity = self.service.message_service.create_message_entity(message, conversation_id)
+        self.ids["message"][old_id] = message.message_id
+        self.search_messages[conversation_id].append((message.message_id, message.role, message.content))
+        await self.queue("messages", entity)
+
+    async def add_context(self, data: dict):
+        context = Context(**data)
+        if context.message_id:
+            context.message_id = self.ids["message"].get(context.message_id)
+            if context.message_id is None:
+                return "context of a message that is not in the import"
+        if context.project_id:
+            context.project_id = self.ids["project"].get(context.project_id)
+            if context.project_id is None and not context.message_id:
+                return "context of a project that is not in the import"
+        context.context_id = str(uuid.uuid4())
+        context.blob_name = f"{context.context_id}.json"
+        blob_client = self.service.contexts_blob_container.get_blob_client(context.blob_name)
+        self.uploads.append(self.loop.run_in_executor(self.service.executor, blob_client.upload_blob, json.dumps({"content": context.content})))
+        await self.queue("contexts", self.service.context_service.create_context_entity(context))
+
+    async def queue(self, table: str, entity: dict):
+        # roughly what the entity weighs in the transaction's request body
+        size = len(json.dumps(entity, default=str, ensure_ascii=False).encode("utf-8"))
+        if self.rows[table] and self.row_bytes[table] + size > Config.IMPORT_BATCH_MAX_BYTES:
+            await self.flush(table)
+        self.rows[table].append(entity)
+        self.row_bytes[table] += size
+        if len(self.rows[table]) >= self.service.batch_size:
+            await self.flush(table)
+
+    async def flush(self, table: str):
+        # the pending rows of parent tables go first, so no child is written before its parent
+        for parent in TABLE_ORDER[:TABLE_ORDER.index(table)]:
+            await self._write(parent)
+        await self._write(table)
+
+    async def _write(self, table: str):
+        rows, self.rows[table] = self.rows[table], []
+        self.row_bytes[table] = 0
+        if not rows:
+            return
+        if table == "contexts":
+            # a context row is only written once its content is in place
+            uploads, self.uploads = self.uploads, []
+            await asyncio.gather(*uploads)
+        table_client = getattr(self.service, f"{table}_table")
+        await self.loop.run_in_executor(self.service.executor, table_client.submit_transaction, [("create", row) for row in rows])
+        if table == "conversations":
+            search_conversations, self.search_conversations = self.search_conversations, []
+            for conversation in search_conversations:
+                await search_index.index_conversation(*conversation)
+        if table == "messages":
+            search_messages, self.search_messages = self.search_messages, defaultdict(list)
+            for conversation_id, messages in search_messages.items():
+                await search_index.add_messages(conversation_id, messages)
+
+    async def flush_all(self):
+        # parents first, so an interrupted import leaves no orphaned children behind
+        for table in TABLE_ORDER:
+            await self._write(table)
+
+backup_service = BackupService()
@@ -0,0 +1,206 @@
+import asyncio
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from config import Config
+from models.context import Context
+from services.prompt_packer import get_encoding
+from utils.cache import TTLCache
+from utils.logger import logger
+from utils.metrics import metrics
+
+WORD_PATTERN = re.compile(r'\w+')
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its me my not of on or "
+    "our so that the their them then there these this to us was we were what when where which who why "
+    "will with you your".split()
+)
+# BM25 parameters, the usual defaults
+K1 = 1.5
+B = 0.75
+
+def terms(text: str) -> List[str]:
+    return [word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+def chunk_text(text: str, max_tokens: int) -> List[tuple[str, int]]:
+    """(chunk, token count) pairs: paragraphs are packed together up to max_tokens, longer ones are split"""
+    encoding = get_encoding()
+    chunks, current, current_tokens = [], [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append(("\n\n".join(current), current_tokens))
+        current, current_tokens = [], 0
+
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = encoding.encode(paragraph)
+        if len(tokens) > max_tokens:
+            flush()
+            for start in range(0, len(tokens), max_tokens):
+                window = tokens[start:start + max_tokens]
+                chunks.append((encoding.decode(window), len(window)))
+            continue
+        if current_tokens + len(tokens) > max_tokens:
+            flush()
+        current.append(paragraph)
+        current_tokens += len(tokens)
+    flush()
+    return chunks
+
+class Chunk:
+    def __init__(self, context: Context, index: int, count: int, text: str, tokens: int):
+        self.context_id = context.context_id
+        self.index = index
+        self.context = Context(
+            context_id=f"{context.context_id}#{index}",
+            type=context.type,
+            name=f"{context.name or context.type} (part {index + 1}/{count})",
+            content=text,
+            project_id=context.project_id
+        )
+        self.tokens = tokens
+        self.term_counts = Counter(terms(text))
+        self.length = sum(self.term_counts.values())
+
+def build_chunks(context: Context) -> List[Chunk]:
+    pieces = chunk_text(context.content, Config.CONTEXT_CHUNK_TOKENS)
+    return [Chunk(context, i, len(pieces), text, tokens) for i, (text, tokens) in enumerate(pieces)]
+
+class BM25Index:
+    """Inverted index over the chunks of one project's contexts, updated a context at a time"""
+
+    def __init__(self):
+        self.chunks: Dict[str, List[Chunk]] = {}  # context id -> its chunks
+        self.postings: Dict[str, Dict[Chunk, int]] = defaultdict(dict)
+        self.total_length = 0
+        self.chunk_count = 0
+        self.total_tokens = 0
+
+    @property
+    def context_ids(self) -> set:
+        return set(self.chunks)
+
+    def add(self, context_id: str, chunks: List[Chunk]):
+        if context_id in self.chunks:
+            return
+        self.chunks[context_id] = chunks
+        for chunk in chunks:
+            for term, count in chunk.term_counts.items():
+                self.postings[term][chunk] = count
+            self.total_length += chunk.length
+            self.chunk_count += 1
+            self.total_tokens += chunk.tokens
+
+    def remove(self, context_id: str):
+        for chunk in self.chunks.pop(context_id, []):
+            for term in chunk.term_counts:
+                postings = self.postings[term]
+                postings.pop(chunk, None)
+                if not postings:
+                    del self.postings[term]
+            self.total_length -= chunk.length
+            self.chunk_count -= 1
+            self.total_tokens -= chunk.tokens
+
+    def search(self, query: str) -> List[tuple[float, Chunk]]:
+        if not self.chunk_count:
+            return []
+        average_length = self.total_length / self.chunk_count or 1
+        scores = defaultdict(float)
+        for term in set(terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk, count in postings.items():
+                scores[chunk] += idf * count * (K1 + 1) / (count + K1 * (1 - B + B * chunk.length / average_length))
+        return sorted(((score, chunk) for chunk, score in scores.items()), key=lambda item: item[0], reverse=True)
+
+class ContextIndex:
+    """
+    BM25 indexes of project contexts, kept in memory per project (LRU, bounded by
+    CONTEXT_INDEX_MAX_PROJECTS). Saved and deleted contexts update a loaded index directly; on
+    each chat turn the index is also reconciled with the contexts read from storage, so changes
+    made through another worker are picked up. Chunking runs off the event loop.
+    """
+
+    def __init__(self):
+        self.projects = TTLCache(Config.CONTEXT_INDEX_MAX_PROJECTS, Config.CONTEXT_INDEX_TTL_SECONDS)
+
+    async def add_context(self, context: Context):
+        index = self.projects.get(context.project_id) if context.project_id else None
+        if index is not None and context.context_id and context.type != 'image':
+            index.add(context.context_id, await asyncio.to_thread(build_chunks, context))
+
+    def remove_context(self, project_id: Optional[str], context_id: str):
+        index = self.projects.get(project_id) if project_id else None
+        if index is not None:
+            index.remove(context_id)
+
+    async def sync(self, project_id: str, contexts: List[Context]) -> BM25Index:
+        index = self.projects.get(project_id)
+        if index is None:
+            index = BM25Index()
+            self.projects.set(project_id, index)
+        current = {context.context_id: context for context in contexts}
+        for context_id in index.context_ids - current.keys():
+            index.remove(context_id)
+        missing = [context for context_id, context in current.items() if context_id not in index.context_ids]
+        if missing:
+            started = time.perf_counter()
+            built = await asyncio.to_thread(lambda: [(context.context_id, build_chunks(context)) for context in missing])
+            for context_id, chunks in built:
+                index.add(context_id, chunks)
+            logger.info(f"Indexed {len(missing)} contexts of project {project_id} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return index
+
+    async def select(self, project_id: str, contexts: List[Context], query: str) -> tuple[List[Context], List[Context]]:
+        """
+        The project contexts to send with a turn, as the contexts sent with every turn and the chunks
+        retrieved for this one. Pinned, image and unsaved contexts (the project description) are
+        always sent whole. When the rest is larger than CONTEXT_RETRIEVAL_MIN_TOKENS only the chunks
+        that best match the query are sent, up to CONTEXT_RETRIEVAL_TOP_K chunks and
+        CONTEXT_RETRIEVAL_TOKEN_BUDGET tokens. The chunks change with the query, so they are kept out
+        of the stable prompt prefix.
+        """
+        if not Config.CONTEXT_RETRIEVAL_ENABLED:
+            return contexts, []
+        indexable = [context for context in contexts if context.context_id and not context.pinned and context.type != 'image']
+        if not indexable:
+            return contexts, []
+        indexable_ids = {id(context) for context in indexable}
+        kept = [context for context in contexts if id(context) not in indexable_ids]
+        index = await self.sync(project_id, indexable)
+        if index.total_tokens <= Config.CONTEXT_RETRIEVAL_MIN_TOKENS:
+            return contexts, []
+
+        started = time.perf_counter()
+        ranked = [chunk for score, chunk in index.search(query)]
+        # when the question matches little, the opening chunk of each context is the best guess
+        matched = set(ranked)
+        ranked += [chunks[0] for chunks in index.chunks.values() if chunks and chunks[0] not in matched]
+        selected, used_tokens = [], 0
+        for chunk in ranked:
+            if len(selected) == Config.CONTEXT_RETRIEVAL_TOP_K:
+                break
+            if used_tokens + chunk.tokens > Config.CONTEXT_RETRIEVAL_TOKEN_BUDGET:
+                continue
+            selected.append(chunk)
+            used_tokens += chunk.tokens
+        # in document order, so neighbouring chunks read as one passage
+        order = {context.context_id: position for position, context in enumerate(indexable)}
+        selected.sort(key=lambda chunk: (order[chunk.context_id], chunk.index))
+        metrics.observe("context.retrieval.ms", (time.perf_counter() - started) * 1000)
+        metrics.observe("context.retrieval.saved_tokens", index.total_tokens - used_tokens)
+        logger.info(f"Retrieved {len(selected)} of {index.chunk_count} chunks ({used_tokens} of {index.total_tokens} tokens) "
+                    f"from {len(indexable)} contexts of project {project_id}")
+        return kept, [chunk.context for chunk in selected]
+
+context_index = ContextIndex()
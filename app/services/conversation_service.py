@@ -1,196 +1,417 @@
-import json
-from azure.data.tables import TableServiceClient, UpdateMode
-from azure.storage.blob import BlobServiceClient
-from fastapi import HTTPException
-from models import Conversation, Message, Context
-from config import Config
-from typing import List
-from azure.core.exceptions import ResourceNotFoundError
-import uuid
-from services.llm_service import query_llm
-from services.context_service import ContextService
-from services.message_service import MessageService
-from utils.logger import logger
-from datetime import datetime
-
-class ConversationService:
-    def __init__(self):
-        connection_string = (
-            f"DefaultEndpointsProtocol=https;"
-            f"AccountName={Config.AZURE_STORAGE_ACCOUNT_NAME};"
-            f"AccountKey={Config.AZURE_STORAGE_ACCOUNT_KEY};"
-            f"EndpointSuffix={Config.AZURE_STORAGE_ENDPOINT_SUFFIX}"
-        )
-        self.table_service = TableServiceClient.from_connection_string(connection_string)
-        self.conversations_table = self.table_service.get_table_client(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME)
-        self.contexts_blob_service = BlobServiceClient.from_connection_string(connection_string)
-        self.contexts_blob_container = self.contexts_blob_service.get_container_client(Config.AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER)
-        self.context_service = ContextService()
-        self.message_service = MessageService()
-
-    async def save_conversation(self, conversation: Conversation):      
-        logger.info(f"Saving conversation: {conversation}")
-        if conversation.conversation_id is None and conversation.messages is not None and len(conversation.messages) > 0:            
-            try:
-                conversation_entity = await self.create_conversation(conversation)
-                logger.info(f"Created conversation: {conversation_entity}")
-            except Exception as e:
-                logger.error(f"Error creating conversation: {e}")
-                raise HTTPException(status_code=500, detail=str(e))
-        else:
-            try:
-                conversation.updated_at = datetime.now().isoformat()
-                conversation_entity = await self.update_conversation(conversation)
-                logger.info(f"Updated conversation: {conversation_entity}")
-            except Exception as e:
-                logger.error(f"Error updating conversation: {e}")
-                raise HTTPException(status_code=500, detail=str(e))
-
-        messages_without_id = [message for message in conversation.messages if message.message_id is None and message.content != '']
-
-        # Save each message separately using MessageService
-        for message in messages_without_id:
-            logger.info(f"Saving message: {message}")
-            await self.message_service.save_message(message, conversation.conversation_id)
-
-        messages_to_update = [message for message in conversation.messages if message.message_id is not None and message.content != '']
-        for message in messages_to_update:
-            logger.info(f"Updating message: {message}")
-            await self.message_service.update_message(message)
-        
-        return conversation
-    
-    async def create_conversation(self, conversation: Conversation):
-        first_message = conversation.messages[0].content
-        conversation.conversation_id = str(uuid.uuid4())
-        conversation_entity = {
-            "PartitionKey": "conversations",
-            "RowKey": conversation.conversation_id,
-            "username": conversation.username,
-            "description": conversation.description,
-            "conversation_id": conversation.conversation_id,
-            "project_id": conversation.project_id,
-            "updated_at": conversation.updated_at
-        }
-        logger.info(f"Creating conversation entity: {conversation_entity}")
-        if conversation.description is None:
-            conversation.description = "No description provided"
-        convo_entity = self.conversations_table.create_entity(entity=conversation_entity)
-        logger.info(f"Created conversation entity: {convo_entity}")
-        return convo_entity
-
-    async def update_conversation(self, conversation: Conversation):
-        conversation_entity = {
-            "PartitionKey": "conversations",
-            "RowKey": conversation.conversation_id,
-            "username": conversation.username,
-            "description": conversation.description,
-            "conversation_id": conversation.conversation_id,
-            "project_id": conversation.project_id,
-            "updated_at": conversation.updated_at
-        }
-        convo_entity = self.conversations_table.update_entity(entity=conversation_entity, mode=UpdateMode.MERGE)
-        return convo_entity
-
-    async def get_conversation(self, conversation_id: str) -> Conversation:
-        try:
-            conversation_entity = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation_id)
-            messages = await self.message_service.get_messages_by_conversation_id(conversation_id)
-            sorted_messages = sorted(messages, key=lambda msg: msg.sequence)
-            
-            return Conversation(
-                conversation_id=conversation_entity['conversation_id'],
-                username=conversation_entity['username'],
-                description=conversation_entity.get('description'),
-                messages=sorted_messages,
-                updated_at=conversation_entity.get('updated_at')            
-            )
-        except Exception as e:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-
-    async def get_conversations_by_username(self, username: str) -> List[Conversation]:
-        # Query all conversations for the user
-        filter_query = f"PartitionKey eq 'conversations' and username eq '{username}'"
-        conversations = self.conversations_table.query_entities(filter_query)
-
-        # Convert the entities to Conversation objects
-        result = []
-        for entity in conversations:
-            # messages = await self.message_service.get_messages_by_conversation_id(entity['RowKey'])
-            first_message = await self.message_service.get_first_message_by_conversation_id(entity['RowKey'])
-            conversation = Conversation(
-                conversation_id=entity['RowKey'],
-                username=entity['username'],
-                description=entity.get('description', ''),
-                messages=[first_message],
-                updated_at=entity.get('updated_at'),
-                project_id=entity.get('project_id')
-            )
-            result.append(conversation)
-            
-        return result
-
-    async def get_conversations_by_project_id(self, project_id: str, include_messages: bool = True) -> List[Conversation]:
-        try:
-            # Query conversations table for all conversations with this project_id
-            conversations = self.conversations_table.query_entities(
-                f"PartitionKey eq 'conversations' and project_id eq '{project_id}'"
-            )
-            
-            # Convert entities to Conversation objects and include messages if requested
-            result = []
-            for conv in conversations:
-                conversation = self.create_conversation_from_entity(conv)
-                if include_messages:
-                    # Get messages for this conversation
-                    messages = await self.message_service.get_messages_by_conversation_id(conversation.conversation_id)
-                    conversation.messages = messages
-                result.append(conversation)
-                
-            return result
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-
-    def create_conversation_from_entity(self, entity: dict) -> Conversation:
-        return Conversation(
-            conversation_id=entity['RowKey'],
-            project_id=entity.get('project_id'),
-            username=entity.get('username'),
-            description=entity.get('description', ''),
-            updated_at=entity.get('updated_at'),
-            messages=[]  # Will be populated separately
-        )
-
-    async def delete_user_conversations(self, username: str):
-        try:
-            # Query all conversations for the user that do not belong to a project
-            filter_query = f"PartitionKey eq 'conversations' and username eq '{username}' and project_id eq ''"
-            conversations = self.conversations_table.query_entities(filter_query)
-
-            for conversation in conversations:
-                conversation_id = conversation['RowKey']
-                # Delete messages associated with the conversation
-                await self.message_service.delete_messages_by_conversation_id(conversation_id)
-                # Delete the conversation itself
-                self.conversations_table.delete_entity(partition_key="conversations", row_key=conversation_id)
-
-        except Exception as e:
-            logger.error(f"Error deleting user conversations: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
-
-    async def delete_conversations_by_project_id(self, project_id: str):
-        try:
-            # Query all conversations for the project
-            filter_query = f"PartitionKey eq 'conversations' and project_id eq '{project_id}'"
-            conversations = self.conversations_table.query_entities(filter_query)
-
-            for conversation in conversations:
-                conversation_id = conversation['RowKey']
-                # Delete messages associated with the conversation
-                await self.message_service.delete_messages_by_conversation_id(conversation_id)
-                # Delete the conversation itself
-                self.conversations_table.delete_entity(partition_key="conversations", row_key=conversation_id)
-
-        except Exception as e:
-            logger.error(f"Error deleting conversations for project {project_id}: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+import json
+from functools import partial
+from azure.core import MatchConditions
+from azure.data.tables import UpdateMode
+from fastapi import HTTPException
+from models import Conversation, Message, Context
+from config import Config
+from typing import List, Optional
+from azure.core.exceptions import ResourceNotFoundError, ResourceModifiedError
+import uuid
+from services.llm_service import query_llm
+from services.context_service import ContextService
+from services.message_service import MessageService
+from services.storage import get_table_client
+from services.search_index import search_index
+from services.conversation_snapshot import conversation_snapshots
+from services.title_service import title_worker, PLACEHOLDER_DESCRIPTION
+from utils.logger import logger, loggable
+from utils.metrics import metrics
+from utils.cache import TTLCache
+from datetime import datetime
+
+# Hot conversations (history plus contexts) shared by every ConversationService instance in the
+# process, so conversation-id based chat requests don't reload the whole history each turn.
+# Entries are (entity etag, Conversation) and are revalidated against the entity on every use, as
+# other workers write to the same conversations. Cached objects are shared: callers must not mutate them.
+conversation_cache = TTLCache(Config.CONVERSATION_CACHE_MAX_ENTRIES, Config.CONVERSATION_CACHE_TTL_SECONDS)
+
+class ConversationService:
+    def __init__(self):
+        self.context_service = ContextService()
+        self.message_service = MessageService()
+
+    @property
+    def conversations_table(self):
+        return get_table_client(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME)
+
+    async def save_conversation(self, conversation: Conversation):      
+        logger.debug(f"Saving conversation: {loggable(conversation)}")
+        if conversation.conversation_id is None and conversation.messages is not None and len(conversation.messages) > 0:            
+            try:
+                conversation_entity = await self.create_conversation(conversation)
+                logger.debug(f"Created conversation: {loggable(conversation_entity)}")
+            except Exception as e:
+                logger.error(f"Error creating conversation: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+        else:
+            try:
+                conversation.updated_at = datetime.now().isoformat()
+                conversation_entity = await self.update_conversation(conversation)
+                logger.debug(f"Updated conversation: {loggable(conversation_entity)}")
+            except Exception as e:
+                logger.error(f"Error updating conversation: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+
+        messages_without_id = [message for message in conversation.messages if message.message_id is None and message.content != '']
+
+        # Save each message separately using MessageService
+        for message in messages_without_id:
+            logger.debug(f"Saving message: {loggable(message)}")
+            await self.message_service.save_message(message, conversation.conversation_id)
+
+        messages_to_update = [message for message in conversation.messages if message.message_id is not None and message.content != '']
+        for message in messages_to_update:
+            logger.debug(f"Updating message: {loggable(message)}")
+            await self.message_service.update_message(message)
+
+        if Config.CONVERSATION_SNAPSHOTS_ENABLED:
+            # built from what was just saved rather than read back from the tables; it only counts if
+            # nothing else wrote to the conversation since our entity write, otherwise it is marked stale
+            saved_messages = [message for message in conversation.messages if message.message_id is not None]
+            self.publish_snapshot(conversation.conversation_id, saved_messages, conversation_entity['etag'])
+        else:
+            # the entity changes once more after the messages are written, so caches revalidating on its etag reload them
+            self.conversations_table.update_entity(entity={
+                "PartitionKey": "conversations",
+                "RowKey": conversation.conversation_id,
+                "updated_at": conversation.updated_at
+            }, mode=UpdateMode.MERGE)
+        conversation_cache.pop(conversation.conversation_id)
+        description = conversation.description if conversation.description != PLACEHOLDER_DESCRIPTION else None
+        await search_index.index_conversation(conversation.conversation_id, conversation.username, description, conversation.updated_at,
+                                              [(message.message_id, message.role, message.content) for message in conversation.messages])
+        self.request_title(conversation)
+        return conversation
+
+    def request_title(self, conversation: Conversation):
+        if conversation.description not in (None, '', PLACEHOLDER_DESCRIPTION):
+            return
+        first_message = next((message for message in sorted(conversation.messages, key=lambda message: message.sequence)
+                              if message.role == 'user' and message.content), None)
+        if first_message is not None:
+            title_worker.enqueue(conversation.conversation_id, first_message.content, conversation.username,
+                                 partial(self.set_generated_description, conversation.conversation_id))
+
+    async def set_generated_description(self, conversation_id: str, description: str, attempts: int = 3) -> bool:
+        """Store a generated title unless the conversation got a real description in the meantime"""
+        for _ in range(attempts):
+            try:
+                entity = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation_id)
+            except ResourceNotFoundError:
+                return False
+            if entity.get('description') not in (None, '', PLACEHOLDER_DESCRIPTION):
+                return False
+            try:
+                self.conversations_table.update_entity(entity={
+                    "PartitionKey": "conversations",
+                    "RowKey": conversation_id,
+                    "description": description
+                }, mode=UpdateMode.MERGE, etag=entity.metadata['etag'], match_condition=MatchConditions.IfNotModified)
+            except ResourceModifiedError:
+                # touched since we read it (a new turn or a rename), look again
+                continue
+            conversation_cache.pop(conversation_id)
+            await search_index.update_title(conversation_id, description)
+            return True
+        logger.warning(f"Gave up storing the generated title for conversation {conversation_id}, it kept changing")
+        return False
+    
+    def create_conversation_entity(self, conversation: Conversation) -> dict:
+        return {
+            "PartitionKey": "conversations",
+            "RowKey": conversation.conversation_id,
+            "username": conversation.username,
+            "description": conversation.description,
+            "conversation_id": conversation.conversation_id,
+            "project_id": conversation.project_id,
+            "updated_at": conversation.updated_at
+        }
+
+    async def create_conversation(self, conversation: Conversation):
+        first_message = conversation.messages[0].content
+        conversation.conversation_id = str(uuid.uuid4())
+        conversation_entity = self.create_conversation_entity(conversation)
+        logger.debug(f"Creating conversation entity: {loggable(conversation_entity)}")
+        if conversation.description is None:
+            conversation.description = PLACEHOLDER_DESCRIPTION
+        convo_entity = self.conversations_table.create_entity(entity=conversation_entity)
+        logger.debug(f"Created conversation entity: {loggable(convo_entity)}")
+        return convo_entity
+
+    async def update_conversation(self, conversation: Conversation):
+        conversation_entity = self.create_conversation_entity(conversation)
+        if conversation.description in (None, PLACEHOLDER_DESCRIPTION):
+            # clients send the placeholder back until they have seen the generated title, which must not be overwritten
+            del conversation_entity["description"]
+        convo_entity = self.conversations_table.update_entity(entity=conversation_entity, mode=UpdateMode.MERGE)
+        if "description" not in conversation_entity:
+            stored = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation.conversation_id)
+            if stored.get('description') not in (None, '', PLACEHOLDER_DESCRIPTION):
+                # the reply, the search index and request_title all go by the stored title
+                conversation.description = stored['description']
+        return convo_entity
+
+    async def get_conversation(self, conversation_id: str) -> Conversation:
+        try:
+            conversation_entity = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation_id)
+            conversation, _ = await self.load_conversation(conversation_entity)
+            return conversation
+        except Exception as e:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+    async def load_conversation(self, conversation_entity: dict) -> tuple[Conversation, Optional[str]]:
+        """
+        The conversation with its messages, and the entity's etag they are current as of (None when
+        that isn't known because publishing a snapshot failed)
+        """
+        conversation_id = conversation_entity['conversation_id']
+        etag = conversation_entity.metadata['etag']
+        messages = None
+        if Config.CONVERSATION_SNAPSHOTS_ENABLED and conversation_entity.get('snapshot_etag'):
+            messages = conversation_snapshots.load(conversation_id, conversation_entity['snapshot_etag'])
+        if messages is None:
+            messages = await self.message_service.get_messages_by_conversation_id(conversation_id)
+            if Config.CONVERSATION_SNAPSHOTS_ENABLED:
+                etag = self.publish_snapshot(conversation_id, messages, etag)
+        sorted_messages = sorted(messages, key=lambda msg: msg.sequence)
+
+        return Conversation(
+            conversation_id=conversation_entity['conversation_id'],
+            username=conversation_entity['username'],
+            description=conversation_entity.get('description'),
+            messages=sorted_messages,
+            project_id=conversation_entity.get('project_id'),
+            updated_at=conversation_entity.get('updated_at')
+        ), etag
+
+    def publish_snapshot(self, conversation_id: str, messages: List[Message], entity_etag: str) -> Optional[str]:
+        """
+        Stores a snapshot of messages read from the tables after the entity was at entity_etag. Every
+        message write changes the entity afterwards, so if it changed since, the messages may be out of
+        date and the snapshot is marked stale instead.
+        Returns the entity's new etag, or None when the snapshot wasn't stored.
+        """
+        try:
+            snapshot_etag = conversation_snapshots.write(conversation_id, sorted(messages, key=lambda message: message.sequence))
+            return self.conversations_table.update_entity(entity={
+                "PartitionKey": "conversations",
+                "RowKey": conversation_id,
+                "snapshot_etag": snapshot_etag
+            }, mode=UpdateMode.MERGE, etag=entity_etag, match_condition=MatchConditions.IfNotModified)['etag']
+        except ResourceModifiedError:
+            self.invalidate_snapshot(conversation_id)
+        except Exception as e:
+            logger.warning(f"Error storing the snapshot of conversation {conversation_id}: {str(e)}")
+            self.invalidate_snapshot(conversation_id)
+
+    def invalidate_snapshot(self, conversation_id: str):
+        try:
+            self.conversations_table.update_entity(entity={
+                "PartitionKey": "conversations",
+                "RowKey": conversation_id,
+                "snapshot_etag": ""
+            }, mode=UpdateMode.MERGE)
+        except Exception as e:
+            logger.warning(f"Error invalidating the snapshot of conversation {conversation_id}: {str(e)}")
+
+    async def get_cached_conversation(self, conversation_id: str) -> Conversation:
+        """
+        The conversation from the cache if its entity hasn't changed since it was cached. Every write to
+        a conversation's messages, from any worker, is followed by a write to its entity, so checking the
+        etag costs one point read instead of reloading the history.
+        """
+        try:
+            conversation_entity = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation_id)
+        except ResourceNotFoundError:
+            conversation_cache.pop(conversation_id)
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        cached = conversation_cache.get(conversation_id)
+        if cached is not None and cached[0] == conversation_entity.metadata['etag']:
+            metrics.increment("conversation_cache.hits")
+            return cached[1]
+        metrics.increment("conversation_cache.misses")
+        try:
+            conversation, etag = await self.load_conversation(conversation_entity)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        if etag is not None:
+            conversation_cache.set(conversation_id, (etag, conversation))
+        else:
+            conversation_cache.pop(conversation_id)
+        return conversation
+
+    async def get_conversation_summary(self, conversation_id: str) -> Conversation:
+        try:
+            conversation_entity = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation_id)
+            return self.create_conversation_from_entity(conversation_entity)
+        except ResourceNotFoundError:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+    async def append_messages(self, conversation_id: str, messages: List[Message]) -> List[Message]:
+        messages = [message for message in messages if message.content != '']
+        saved_messages = await self.message_service.save_messages(messages, conversation_id)
+        updated_at = datetime.now().isoformat()
+        changes = {
+            "PartitionKey": "conversations",
+            "RowKey": conversation_id,
+            "updated_at": updated_at
+        }
+        entity = self.conversations_table.get_entity(partition_key="conversations", row_key=conversation_id)
+        if Config.CONVERSATION_SNAPSHOTS_ENABLED:
+            etag = self.extend_snapshot(conversation_id, entity, saved_messages, changes)
+        else:
+            etag = self.merge_if_unchanged(entity, changes)
+        cached = conversation_cache.get(conversation_id)
+        if etag is not None and cached is not None and cached[0] == entity.metadata['etag']:
+            # nobody else wrote to the conversation since it was cached, so this turn is all that's missing;
+            # a copy, readers may still be using the cached one
+            conversation = cached[1].model_copy(update={"messages": cached[1].messages + saved_messages, "updated_at": updated_at})
+            conversation_cache.set(conversation_id, (etag, conversation))
+        else:
+            conversation_cache.pop(conversation_id)
+        await search_index.add_messages(conversation_id, [(message.message_id, message.role, message.content) for message in saved_messages])
+        return saved_messages
+
+    def merge_if_unchanged(self, entity: dict, changes: dict) -> Optional[str]:
+        """
+        Merges changes into the conversation entity. Returns the new etag when the entity was still as
+        read, None when something else changed it in between (the changes are merged all the same).
+        """
+        try:
+            return self.conversations_table.update_entity(entity=changes, mode=UpdateMode.MERGE, etag=entity.metadata['etag'],
+                                                          match_condition=MatchConditions.IfNotModified)['etag']
+        except ResourceModifiedError:
+            self.conversations_table.update_entity(entity=changes, mode=UpdateMode.MERGE)
+            return None
+
+    def extend_snapshot(self, conversation_id: str, entity: dict, messages: List[Message], changes: dict) -> Optional[str]:
+        """
+        Merges changes into the conversation entity together with a snapshot that has the new messages
+        appended. When the snapshot is stale, or anything else touched the conversation in between,
+        the snapshot is marked stale instead and the next read rebuilds it.
+        Returns the entity's new etag like merge_if_unchanged.
+        """
+        if entity.get('snapshot_etag'):
+            try:
+                snapshot_etag = conversation_snapshots.extend(conversation_id, entity['snapshot_etag'], messages)
+            except Exception as e:
+                logger.warning(f"Error extending the snapshot of conversation {conversation_id}: {str(e)}")
+                snapshot_etag = None
+            if snapshot_etag is not None:
+                try:
+                    return self.conversations_table.update_entity(entity={**changes, "snapshot_etag": snapshot_etag}, mode=UpdateMode.MERGE,
+                                                                  etag=entity.metadata['etag'], match_condition=MatchConditions.IfNotModified)['etag']
+                except ResourceModifiedError:
+                    self.conversations_table.update_entity(entity={**changes, "snapshot_etag": ""}, mode=UpdateMode.MERGE)
+                    return None
+        return self.merge_if_unchanged(entity, {**changes, "snapshot_etag": ""})
+
+    async def get_conversations_by_username(self, username: str) -> List[Conversation]:
+        # Query all conversations for the user
+        filter_query = f"PartitionKey eq 'conversations' and username eq '{username}'"
+        conversations = self.conversations_table.query_entities(filter_query)
+
+        # Convert the entities to Conversation objects
+        result = []
+        for entity in conversations:
+            # messages = await self.message_service.get_messages_by_conversation_id(entity['RowKey'])
+            first_message = await self.message_service.get_first_message_by_conversation_id(entity['RowKey'])
+            conversation = Conversation(
+                conversation_id=entity['RowKey'],
+                username=entity['username'],
+                description=entity.get('description', ''),
+                messages=[first_message],
+                updated_at=entity.get('updated_at'),
+                project_id=entity.get('project_id')
+            )
+            result.append(conversation)
+            
+        return result
+
+    async def get_conversations_by_project_id(self, project_id: str, include_messages: bool = True) -> List[Conversation]:
+        try:
+            # Query conversations table for all conversations with this project_id
+            conversations = self.conversations_table.query_entities(
+                f"PartitionKey eq 'conversations' and project_id eq '{project_id}'"
+            )
+            
+            # Convert entities to Conversation objects and include messages if requested
+            result = []
+            for conv in conversations:
+                conversation = self.create_conversation_from_entity(conv)
+                if include_messages:
+                    # Get messages for this conversation
+                    messages = await self.message_service.get_messages_by_conversation_id(conversation.conversation_id)
+                    conversation.messages = messages
+                result.append(conversation)
+                
+            return result
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def reindex_search(self, username: str) -> int:
+        """Rebuild the user's part of the search index from the tables, e.g. for data written before it existed"""
+        await search_index.remove_user(username)
+        conversations = self.conversations_table.query_entities(f"PartitionKey eq 'conversations' and username eq '{username}'")
+        count = 0
+        for entity in conversations:
+            messages = self.message_service.messages_table.query_entities(
+                f"PartitionKey eq 'messages' and conversation_id eq '{entity['RowKey']}'",
+                select=["message_id", "role", "content"]
+            )
+            description = entity.get('description')
+            await search_index.index_conversation(
+                entity['RowKey'], username, description if description != PLACEHOLDER_DESCRIPTION else None, entity.get('updated_at'),
+                [(message.get('message_id'), message.get('role'), message.get('content')) for message in messages]
+            )
+            count += 1
+        return count
+
+    def create_conversation_from_entity(self, entity: dict) -> Conversation:
+        return Conversation(
+            conversation_id=entity['RowKey'],
+            project_id=entity.get('project_id'),
+            username=entity.get('username'),
+            description=entity.get('description', ''),
+            updated_at=entity.get('updated_at'),
+            messages=[]  # Will be populated separately
+        )
+
+    async def delete_user_conversations(self, username: str):
+        try:
+            # Query all conversations for the user that do not belong to a project
+            filter_query = f"PartitionKey eq 'conversations' and username eq '{username}' and project_id eq ''"
+            conversations = self.conversations_table.query_entities(filter_query)
+
+            for conversation in conversations:
+                conversation_id = conversation['RowKey']
+                # Delete messages associated with the conversation
+                await self.message_service.delete_messages_by_conversation_id(conversation_id)
+                # Delete the conversation itself
+                self.conversations_table.delete_entity(partition_key="conversations", row_key=conversation_id)
+                conversation_snapshots.delete(conversation_id)
+                conversation_cache.pop(conversation_id)
+
+        except Exception as e:
+            logger.error(f"Error deleting user conversations: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def delete_conversations_by_project_id(self, project_id: str):
+        try:
+            # Query all conversations for the project
+            filter_query = f"PartitionKey eq 'conversations' and project_id eq '{project_id}'"
+            conversations = self.conversations_table.query_entities(filter_query)
+
+            for conversation in conversations:
+                conversation_id = conversation['RowKey']
+                # Delete messages associated with the conversation
+                await self.message_service.delete_messages_by_conversation_id(conversation_id)
+                # Delete the conversation itself
+                self.conversations_table.delete_entity(partition_key="conversations", row_key=conversation_id)
+                conversation_snapshots.delete(conversation_id)
+                conversation_cache.pop(conversation_id)
+
+        except Exception as e:
+            logger.error(f"Error deleting conversations for project {project_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,98 @@
+import json
+from typing import List, Optional
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from models import Message
+from config import Config
+from services.storage import get_blob_container_client
+from utils.logger import logger
+from utils.metrics import metrics
+
+SNAPSHOT_VERSION = 1
+
+class ConversationSnapshots:
+    """
+    One blob per conversation holding its messages and their contexts, so a conversation loads with a
+    single read instead of a message query, a context query per message and a blob per context.
+    The conversation entity's snapshot_etag names the blob version that matches the tables: a blob
+    with any other etag, or an entity without one, is stale and the tables are read instead.
+    Context contents over CONVERSATION_SNAPSHOT_INLINE_CHARS (images, mostly) are kept by reference
+    and read from their own blobs.
+    """
+
+    @property
+    def snapshots_container(self):
+        return get_blob_container_client(Config.CONVERSATION_SNAPSHOT_CONTAINER)
+
+    @property
+    def contexts_blob_container(self):
+        return get_blob_container_client(Config.AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER)
+
+    def blob_client(self, conversation_id: str):
+        return self.snapshots_container.get_blob_client(f"conversations/{conversation_id}.json")
+
+    def pack_message(self, message: Message) -> dict:
+        data = message.model_dump(mode="json")
+        for context in data["contexts"]:
+            if context["blob_name"] and len(context["content"]) > Config.CONVERSATION_SNAPSHOT_INLINE_CHARS:
+                context["content"] = None
+        return data
+
+    def unpack_message(self, data: dict) -> Message:
+        for context in data["contexts"]:
+            if context["content"] is None:
+                blob_client = self.contexts_blob_container.get_blob_client(context["blob_name"])
+                context["content"] = json.loads(blob_client.download_blob().readall())["content"]
+        return Message(**data)
+
+    def _download(self, conversation_id: str, etag: str) -> Optional[dict]:
+        # only the version the entity points at; raises ResourceModifiedError for any other
+        data = self.blob_client(conversation_id).download_blob(etag=etag, match_condition=MatchConditions.IfNotModified).readall()
+        snapshot = json.loads(data)
+        return snapshot if snapshot.get("version") == SNAPSHOT_VERSION else None
+
+    def load(self, conversation_id: str, etag: str) -> Optional[List[Message]]:
+        """The conversation's messages if the snapshot at `etag` is still there, otherwise None"""
+        try:
+            snapshot = self._download(conversation_id, etag)
+            messages = [self.unpack_message(message) for message in snapshot["messages"]] if snapshot is not None else None
+        except (ResourceNotFoundError, ResourceModifiedError):
+            messages = None
+        except Exception as e:
+            logger.warning(f"Error reading the snapshot of conversation {conversation_id}: {str(e)}")
+            messages = None
+        metrics.increment("conversation_snapshot.hits" if messages is not None else "conversation_snapshot.misses")
+        return messages
+
+    def write(self, conversation_id: str, messages: List[Message]) -> str:
+        """Replaces the snapshot, returns the new version's etag"""
+        data = json.dumps({"version": SNAPSHOT_VERSION, "messages": [self.pack_message(message) for message in messages]}, ensure_ascii=False)
+        metrics.increment("conversation_snapshot.writes")
+        return self.blob_client(conversation_id).upload_blob(data, overwrite=True)["etag"]
+
+    def extend(self, conversation_id: str, etag: str, messages: List[Message]) -> Optional[str]:
+        """
+        Appends messages to the snapshot at `etag`, returns the new version's etag, or None when the
+        snapshot is gone or was replaced in the meantime
+        """
+        try:
+            snapshot = self._download(conversation_id, etag)
+            if snapshot is None:
+                return None
+            snapshot["messages"].extend(self.pack_message(message) for message in messages)
+            data = json.dumps(snapshot, ensure_ascii=False)
+            new_etag = self.blob_client(conversation_id).upload_blob(
+                data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified
+            )["etag"]
+            metrics.increment("conversation_snapshot.writes")
+            return new_etag
+        except (ResourceNotFoundError, ResourceModifiedError):
+            return None
+
+    def delete(self, conversation_id: str):
+        try:
+            self.blob_client(conversation_id).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+conversation_snapshots = ConversationSnapshots()
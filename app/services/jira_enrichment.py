@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import List, Optional
+from config import Config
+from integrations.jira import JiraIntegration, issue_to_context
+from models import Context
+from services.user_service import UserService
+from utils.cache import TTLCache
+from utils.logger import logger
+from utils.metrics import metrics
+
+jira_integration = JiraIntegration()
+user_service = UserService()
+# story contexts per user and key, so a story mentioned again costs nothing
+story_cache = TTLCache(Config.JIRA_ENRICHMENT_CACHE_MAX_ENTRIES, Config.JIRA_ENRICHMENT_CACHE_TTL_SECONDS)
+# keys that failed (unknown or deleted issues, no access) are not retried for a good while
+failed_keys = TTLCache(Config.JIRA_ENRICHMENT_CACHE_MAX_ENTRIES, Config.JIRA_ENRICHMENT_FAILURE_TTL_SECONDS)
+PROJECT_KEYS = frozenset(key.strip().upper() for key in Config.JIRA_PROJECT_KEYS.split(",") if key.strip())
+# fetches that missed the deadline keep running to fill the cache for the next message
+background_fetches = set()
+
+async def fetch_story_context(username: str, story_key: str, user) -> Optional[Context]:
+    try:
+        issue = await jira_integration.get_story_details(story_key, user)
+        context = issue_to_context(issue)
+        story_cache.set(f"{username}:{story_key}", context)
+        return context
+    except Exception as e:
+        failed_keys.set(f"{username}:{story_key}", True)
+        logger.info(f"Could not fetch Jira story {story_key} for enrichment: {str(e)}")
+        return None
+
+async def jira_story_contexts(text: str, username: str) -> List[Context]:
+    """
+    Contexts for the Jira stories of JIRA_PROJECT_KEYS mentioned in a user message. Stories are fetched
+    concurrently with the user's stored Jira key; whatever has not arrived within
+    JIRA_ENRICHMENT_TIMEOUT_SECONDS is left out.
+    """
+    if not Config.JIRA_ENRICHMENT_ENABLED:
+        return []
+    keys = jira_integration.find_story_keys(text, Config.JIRA_ENRICHMENT_MAX_KEYS, PROJECT_KEYS)
+    if not keys:
+        return []
+
+    started = time.perf_counter()
+    contexts, missing = [], []
+    for key in keys:
+        cached = story_cache.get(f"{username}:{key}")
+        if cached is not None:
+            contexts.append(cached)
+        elif failed_keys.get(f"{username}:{key}") is None:
+            missing.append(key)
+    metrics.increment("jira.enrichment.cache_hits", len(contexts))
+    if missing:
+        try:
+            # a table read when the user isn't cached
+            user = await asyncio.to_thread(user_service.get_user_info, username)
+            jira_integration.api_key(user)
+        except Exception:
+            # no Jira key stored for this user, nothing to enrich with
+            return contexts
+        tasks = [asyncio.create_task(fetch_story_context(username, key, user)) for key in missing]
+        done, pending = await asyncio.wait(tasks, timeout=Config.JIRA_ENRICHMENT_TIMEOUT_SECONDS)
+        contexts.extend(context for task in tasks if task in done and (context := task.result()) is not None)
+        for task in pending:
+            background_fetches.add(task)
+            task.add_done_callback(background_fetches.discard)
+        if pending:
+            metrics.increment("jira.enrichment.timeouts", len(pending))
+            logger.info(f"Jira enrichment deadline passed with {len(pending)} of {len(missing)} stories outstanding")
+    metrics.observe("jira.enrichment.ms", (time.perf_counter() - started) * 1000)
+    if contexts:
+        logger.info(f"Attached {len(contexts)} Jira stories to the prompt: {', '.join(context.name.split(':', 1)[0] for context in contexts)}")
+    return contexts
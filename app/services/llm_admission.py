@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from utils.logger import logger
+from utils.metrics import metrics
+
+class LLMAdmissionController:
+    """
+    Gatekeeper in front of the Azure OpenAI deployment.
+    A request is admitted when a concurrency slot is free and the token-per-minute bucket can cover
+    its estimated cost. Waiting requests are queued per username and served round-robin, so one
+    user's burst can't starve everybody else. Rate limit signals from the API (429 with Retry-After,
+    or x-ratelimit-remaining-* reaching zero) pause admission for everyone until the window resets.
+    """
+
+    def __init__(self, max_concurrency: int, tokens_per_minute: int, max_backoff_seconds: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_backoff_seconds = max_backoff_seconds
+        self.active = 0
+        self.tokens = float(tokens_per_minute)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters = OrderedDict()  # username -> deque of (future, tokens), in round-robin order
+        self.queue_depth = 0
+        self._wakeup = None
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.tokens_per_minute:
+            self.tokens = min(self.tokens_per_minute, self.tokens + (now - self.refilled_at) * self.tokens_per_minute / 60)
+        self.refilled_at = now
+
+    def _can_admit(self, tokens: int) -> Optional[float]:
+        """None when a request of this cost can start now, otherwise how long until it might"""
+        now = time.monotonic()
+        if self.paused_until > now:
+            return self.paused_until - now
+        if self.active >= self.max_concurrency:
+            return float('inf')
+        if self.tokens_per_minute:
+            self._refill()
+            if self.tokens < tokens:
+                return (tokens - self.tokens) * 60 / self.tokens_per_minute
+        return None
+
+    def _grant(self, tokens: int):
+        self.active += 1
+        if self.tokens_per_minute:
+            self.tokens -= tokens
+        metrics.set_gauge("llm.admission.active", self.active)
+
+    def _dispatch(self):
+        while self.waiters:
+            username, queue = next(iter(self.waiters.items()))
+            future, tokens = queue[0]
+            if future.done():
+                # cancelled while waiting
+                queue.popleft()
+                self.queue_depth -= 1
+                if not queue:
+                    del self.waiters[username]
+                continue
+            delay = self._can_admit(tokens)
+            if delay is not None:
+                if delay != float('inf'):
+                    self._schedule_wakeup(delay)
+                break
+            queue.popleft()
+            self.queue_depth -= 1
+            # rotate: this user goes to the back of the line
+            del self.waiters[username]
+            if queue:
+                self.waiters[username] = queue
+            self._grant(tokens)
+            future.set_result(None)
+        metrics.set_gauge("llm.admission.queue_depth", self.queue_depth)
+
+    def _schedule_wakeup(self, delay: float):
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _cap_tokens(self, tokens: int) -> int:
+        # a single request larger than the whole bucket would otherwise wait forever
+        return min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+
+    @asynccontextmanager
+    async def admit(self, username: Optional[str], estimated_tokens: int):
+        username = username or "anonymous"
+        tokens = self._cap_tokens(estimated_tokens)
+        started = time.perf_counter()
+        if not self.waiters and self._can_admit(tokens) is None:
+            self._grant(tokens)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(username, deque()).append((future, tokens))
+            self.queue_depth += 1
+            metrics.set_gauge("llm.admission.queue_depth", self.queue_depth)
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # admitted just as we were cancelled, give the slot back
+                    self.release()
+                raise
+        wait_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("llm.admission.wait_ms", wait_ms)
+        if wait_ms > 1000:
+            logger.info(f"LLM request for {username} waited {wait_ms:.0f} ms for admission")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def release(self):
+        self.active -= 1
+        metrics.set_gauge("llm.admission.active", self.active)
+        self._dispatch()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        metrics.increment("llm.admission.pauses")
+
+    def backoff_delay(self, headers, attempt: int, base_seconds: float = 1.0) -> float:
+        """Delay before retrying a throttled request: Retry-After when given, else jittered exponential backoff"""
+        retry_after = headers.get('retry-after-ms')
+        if retry_after is not None:
+            delay = float(retry_after) / 1000
+        elif (retry_after := headers.get('retry-after')) is not None and retry_after.replace('.', '', 1).isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(self.max_backoff_seconds, base_seconds * 2 ** attempt))
+        # a little jitter so queued requests don't all retry on the same tick
+        return min(self.max_backoff_seconds, delay + random.uniform(0, 0.25 * base_seconds))
+
+    def observe_rate_limit_headers(self, headers):
+        remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+        if remaining_tokens is not None and remaining_tokens.isdigit() and self.tokens_per_minute:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining_tokens))
+        remaining_requests = headers.get('x-ratelimit-remaining-requests')
+        if remaining_requests == '0' or remaining_tokens == '0':
+            self.pause(self.backoff_delay(headers, 0))
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+from config import Config
+from utils.cache import TTLCache
+from utils.logger import logger
+from utils.metrics import metrics
+
+# payload fields that change how a response is delivered, not what it says
+TRANSPORT_FIELDS = ('stream', 'stream_options')
+# a sweep over the disk limits evicts down to this share of them, so sweeps stay rare
+DISK_SWEEP_TARGET = 0.9
+
+def is_cacheable(payload: dict) -> bool:
+    return payload.get('temperature') == 0 and not payload.get('n', 1) > 1
+
+def cache_key(payload: dict, deployments: List[str]) -> str:
+    # any of the deployments may serve the call, so only calls routed over the same ones share entries;
+    # a model named in the payload is part of the payload
+    canonical = json.dumps({
+        "deployments": sorted(set(deployments)),
+        "payload": {key: value for key, value in payload.items() if key not in TRANSPORT_FIELDS}
+    }, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class LLMResponseCache:
+    """
+    Completion cache for deterministic (temperature 0) calls.
+    Entries live in an in-memory LRU and, when a directory is configured, in one JSON file per
+    key so they survive restarts. Both tiers honour the same TTL. The directory is kept under
+    disk_max_entries files and disk_max_bytes: once a write goes over either, expired files and
+    then the oldest ones are removed.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, directory: Optional[str] = None,
+                 disk_max_entries: int = 10000, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries, ttl_seconds)
+        self.directory = Path(directory) if directory else None
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        # running estimates of the directory's size, made exact by each sweep
+        self._disk_entries = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _read_disk(self, key: str) -> tuple[Optional[str], float]:
+        """The entry's content and how many seconds it has left, (None, 0) when there is none"""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None, 0
+        remaining = entry['created_at'] + self.ttl_seconds - time.time()
+        if remaining <= 0:
+            path.unlink(missing_ok=True)
+            return None, 0
+        return entry['content'], remaining
+
+    def _write_disk(self, key: str, content: str):
+        path = self._path(key)
+        temp_path = path.with_suffix('.tmp')
+        data = json.dumps({"created_at": time.time(), "content": content})
+        temp_path.write_text(data, encoding='utf-8')
+        temp_path.replace(path)
+        with self._disk_lock:
+            if self._disk_entries is None:
+                self._sweep_disk(force=True)
+            # an overwritten key is counted twice until the next sweep, which only makes it come early
+            self._disk_entries += 1
+            self._disk_bytes += len(data.encode('utf-8'))
+            self._sweep_disk()
+
+    def _sweep_disk(self, force: bool = False):
+        """Removes expired files, then the oldest ones until the directory is back under its limits"""
+        if not force and self._disk_entries <= self.disk_max_entries and self._disk_bytes <= self.disk_max_bytes:
+            return
+        expires_before = time.time() - self.ttl_seconds
+        files = []
+        removed = 0
+        for path in self.directory.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # a file is written once per entry, so its mtime is the entry's created_at
+            if stat.st_mtime <= expires_before:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total_bytes = sum(size for _, size, _ in files)
+        max_entries = self.disk_max_entries if force else int(self.disk_max_entries * DISK_SWEEP_TARGET)
+        max_bytes = self.disk_max_bytes if force else int(self.disk_max_bytes * DISK_SWEEP_TARGET)
+        evicted = 0
+        while files and (len(files) - evicted > max_entries or total_bytes > max_bytes):
+            _, size, path = files[evicted]
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+            evicted += 1
+        self._disk_entries = len(files) - evicted
+        self._disk_bytes = total_bytes
+        if removed or evicted:
+            metrics.increment("llm.cache.disk_evictions", removed + evicted)
+            logger.info(f"LLM cache sweep removed {removed} expired and {evicted} oldest entries, {self._disk_entries} left")
+
+    async def get(self, key: str) -> Optional[str]:
+        content = self.memory.get(key)
+        if content is None and self.directory:
+            try:
+                content, remaining = await asyncio.to_thread(self._read_disk, key)
+                if content is not None:
+                    # the entry keeps its original expiry
+                    self.memory.set(key, content, ttl_seconds=remaining)
+            except Exception as e:
+                logger.error(f"Error reading LLM cache entry {key}: {str(e)}")
+        metrics.increment("llm.cache.hits" if content is not None else "llm.cache.misses")
+        return content
+
+    async def set(self, key: str, content: str):
+        self.memory.set(key, content)
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write_disk, key, content)
+            except Exception as e:
+                logger.error(f"Error writing LLM cache entry {key}: {str(e)}")
+
+llm_response_cache = LLMResponseCache(
+    Config.LLM_CACHE_MAX_ENTRIES,
+    Config.LLM_CACHE_TTL_SECONDS,
+    Config.LLM_CACHE_DIR,
+    Config.LLM_CACHE_DISK_MAX_ENTRIES,
+    Config.LLM_CACHE_DISK_MAX_BYTES
+)
@@ -0,0 +1,121 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from config import Config
+from utils.logger import logger
+from utils.metrics import metrics
+
+class LLMEndpoint:
+    """One Azure OpenAI deployment plus the routing state kept for it"""
+
+    def __init__(self, name: str, url: str, api_key: str, api_version: str, deployment: str, weight: float = 1.0):
+        self.name = name
+        self.url = url if url.endswith('/') else f"{url}/"
+        self.api_key = api_key
+        self.api_version = api_version
+        self.deployment = deployment
+        self.weight = weight if weight > 0 else 1.0
+        self.outstanding = 0
+        self.latency_seconds = 1.0  # moving average, seeded so untried endpoints look average
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def completions_url(self) -> str:
+        return f"{self.url}openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "api-key": self.api_key,
+            "Content-Type": "application/json"
+        }
+
+    def is_available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+class LLMEndpointPool:
+    """
+    Routes each call to the endpoint with the lowest (outstanding + 1) * latency / weight.
+    An endpoint that fails failure_threshold times in a row (5xx, 429 or transport errors) is
+    ejected for ejection_seconds; afterwards it gets traffic again as a probe and is ejected
+    straight away if that probe fails too.
+    """
+
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, endpoints: List[LLMEndpoint], failure_threshold: int, ejection_seconds: float):
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def deployments(self) -> List[str]:
+        return [endpoint.deployment for endpoint in self.endpoints]
+
+    def _score(self, endpoint: LLMEndpoint) -> float:
+        return (endpoint.outstanding + 1) * endpoint.latency_seconds / endpoint.weight
+
+    def choose(self, exclude: Optional[set] = None) -> LLMEndpoint:
+        now = time.monotonic()
+        exclude = exclude or set()
+        candidates = [e for e in self.endpoints if e.is_available(now) and e.name not in exclude] \
+            or [e for e in self.endpoints if e.is_available(now)]
+        if not candidates:
+            # everything is ejected: probe whichever comes back first
+            return min(self.endpoints, key=lambda e: e.ejected_until)
+        return min(candidates, key=self._score)
+
+    def has_alternative(self, exclude: set) -> bool:
+        now = time.monotonic()
+        return any(e.is_available(now) and e.name not in exclude for e in self.endpoints)
+
+    @contextmanager
+    def track(self, endpoint: LLMEndpoint):
+        endpoint.outstanding += 1
+        try:
+            yield
+        finally:
+            endpoint.outstanding -= 1
+
+    def record_success(self, endpoint: LLMEndpoint, latency_seconds: float):
+        endpoint.latency_seconds += self.LATENCY_SMOOTHING * (latency_seconds - endpoint.latency_seconds)
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            logger.info(f"LLM endpoint {endpoint.name} is healthy again")
+        endpoint.consecutive_failures = 0
+        metrics.observe(f"llm.endpoint.{endpoint.name}.latency_seconds", latency_seconds)
+
+    def record_failure(self, endpoint: LLMEndpoint, reason: str):
+        endpoint.consecutive_failures += 1
+        metrics.increment(f"llm.endpoint.{endpoint.name}.failures")
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+            metrics.increment(f"llm.endpoint.{endpoint.name}.ejections")
+            logger.warning(f"Ejecting LLM endpoint {endpoint.name} for {self.ejection_seconds}s after "
+                           f"{endpoint.consecutive_failures} consecutive failures ({reason})")
+
+def load_endpoints() -> List[LLMEndpoint]:
+    """
+    AZURE_OPENAI_ENDPOINTS holds a JSON list of {"name", "url", "api_key", "api_version", "deployment", "weight"};
+    missing fields fall back to the single-deployment settings
+    """
+    if not Config.AZURE_OPENAI_ENDPOINTS:
+        return [LLMEndpoint("default", Config.AZURE_OPENAI_URL or "", Config.AZURE_OPENAI_API_KEY,
+                            Config.AZURE_OPENAI_API_VERSION, Config.AZURE_OPENAI_MODEL)]
+    return [
+        LLMEndpoint(
+            name=entry.get("name", f"endpoint-{i}"),
+            url=entry["url"],
+            api_key=entry.get("api_key", Config.AZURE_OPENAI_API_KEY),
+            api_version=entry.get("api_version", Config.AZURE_OPENAI_API_VERSION),
+            deployment=entry.get("deployment", Config.AZURE_OPENAI_MODEL),
+            weight=float(entry.get("weight", 1.0))
+        )
+        for i, entry in enumerate(json.loads(Config.AZURE_OPENAI_ENDPOINTS))
+    ]
+
+endpoint_pool = LLMEndpointPool(load_endpoints(), Config.LLM_ENDPOINT_FAILURE_THRESHOLD, Config.LLM_ENDPOINT_EJECTION_SECONDS)
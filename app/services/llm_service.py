@@ -1,200 +1,280 @@
-import json
-import httpx
-from config import Config
-from utils.logger import logger
-from models.chat import Message
-from models.context import Context
-from typing import Literal, Optional, List, Dict
-import math
-import tiktoken
-MAX_TOKENS = Config.MAX_TOKENS
-TIMEOUT_CONFIG = httpx.Timeout(
-    connect=10.0,    # connection timeout
-    read=300.0,      # read timeout
-    write=10.0,      # write timeout
-    pool=10.0        # pool timeout
-)
-
-encoding = tiktoken.encoding_for_model("gpt-4")
-
-def count_tokens(text: str, model: str = "gpt-4") -> int:
-    return len(encoding.encode(text))
-
-def build_chat_message_with_contexts(message: Message, contexts: list[Context] = None) -> dict:
-    text_contexts = [ctx for ctx in contexts if ctx.type != 'image'] if contexts != None else None
-    image_contexts = [ctx for ctx in contexts if ctx.type == 'image'] if contexts != None else None
-    context_parts = [f"{ctx.type}: {ctx.content}" for ctx in text_contexts]
-    
-    context_str = "\nContexts: " + ", ".join(context_parts) if context_parts else ""
-    text_content = f"{message.content}{context_str}" if text_contexts != None else message.content
-    chat_message = {
-        "role": message.role,
-        "content": text_content
-    }
-
-    if image_contexts:
-        # build image content for each image context
-        chat_message['content'] = [{"type": "text", "text": text_content}]
-        for ctx in image_contexts:
-            if ctx.type == 'image':
-                chat_message['content'].append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{ctx.content}"}})
-
-    return chat_message
-
-# Find the earliest user message and update it to include project contexts
-def add_project_contexts(chat_messages: list, messages: list[Message], project_contexts: list[Context] = None):
-    for i in range(len(chat_messages)-1, -1, -1):
-        if chat_messages[i]['role'] == 'user':
-            all_contexts = messages[i].contexts or []
-            all_contexts.extend(project_contexts or [])
-            chat_messages[i]['content'] = build_chat_message_with_contexts(messages[i], all_contexts)['content']
-            break
-
-def build_chat_messages_for_api(messages: list[Message], project_contexts: list = None, max_tokens: int = MAX_TOKENS) -> list[str]:
-    chat_messages = []
-    max_input_tokens = math.floor(max_tokens * 0.9)
-    logger.info(f"Max input tokens: {max_input_tokens}")
-    
-    # Calculate the length of the project contexts
-    project_context_str = "\nContexts: " + ", ".join([f"{ctx.type}: {ctx.content}" for ctx in project_contexts]) if project_contexts else ""
-    project_context_length = len(project_context_str)
-    
-    # Adjust max tokens to account for project contexts
-    adjusted_max_tokens = max_input_tokens - project_context_length
-    if adjusted_max_tokens < 0:
-        raise ValueError(f"Project contexts are too long, max tokens: {max_input_tokens}, project contexts length: {project_context_length}")
-    
-    messages_sorted_by_sequence_desc = sorted(messages, key=lambda x: x.sequence, reverse=True)
-    logger.info(f"Messages sorted by sequence: {messages_sorted_by_sequence_desc}")
-
-    used_tokens = 0
-    
-    for message in messages_sorted_by_sequence_desc:
-        chat_message = build_chat_message_with_contexts(message, message.contexts)
-        logger.info(f"Message: {chat_message}")
-        if (used_tokens + count_tokens(chat_message['content'])) > adjusted_max_tokens:
-            chat_message = build_chat_message_with_contexts(message, [])
-            if (used_tokens + count_tokens(chat_message['content'])) > adjusted_max_tokens:
-                break
-        chat_messages.insert(0, chat_message)
-        used_tokens += count_tokens(chat_message['content'] )
-
-    add_project_contexts(chat_messages, messages, project_contexts)
-
-    return chat_messages
-
-def add_conversation_system_message(chat_messages: list):
-    if not any(msg['role'] == 'system' for msg in chat_messages):
-        chat_messages.insert(0, {
-            "role": 'system',
-            "content": "You are a helpful AI assistant for a company's internal chat system. "
-                   "Provide clear, professional responses while maintaining a friendly tone. "
-                   "If you're unsure about something, acknowledge the uncertainty and suggest alternatives "
-                   "or ask for clarification."
-        })
-
-async def get_api_call_params(chat_messages: list[dict], contexts: list = None):
-    headers = {
-        "api-key": Config.AZURE_OPENAI_API_KEY,
-        "Content-Type": "application/json"
-    }
-    logger.info(f"Headers: {headers}")
-    
-    payload = {
-        "messages": chat_messages, 
-        "max_tokens": Config.MAX_OUTPUT_TOKENS,
-        "temperature": 0
-    }
-    
-    url = f"{Config.AZURE_OPENAI_URL}openai/deployments/{Config.AZURE_OPENAI_MODEL}/chat/completions?api-version={Config.AZURE_OPENAI_API_VERSION}"
-    logger.info(f"URL: {url}")
-    logger.info(f"Payload: {payload}")
-    return headers, payload, url
-
-async def query_llm(content: str):
-    logger.info(f"Querying LLM with content: {content}")
-    messages = [Message(role="user", content=content)]
-    return await chat_with_llm(messages)
-
-async def chat_with_llm(messages: list[Message]):
-    logger.info(f"Chatting with LLM with {len(messages)} messages")
-    chat_messages = build_chat_messages_for_api(messages)
-    add_conversation_system_message(chat_messages)
-    headers, payload, url = await get_api_call_params(chat_messages)
-    return await call_llm_api(headers, payload, url)
-
-async def call_llm_api(headers, payload, url):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            contents = json.loads(response.text)
-            return contents['choices'][0]['message']['content']
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
-            raise
-        except Exception as e:
-            logger.error(f"An error occurred: {str(e)}")
-            raise
-
-async def chat_with_llm_stream(messages: list[Message], contexts: list = None):
-    logger.info(f"Starting streaming response for chat with {len(messages)} messages")
-    chat_messages = build_chat_messages_for_api(messages, contexts)
-    logger.info(f"Chat messages: {chat_messages}")
-    add_conversation_system_message(chat_messages)
-    headers, payload, url = await get_api_call_params(chat_messages)
-    payload["stream"] = True
-    logger.info(f"Payload: {payload}")
-    
-    async with httpx.AsyncClient(timeout=TIMEOUT_CONFIG) as client:
-        try:
-            async with client.stream('POST', url, headers=headers, json=payload) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.strip():
-                        if line.startswith('data: '):
-                            line = line[6:]
-                        if line != '[DONE]':
-                            try:
-                                chunk = json.loads(line)
-                                if chunk and 'choices' in chunk and chunk['choices']:
-                                    content = chunk['choices'][0].get('delta', {}).get('content', '')
-                                    if content:
-                                        yield content
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Error parsing chunk: {str(e)}")
-                                continue
-        except httpx.HTTPStatusError as e:
-            # getting this error:
-            # | httpx.ResponseNotRead: Attempted to access streaming response content, without having called `read()`.
-            # how can we check that the response is read?
-            # answer:
-            try:
-                logger.error(f"HTTP error occurred during streaming: {e.response.status_code} - {e.response.text}")
-                raise
-            except Exception as inner_e:
-                logger.error(f"An error occurred during logging of error: {str(inner_e)}")
-                logger.error(f"payload for original error: {payload}")
-                raise
-        except Exception as e:
-            logger.error(f"An error occurred during streaming: {str(e)}")
-            raise
-
-async def generate_conversation_description_with_llm(first_message: str, contexts: list = []) -> str:
-    prompt = f"You are an assistant that generates short descriptions for conversations. "
-    "This description will be saved as the title of the conversation for future reference, "
-    "so it needs to be concise and descriptive."
-    logger.info(f"Generating description with prompt: {prompt}")
-    system_message = {
-        "role": "system",
-        "content": prompt.format(first_message)
-    }
-    first_message = f"The first message in the conversation is: {first_message}"
-    user_message = build_chat_message_with_contexts(Message(role="user", content=first_message), contexts)
-    messages = [system_message, user_message]    
-    try:
-        headers, payload, url = await get_api_call_params(messages)
-        return await call_llm_api(headers, payload, url)
-    except Exception as e:
-        logger.error(f"Error generating description: {str(e)}")
-        return "Error generating description"
\ No newline at end of file
+import json
+import math
+import time
+import httpx
+from fastapi import HTTPException
+from config import Config
+from utils.logger import logger, loggable, truncate
+from utils.metrics import metrics
+from services.llm_admission import LLMAdmissionController
+from services.llm_endpoints import LLMEndpoint, endpoint_pool
+from services.llm_cache import llm_response_cache, cache_key, is_cacheable
+from models.chat import Message
+from typing import Optional
+from services.prompt_packer import pack_chat_messages, count_message_tokens, truncate_to_tokens
+MAX_TOKENS = Config.MAX_TOKENS
+TIMEOUT_CONFIG = httpx.Timeout(
+    connect=10.0,    # connection timeout
+    read=300.0,      # read timeout
+    write=10.0,      # write timeout
+    pool=10.0        # pool timeout
+)
+admission = LLMAdmissionController(Config.LLM_MAX_CONCURRENCY, Config.LLM_TOKENS_PER_MINUTE)
+# cached completions are replayed on the stream endpoint in chunks of this many characters
+CACHE_REPLAY_CHUNK_CHARS = 32
+
+SYSTEM_PROMPT = ("You are a helpful AI assistant for a company's internal chat system. "
+                 "Provide clear, professional responses while maintaining a friendly tone. "
+                 "If you're unsure about something, acknowledge the uncertainty and suggest alternatives "
+                 "or ask for clarification.")
+
+TITLE_PROMPT = ("You are an assistant that writes titles for conversations. "
+                "The title is saved for future reference, so it needs to be concise and descriptive. "
+                "Reply with a title of at most eight words for the conversation that starts with the user's message, "
+                "without quotes or trailing punctuation.")
+
+def build_chat_messages_for_api(messages: list[Message], project_contexts: list = None, max_tokens: int = MAX_TOKENS,
+                                layout: str = Config.PROMPT_LAYOUT, turn_contexts: list = None) -> list[dict]:
+    system_message = {"role": "system", "content": SYSTEM_PROMPT}
+    packed = pack_chat_messages(messages, project_contexts, max_tokens, reserved_tokens=count_message_tokens(system_message), layout=layout,
+                                turn_contexts=turn_contexts)
+    logger.info(f"Packed {len(packed.messages)} of {len(messages)} messages into {packed.used_tokens}/{packed.max_input_tokens} tokens")
+    if packed.dropped_message_sequences or packed.dropped_contexts or packed.deduplicated_contexts:
+        logger.info(f"Dropped messages: {packed.dropped_message_sequences}, dropped contexts: {packed.dropped_contexts}, "
+                    f"deduplicated contexts: {packed.deduplicated_contexts}")
+    if layout == 'stable_prefix':
+        # the system prompt and project contexts form a byte-stable prefix, the turns follow
+        return [system_message] + packed.prefix + packed.messages
+    return packed.messages
+
+def record_usage(usage: Optional[dict]):
+    if not usage:
+        return
+    prompt_tokens = usage.get('prompt_tokens', 0)
+    completion_tokens = usage.get('completion_tokens', 0)
+    cached_tokens = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+    logger.info(f"LLM usage: prompt tokens: {prompt_tokens}, cached prompt tokens: {cached_tokens}, completion tokens: {completion_tokens}")
+    metrics.increment("llm.prompt_tokens", prompt_tokens)
+    metrics.increment("llm.cached_prompt_tokens", cached_tokens)
+    metrics.increment("llm.completion_tokens", completion_tokens)
+    if prompt_tokens:
+        metrics.observe("llm.prompt_cache_hit_ratio", cached_tokens / prompt_tokens)
+
+def add_conversation_system_message(chat_messages: list):
+    if not any(msg['role'] == 'system' for msg in chat_messages):
+        chat_messages.insert(0, {
+            "role": 'system',
+            "content": SYSTEM_PROMPT
+        })
+
+def build_api_payload(chat_messages: list[dict], max_tokens: int = None) -> dict:
+    payload = {
+        "messages": chat_messages, 
+        "max_tokens": max_tokens or Config.MAX_OUTPUT_TOKENS,
+        "temperature": 0
+    }
+    logger.debug(f"Payload: {loggable(payload)}")
+    return payload
+
+def estimate_request_tokens(payload: dict) -> int:
+    # the same rough estimate Azure charges against the deployment's TPM quota: prompt characters / 4 plus max_tokens
+    return len(json.dumps(payload['messages'])) // 4 + payload.get('max_tokens', 0)
+
+def throttle(response: httpx.Response, attempt: int) -> float:
+    delay = admission.backoff_delay(response.headers, attempt)
+    admission.pause(delay)
+    metrics.increment("llm.throttled")
+    logger.info(f"LLM request throttled (attempt {attempt + 1}), pausing admission for {delay:.1f}s")
+    return delay
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+def retry_after_failure(endpoint: LLMEndpoint, attempt: int, tried: set, reason: str, response: httpx.Response = None) -> bool:
+    """Record a failed attempt and decide whether to try again: on another endpoint if one is left, else after a backoff when throttled"""
+    endpoint_pool.record_failure(endpoint, reason)
+    tried.add(endpoint.name)
+    can_retry = attempt < Config.LLM_MAX_RETRIES
+    if can_retry and endpoint_pool.has_alternative(tried):
+        logger.info(f"Failing over from LLM endpoint {endpoint.name} ({reason})")
+        metrics.increment("llm.failovers")
+        return True
+    if response is not None and response.status_code == 429:
+        delay = throttle(response, attempt)
+        if can_retry:
+            # every endpoint is throttled, wait for whichever recovers first
+            tried.clear()
+            return True
+        raise_rate_limited(delay)
+    return False
+
+def observe_rate_limit_headers(response: httpx.Response):
+    # the admission budget models a single deployment, so only its own headers can steer it
+    if len(endpoint_pool) == 1:
+        admission.observe_rate_limit_headers(response.headers)
+
+def raise_rate_limited(delay: float):
+    raise HTTPException(status_code=429, detail="The language model is busy, please try again shortly",
+                        headers={"Retry-After": str(math.ceil(delay))})
+
+def use_response_cache(payload: dict, use_cache: bool) -> bool:
+    return use_cache and Config.LLM_CACHE_ENABLED and is_cacheable(payload)
+
+async def query_llm(content: str, use_cache: bool = True, username: str = None):
+    logger.debug(f"Querying LLM with content: {loggable(content)}")
+    messages = [Message(role="user", content=content)]
+    return await chat_with_llm(messages, use_cache, username)
+
+async def chat_with_llm(messages: list[Message], use_cache: bool = True, username: str = None):
+    logger.info(f"Chatting with LLM with {len(messages)} messages")
+    chat_messages = build_chat_messages_for_api(messages)
+    add_conversation_system_message(chat_messages)
+    payload = build_api_payload(chat_messages)
+    return await call_llm_api(payload, use_cache, username)
+
+async def call_llm_api(payload, use_cache: bool = True, username: str = None):
+    key = cache_key(payload, endpoint_pool.deployments) if use_response_cache(payload, use_cache) else None
+    if key and (cached := await llm_response_cache.get(key)) is not None:
+        logger.info(f"Serving LLM response from cache: {key}")
+        return cached
+    estimated_tokens = estimate_request_tokens(payload)
+    tried = set()
+    async with httpx.AsyncClient() as client:
+        try:
+            for attempt in range(Config.LLM_MAX_RETRIES + 1):
+                endpoint = endpoint_pool.choose(tried)
+                try:
+                    async with admission.admit(username, estimated_tokens):
+                        with endpoint_pool.track(endpoint):
+                            started = time.perf_counter()
+                            response = await client.post(endpoint.completions_url, headers=endpoint.headers, json=payload)
+                            latency = time.perf_counter() - started
+                except httpx.TransportError as e:
+                    if retry_after_failure(endpoint, attempt, tried, str(e)):
+                        continue
+                    raise
+                observe_rate_limit_headers(response)
+                if not is_retryable_status(response.status_code):
+                    endpoint_pool.record_success(endpoint, latency)
+                    break
+                if not retry_after_failure(endpoint, attempt, tried, f"HTTP {response.status_code}", response):
+                    break
+            response.raise_for_status()
+            contents = json.loads(response.text)
+            record_usage(contents.get('usage'))
+            choice = contents['choices'][0]
+            if key and choice.get('finish_reason') == 'stop':
+                await llm_response_cache.set(key, choice['message']['content'])
+            return choice['message']['content']
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP error occurred: {e.response.status_code} - {truncate(e.response.text)}")
+            raise
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"An error occurred: {str(e)}")
+            raise
+
+async def chat_with_llm_stream(messages: list[Message], contexts: list = None, use_cache: bool = True, stream_info: dict = None,
+                               username: str = None, turn_contexts: list = None):
+    # stream_info, when given, is filled with the usage reported by the API and whether the answer came from the cache
+    # contexts are sent with every turn; turn_contexts were picked for this turn and go with the user's message
+    stream_info = stream_info if stream_info is not None else {}
+    logger.info(f"Starting streaming response for chat with {len(messages)} messages")
+    chat_messages = build_chat_messages_for_api(messages, contexts, turn_contexts=turn_contexts)
+    logger.debug(f"Chat messages: {loggable(chat_messages)}")
+    add_conversation_system_message(chat_messages)
+    payload = build_api_payload(chat_messages)
+    payload["stream"] = True
+    if Config.AZURE_OPENAI_STREAM_INCLUDE_USAGE:
+        payload["stream_options"] = {"include_usage": True}
+
+    key = cache_key(payload, endpoint_pool.deployments) if use_response_cache(payload, use_cache) else None
+    if key and (cached := await llm_response_cache.get(key)) is not None:
+        logger.info(f"Replaying LLM response from cache: {key}")
+        stream_info['cached'] = True
+        for i in range(0, len(cached), CACHE_REPLAY_CHUNK_CHARS):
+            yield cached[i:i + CACHE_REPLAY_CHUNK_CHARS]
+        return
+
+    streamed = []
+    finish_reason = None
+    estimated_tokens = estimate_request_tokens(payload)
+    tried = set()
+    async with httpx.AsyncClient(timeout=TIMEOUT_CONFIG) as client:
+        try:
+            for attempt in range(Config.LLM_MAX_RETRIES + 1):
+                endpoint = endpoint_pool.choose(tried)
+                received_content = False
+                try:
+                    async with admission.admit(username, estimated_tokens):
+                        with endpoint_pool.track(endpoint):
+                            started = time.perf_counter()
+                            async with client.stream('POST', endpoint.completions_url, headers=endpoint.headers, json=payload) as response:
+                                observe_rate_limit_headers(response)
+                                if response.is_error:
+                                    # streamed responses must be read before their body can be logged
+                                    await response.aread()
+                                if is_retryable_status(response.status_code) and \
+                                        retry_after_failure(endpoint, attempt, tried, f"HTTP {response.status_code}", response):
+                                    continue
+                                response.raise_for_status()
+                                endpoint_pool.record_success(endpoint, time.perf_counter() - started)
+                                async for line in response.aiter_lines():
+                                    if line.strip():
+                                        if line.startswith('data: '):
+                                            line = line[6:]
+                                        if line != '[DONE]':
+                                            try:
+                                                chunk = json.loads(line)
+                                                if chunk and chunk.get('usage'):
+                                                    stream_info['usage'] = chunk['usage']
+                                                    record_usage(chunk['usage'])
+                                                if chunk and 'choices' in chunk and chunk['choices']:
+                                                    content = chunk['choices'][0].get('delta', {}).get('content', '')
+                                                    finish_reason = chunk['choices'][0].get('finish_reason') or finish_reason
+                                                    if content:
+                                                        received_content = True
+                                                        if key:
+                                                            streamed.append(content)
+                                                        yield content
+                                            except json.JSONDecodeError as e:
+                                                logger.error(f"Error parsing chunk: {str(e)}")
+                                                continue
+                                break
+                except httpx.TransportError as e:
+                    # a stream that dies before its first token is retried elsewhere, after that the client has seen part of the answer
+                    if not received_content and retry_after_failure(endpoint, attempt, tried, str(e)):
+                        continue
+                    raise
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP error occurred during streaming: {e.response.status_code} - {truncate(e.response.text)}")
+            raise
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"An error occurred during streaming: {str(e)}")
+            raise
+    # only complete answers are cached, never a stream that was cut short
+    if key and finish_reason == 'stop':
+        await llm_response_cache.set(key, ''.join(streamed))
+
+async def request_conversation_title(first_message: str, use_cache: bool = True, username: str = None) -> str:
+    # a title only needs the gist of the opening message, not the project contexts or a full output budget
+    messages = [
+        {"role": "system", "content": TITLE_PROMPT},
+        {"role": "user", "content": truncate_to_tokens(first_message, Config.TITLE_PROMPT_MAX_TOKENS)}
+    ]
+    payload = build_api_payload(messages, Config.TITLE_MAX_OUTPUT_TOKENS)
+    title = await call_llm_api(payload, use_cache, username)
+    return title.strip().strip('"').strip()
+
+async def generate_conversation_description_with_llm(first_message: str, use_cache: bool = True, username: str = None) -> str:
+    try:
+        return await request_conversation_title(first_message, use_cache, username)
+    except HTTPException:
+        # admission and rate limiting (429 with Retry-After) are for the client to act on
+        raise
+    except Exception as e:
+        logger.error(f"Error generating description: {str(e)}")
+        return "Error generating description"
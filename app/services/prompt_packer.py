@@ -0,0 +1,182 @@
+import hashlib
+import math
+from functools import lru_cache
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from models.message import Message
+from models.context import Context
+
+# Chat format framing: every message costs a few tokens for its role and separators,
+# and the reply is primed with a few more (see the OpenAI cookbook token counting notes)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+# Flat cost for a high detail 1024x1024 image, the common case for pasted screenshots
+IMAGE_TOKEN_COST = 765
+
+# legacy: pinned contexts are appended to the latest user message
+# stable_prefix: pinned text contexts go into a system message ahead of the conversation turns,
+#   so the prompt starts with the same bytes every turn and provider-side prompt caching can hit
+PromptLayout = Literal['legacy', 'stable_prefix']
+
+class PackResult(BaseModel):
+    prefix: List[dict] = []
+    messages: List[dict] = []
+    used_tokens: int = 0
+    max_input_tokens: int = 0
+    dropped_message_sequences: List[int] = []
+    dropped_contexts: List[str] = []
+    deduplicated_contexts: int = 0
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4"):
+    # loading the BPE ranks takes hundreds of milliseconds (and a download on a cold cache),
+    # so it happens on first use or from the startup warm-up instead of at import time
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    return len(get_encoding(model).encode(text))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4") -> str:
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+def count_message_tokens(chat_message: dict) -> int:
+    tokens = TOKENS_PER_MESSAGE + count_tokens(chat_message['role'])
+    content = chat_message['content']
+    if isinstance(content, str):
+        return tokens + count_tokens(content)
+    for part in content:
+        tokens += count_tokens(part['text']) if part['type'] == 'text' else IMAGE_TOKEN_COST
+    return tokens
+
+def context_hash(context: Context) -> str:
+    return hashlib.sha256(f"{context.type}\0{context.content}".encode('utf-8')).hexdigest()
+
+def describe_context(context: Context) -> str:
+    return context.context_id or context.name or context.type
+
+def build_chat_message_with_contexts(message: Message, contexts: list[Context] = None) -> dict:
+    text_contexts = [ctx for ctx in contexts if ctx.type != 'image'] if contexts != None else None
+    image_contexts = [ctx for ctx in contexts if ctx.type == 'image'] if contexts != None else None
+    context_parts = [f"{ctx.type}: {ctx.content}" for ctx in text_contexts] if text_contexts else []
+
+    context_str = "\nContexts: " + ", ".join(context_parts) if context_parts else ""
+    text_content = f"{message.content}{context_str}"
+    chat_message = {
+        "role": message.role,
+        "content": text_content
+    }
+
+    if image_contexts:
+        # build image content for each image context
+        chat_message['content'] = [{"type": "text", "text": text_content}]
+        for ctx in image_contexts:
+            chat_message['content'].append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{ctx.content}"}})
+
+    return chat_message
+
+def build_context_prefix_message(contexts: List[Context]) -> dict:
+    context_parts = [f"{ctx.type}: {ctx.content}" for ctx in contexts]
+    return {
+        "role": "system",
+        "content": "Contexts: " + ", ".join(context_parts)
+    }
+
+def dedupe_contexts(contexts: List[Context], seen: set) -> tuple[List[Context], int]:
+    unique = []
+    duplicates = 0
+    for ctx in contexts:
+        key = context_hash(ctx)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        unique.append(ctx)
+    return unique, duplicates
+
+def pack_chat_messages(messages: List[Message], project_contexts: Optional[List[Context]] = None,
+                       max_tokens: int = 0, reserved_tokens: int = 0, layout: PromptLayout = 'legacy',
+                       turn_contexts: Optional[List[Context]] = None) -> PackResult:
+    """
+    Fit a conversation into the input window, newest turns first.
+    Project contexts and pinned message contexts are always kept and ride on the latest user
+    message; every other context is attached to the newest message that carries it, and older
+    turns lose their contexts before they are dropped altogether. Each message is tokenized at
+    most twice, so packing is linear in the size of the history.
+    With the stable_prefix layout, pinned text contexts are returned in result.prefix instead, in
+    the order they were given, and pinned images stay on the latest user message.
+    Turn contexts (chunks retrieved for this question, stories it mentions) are always kept too, but
+    ride on the latest user message in either layout, so they never change the prefix.
+    """
+    max_input_tokens = math.floor(max_tokens * 0.9)
+    result = PackResult(max_input_tokens=max_input_tokens)
+    budget = max_input_tokens - reserved_tokens - TOKENS_PER_REPLY
+
+    ordered = sorted(messages, key=lambda x: x.sequence)
+    latest_user_index = next((i for i in range(len(ordered) - 1, -1, -1) if ordered[i].role == 'user'), None)
+
+    seen = set()
+    # hashes of the contexts that made it into the prompt, whichever copy carried them
+    included = set()
+    pinned, duplicates = dedupe_contexts(
+        list(project_contexts or []) + [ctx for message in ordered for ctx in message.contexts if ctx.pinned],
+        seen
+    )
+    result.deduplicated_contexts += duplicates
+    used_tokens = 0
+    if layout == 'stable_prefix':
+        prefix_contexts = [ctx for ctx in pinned if ctx.type != 'image']
+        pinned = [ctx for ctx in pinned if ctx.type == 'image']
+        if prefix_contexts:
+            prefix_message = build_context_prefix_message(prefix_contexts)
+            used_tokens = count_message_tokens(prefix_message)
+            if used_tokens > budget:
+                raise ValueError(f"Project contexts are too long, max tokens: {max_input_tokens}, required tokens: {used_tokens + reserved_tokens}")
+            result.prefix = [prefix_message]
+            included.update(context_hash(ctx) for ctx in prefix_contexts)
+    turn, duplicates = dedupe_contexts(list(turn_contexts or []), seen)
+    result.deduplicated_contexts += duplicates
+    pinned += turn
+
+    # the latest user turn goes first so the question and its pinned material always make it in
+    order = list(range(len(ordered) - 1, -1, -1))
+    if latest_user_index is not None:
+        order.remove(latest_user_index)
+        order.insert(0, latest_user_index)
+
+    slots = [None] * len(ordered)
+    for position, i in enumerate(order):
+        message = ordered[i]
+        required = pinned if i == latest_user_index else []
+        own, duplicates = dedupe_contexts([ctx for ctx in message.contexts if not ctx.pinned], seen)
+        result.deduplicated_contexts += duplicates
+
+        chat_message = build_chat_message_with_contexts(message, required + own)
+        tokens = count_message_tokens(chat_message)
+        if used_tokens + tokens > budget and own:
+            chat_message = build_chat_message_with_contexts(message, required)
+            tokens = count_message_tokens(chat_message)
+            # an older message carrying the same content may still fit it
+            seen.difference_update(context_hash(ctx) for ctx in own)
+            own = []
+        if used_tokens + tokens > budget:
+            if i == latest_user_index:
+                raise ValueError(f"Project contexts are too long, max tokens: {max_input_tokens}, required tokens: {used_tokens + tokens + reserved_tokens}")
+            remaining = [ordered[j] for j in order[position:]]
+            result.dropped_message_sequences.extend(m.sequence for m in remaining)
+            break
+        slots[i] = chat_message
+        included.update(context_hash(ctx) for ctx in required + own)
+        used_tokens += tokens
+
+    result.messages = [chat_message for chat_message in slots if chat_message is not None]
+    # a context is only dropped if no copy of its content made it in
+    for ctx in list(project_contexts or []) + list(turn_contexts or []) + [ctx for message in ordered for ctx in message.contexts]:
+        key = context_hash(ctx)
+        if key not in included:
+            included.add(key)
+            result.dropped_contexts.append(describe_context(ctx))
+    result.used_tokens = used_tokens + reserved_tokens + TOKENS_PER_REPLY
+    return result
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional
+from config import Config
+from utils.logger import logger
+from utils.metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    description TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    message_id TEXT UNIQUE,  -- NULL for the conversation's title
+    role TEXT,
+    owner TEXT NOT NULL,  -- single-token digest of username, so FTS5 itself scopes a query to one user
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_conversation ON documents(conversation_id);
+CREATE UNIQUE INDEX IF NOT EXISTS documents_title ON documents(conversation_id) WHERE message_id IS NULL;
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    owner, content, content='documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS documents_insert AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, owner, content) VALUES (new.id, new.owner, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, owner, content) VALUES ('delete', old.id, old.owner, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_update AFTER UPDATE OF content ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, owner, content) VALUES ('delete', old.id, old.owner, old.content);
+    INSERT INTO documents_fts(rowid, owner, content) VALUES (new.id, new.owner, new.content);
+END;
+"""
+
+SEARCH_SQL = """
+SELECT d.conversation_id, d.message_id, d.role, c.description, c.updated_at,
+       snippet(documents_fts, 1, '[', ']', '...', 16), bm25(documents_fts, 0.0, 1.0)
+FROM documents_fts
+JOIN documents d ON d.id = documents_fts.rowid
+LEFT JOIN conversations c ON c.conversation_id = d.conversation_id
+WHERE documents_fts MATCH ? AND d.username = ?
+ORDER BY bm25(documents_fts, 0.0, 1.0)
+LIMIT ?
+"""
+
+WORD_PATTERN = re.compile(r'\w+')
+
+def owner_token(username: str) -> str:
+    return "u" + hashlib.sha256(username.encode("utf-8")).hexdigest()[:24]
+
+def match_expression(username: str, query: str) -> Optional[str]:
+    # every word must match as a prefix, which covers plurals and other inflections ("deploy" finds
+    # "deployment") and follows the user's typing; words are quoted so FTS5 operators are taken literally
+    words = WORD_PATTERN.findall(query)
+    if not words:
+        return None
+    return f'owner : "{owner_token(username)}" AND content : (' + " ".join(f'"{word}"*' for word in words) + ")"
+
+class SearchIndex:
+    """
+    Full-text index of conversation titles and messages in a local SQLite FTS5 database. One
+    connection is used from a single worker thread, so writes are serialized and never run on the
+    event loop. The index is local to the instance; POST /search/reindex/ rebuilds a user's part of
+    it from the tables.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, function, *args):
+        def run():
+            connection = self._connect()
+            with connection:
+                return function(connection, *args)
+        try:
+            return await asyncio.wrap_future(self.executor.submit(run))
+        except sqlite3.Error as e:
+            # the index is a convenience, a failed update must not fail the write it follows
+            metrics.increment("search.index.errors")
+            logger.error(f"Search index error: {str(e)}")
+            return None
+
+    @staticmethod
+    def _index_conversation(connection, conversation_id: str, username: str, description: Optional[str], updated_at: Optional[str]):
+        connection.execute(
+            "INSERT INTO conversations(conversation_id, username, description, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(conversation_id) DO UPDATE SET description = excluded.description, "
+            "updated_at = COALESCE(excluded.updated_at, conversations.updated_at)",
+            (conversation_id, username, description, updated_at)
+        )
+        connection.execute("DELETE FROM documents WHERE conversation_id = ? AND message_id IS NULL", (conversation_id,))
+        if description:
+            connection.execute(
+                "INSERT INTO documents(username, conversation_id, message_id, role, owner, content) VALUES (?, ?, NULL, 'title', ?, ?)",
+                (username, conversation_id, owner_token(username), description)
+            )
+
+    @staticmethod
+    def _index_messages(connection, conversation_id: str, username: str, messages: list):
+        connection.executemany(
+            "INSERT INTO documents(username, conversation_id, message_id, role, owner, content) VALUES (?, ?, ?, ?, ?, ?) "
+            # unchanged messages are left alone, every update rewrites their full-text entry
+            "ON CONFLICT(message_id) DO UPDATE SET content = excluded.content WHERE documents.content IS NOT excluded.content",
+            [(username, conversation_id, message_id, role, owner_token(username), content) for message_id, role, content in messages]
+        )
+
+    async def index_conversation(self, conversation_id: str, username: str, description: Optional[str] = None,
+                                 updated_at: Optional[str] = None, messages: Iterable = ()):
+        """messages are (message_id, role, content) tuples, added or replaced"""
+        messages = [message for message in messages if message[0] and message[2]]
+
+        def write(connection):
+            self._index_conversation(connection, conversation_id, username, description, str(updated_at) if updated_at else None)
+            self._index_messages(connection, conversation_id, username, messages)
+        await self._run(write)
+
+    async def add_messages(self, conversation_id: str, messages: Iterable):
+        """Messages appended to a conversation that is already indexed"""
+        messages = [message for message in messages if message[0] and message[2]]
+
+        def write(connection):
+            row = connection.execute("SELECT username FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+            if row is not None:
+                self._index_messages(connection, conversation_id, row[0], messages)
+        if messages:
+            await self._run(write)
+
+    async def update_title(self, conversation_id: str, description: str):
+        def write(connection):
+            row = connection.execute("SELECT username FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+            if row is not None:
+                self._index_conversation(connection, conversation_id, row[0], description, None)
+        await self._run(write)
+
+    async def remove_conversation(self, conversation_id: str):
+        def write(connection):
+            connection.execute("DELETE FROM documents WHERE conversation_id = ?", (conversation_id,))
+            connection.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
+        await self._run(write)
+
+    async def remove_user(self, username: str):
+        def write(connection):
+            connection.execute("DELETE FROM documents WHERE username = ?", (username,))
+            connection.execute("DELETE FROM conversations WHERE username = ?", (username,))
+        await self._run(write)
+
+    async def search(self, username: str, query: str, limit: int) -> List[dict]:
+        """Conversations matching the query, best first, each with the snippets that matched"""
+        expression = match_expression(username, query)
+        if expression is None:
+            return []
+        started = time.perf_counter()
+        rows = await self._run(lambda connection: connection.execute(SEARCH_SQL, (expression, username, limit * 5)).fetchall())
+        metrics.observe("search.query_ms", (time.perf_counter() - started) * 1000)
+        results = {}
+        for conversation_id, message_id, role, description, updated_at, snippet, rank in rows or []:
+            result = results.get(conversation_id)
+            if result is None:
+                if len(results) == limit:
+                    continue
+                result = results[conversation_id] = {
+                    "conversation_id": conversation_id,
+                    "description": description,
+                    "updated_at": updated_at,
+                    "score": round(-rank, 4),  # bm25() is lower for better matches
+                    "matches": []
+                }
+            if len(result["matches"]) < 3:
+                result["matches"].append({"message_id": message_id, "role": role, "snippet": snippet})
+        return list(results.values())
+
+search_index = SearchIndex(Config.SEARCH_INDEX_PATH)
@@ -0,0 +1,35 @@
+from functools import lru_cache
+from config import Config
+
+# Storage clients are created on first use rather than at import time so the app can start
+# serving (and pass health checks) before any Azure SDK client has been constructed
+
+def get_connection_string() -> str:
+    return (
+        f"DefaultEndpointsProtocol=https;"
+        f"AccountName={Config.AZURE_STORAGE_ACCOUNT_NAME};"
+        f"AccountKey={Config.AZURE_STORAGE_ACCOUNT_KEY};"
+        f"EndpointSuffix={Config.AZURE_STORAGE_ENDPOINT_SUFFIX}"
+    )
+
+@lru_cache(maxsize=None)
+def get_table_service_client():
+    from azure.data.tables import TableServiceClient
+    return TableServiceClient.from_connection_string(get_connection_string())
+
+@lru_cache(maxsize=None)
+def get_table_client(table_name: str):
+    return get_table_service_client().get_table_client(table_name)
+
+@lru_cache(maxsize=None)
+def get_blob_service_client():
+    from azure.storage.blob import BlobServiceClient
+    return BlobServiceClient.from_connection_string(get_connection_string())
+
+@lru_cache(maxsize=None)
+def get_blob_container_client(container_name: str):
+    return get_blob_service_client().get_container_client(container_name)
+
+def warm_up():
+    get_table_service_client()
+    get_blob_service_client()
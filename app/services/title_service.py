@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+from config import Config
+from services.llm_service import request_conversation_title
+from utils.logger import logger
+from utils.metrics import metrics
+
+PLACEHOLDER_DESCRIPTION = "No description provided"
+
+class TitleWorker:
+    """
+    Generates conversation titles off the request path.
+    Conversations are queued once each and handled by `concurrency` workers; request starts are
+    spaced so the worker never exceeds requests_per_minute. The result is handed to the save
+    callback given at enqueue time, which is expected to write it back conditionally.
+    """
+
+    def __init__(self, concurrency: int, requests_per_minute: int, max_queue: int):
+        self.concurrency = concurrency
+        self.interval = 60 / requests_per_minute if requests_per_minute else 0
+        self.queue = asyncio.Queue(max_queue)
+        self.pending = set()
+        self.workers = []
+        self.next_start = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.workers)
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+            logger.info(f"Started {self.concurrency} title workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def enqueue(self, conversation_id: str, first_message: str, username: Optional[str],
+                save: Callable[[str], Awaitable[bool]]) -> bool:
+        if not self.running or conversation_id in self.pending or not first_message.strip():
+            return False
+        try:
+            self.queue.put_nowait((conversation_id, first_message, username, save))
+        except asyncio.QueueFull:
+            logger.warning(f"Title queue is full, not titling conversation {conversation_id}")
+            metrics.increment("titles.dropped")
+            return False
+        self.pending.add(conversation_id)
+        metrics.set_gauge("titles.queue_depth", self.queue.qsize())
+        return True
+
+    async def _wait_for_turn(self):
+        # reserve the next start slot before sleeping so concurrent workers queue up behind each other
+        now = time.monotonic()
+        start_at = max(now, self.next_start)
+        self.next_start = start_at + self.interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _work(self):
+        while True:
+            conversation_id, first_message, username, save = await self.queue.get()
+            metrics.set_gauge("titles.queue_depth", self.queue.qsize())
+            try:
+                await self._wait_for_turn()
+                title = await request_conversation_title(first_message, username=username)
+                if title and await save(title):
+                    metrics.increment("titles.generated")
+                    logger.info(f"Titled conversation {conversation_id}: {title}")
+                else:
+                    metrics.increment("titles.skipped")
+            except Exception as e:
+                metrics.increment("titles.failed")
+                logger.error(f"Error generating title for conversation {conversation_id}: {str(e)}")
+            finally:
+                self.pending.discard(conversation_id)
+                self.queue.task_done()
+
+title_worker = TitleWorker(Config.TITLE_WORKER_CONCURRENCY, Config.TITLE_REQUESTS_PER_MINUTE, Config.TITLE_QUEUE_MAX_SIZE)
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from typing import AsyncIterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from fastapi import HTTPException
+from config import Config
+from services.web_scraper import web_scraper
+from utils.logger import logger
+from utils.metrics import metrics
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """Canonical form used to dedupe pages: no fragment, tracking parameters or default port, sorted query"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if path != "/" and path.endswith("/"):
+        path = path.rstrip("/")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.lower().startswith("utm_")))
+    return urlunsplit((scheme, host, path, query, ""))
+
+class HostLimiter:
+    """At most per_host requests in flight per host, with request starts at least delay seconds apart"""
+
+    def __init__(self, per_host: int, delay: float):
+        self.delay = delay
+        self.slots = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self.locks = defaultdict(asyncio.Lock)
+        self.next_start = defaultdict(float)
+
+    async def acquire(self, host: str):
+        await self.slots[host].acquire()
+        async with self.locks[host]:
+            wait = self.next_start[host] - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.next_start[host] = time.monotonic() + self.delay
+
+    def release(self, host: str):
+        self.slots[host].release()
+
+class WebCrawler:
+    """
+    Scrapes a list of URLs, or crawls from a seed URL (links up to `depth` hops away on the same site,
+    plus the site's sitemap when asked), yielding each page as soon as it is done. Pages are deduped by
+    normalized URL before fetching and by content hash after.
+    """
+
+    def __init__(self, max_pages: int, depth: int = 0):
+        self.max_pages = min(max_pages, Config.WEB_CRAWL_MAX_PAGES)
+        self.depth = min(depth, Config.WEB_CRAWL_MAX_DEPTH)
+        self.limiter = HostLimiter(Config.WEB_CRAWL_PER_HOST_CONCURRENCY, Config.WEB_CRAWL_HOST_DELAY_SECONDS)
+        self.frontier = asyncio.Queue()
+        self.results = asyncio.Queue()
+        self.seen = set()
+        self.queued = 0
+        self.content_hashes = {}
+        self.scope: Optional[str] = None
+
+    def in_scope(self, url: str) -> bool:
+        # a crawl stays on the seed's site and below the seed's directory
+        if self.scope is None:
+            return True
+        normalized = normalize_url(url)
+        return normalized.startswith(self.scope) or normalized == self.scope.rstrip("/")
+
+    def schedule(self, url: str, level: int):
+        if urlsplit(url).scheme not in ("http", "https") or not self.in_scope(url):
+            return
+        normalized = normalize_url(url)
+        if normalized in self.seen or self.queued >= self.max_pages:
+            return
+        self.seen.add(normalized)
+        self.queued += 1
+        self.frontier.put_nowait((url, level))
+
+    async def _scrape(self, url: str) -> dict:
+        if web_scraper.is_fresh(url):
+            return await web_scraper.scrape_page(url)
+        host = urlsplit(url).hostname or ""
+        await self.limiter.acquire(host)
+        try:
+            return await web_scraper.scrape_page(url)
+        finally:
+            self.limiter.release(host)
+
+    async def _page_result(self, url: str, level: int) -> dict:
+        try:
+            page = await self._scrape(url)
+        except HTTPException as e:
+            metrics.increment("web.crawl.errors")
+            return {"url": url, "error": e.detail, "status": e.status_code}
+        except Exception as e:
+            metrics.increment("web.crawl.errors")
+            return {"url": url, "error": str(e), "status": 500}
+
+        # redirects can land two URLs on the same page: the target is not queued again, but it is not
+        # a fetch of its own, so it does not count toward max_pages
+        self.seen.add(normalize_url(page["url"]))
+        content_hash = hashlib.sha256(page["content"].encode("utf-8")).hexdigest()
+        if content_hash in self.content_hashes:
+            metrics.increment("web.crawl.duplicates")
+            # its links were queued when the first copy was crawled
+            return {"url": url, "duplicate_of": self.content_hashes[content_hash]}
+        self.content_hashes[content_hash] = page["url"]
+        if level < self.depth:
+            for link in page["links"]:
+                self.schedule(link, level + 1)
+        return {
+            "url": page["url"],
+            "title": page["title"],
+            "content": page["content"],
+            "tokens": page["tokens"],
+            "truncated": page["truncated"],
+            "depth": level
+        }
+
+    async def _work(self):
+        while True:
+            url, level = await self.frontier.get()
+            try:
+                self.results.put_nowait(await self._page_result(url, level))
+            finally:
+                self.frontier.task_done()
+
+    async def _seed(self, seed_url: str, use_sitemap: bool):
+        path = urlsplit(seed_url).path or "/"
+        directory = path if path.endswith("/") else path.rsplit("/", 1)[0] + "/"
+        parts = urlsplit(normalize_url(seed_url))
+        self.scope = urlunsplit((parts.scheme, parts.netloc, directory, "", ""))
+        self.schedule(seed_url, 0)
+        if use_sitemap:
+            try:
+                sitemap = urljoin(f"{parts.scheme}://{parts.netloc}/", "sitemap.xml")
+                for url in await web_scraper.sitemap_urls(sitemap, self.max_pages):
+                    # sitemap pages are leaves: the sitemap already lists the site
+                    self.schedule(url, self.depth)
+            except Exception as e:
+                logger.info(f"No usable sitemap for {seed_url}: {getattr(e, 'detail', str(e))}")
+
+    async def run(self, urls: List[str] = (), seed_url: Optional[str] = None, use_sitemap: bool = False) -> AsyncIterator[dict]:
+        started = time.perf_counter()
+        workers = [asyncio.create_task(self._work()) for _ in range(Config.WEB_CRAWL_CONCURRENCY)]
+        done = None
+        try:
+            for url in urls:
+                self.schedule(url, self.depth)
+            if seed_url:
+                await self._seed(seed_url, use_sitemap)
+            # every scheduled page puts exactly one result before it is marked done
+            done = asyncio.create_task(self.frontier.join())
+            pages = 0
+            while not (done.done() and self.results.empty()):
+                next_result = asyncio.create_task(self.results.get())
+                await asyncio.wait({next_result, done}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_result.done():
+                    next_result.cancel()
+                    continue
+                pages += 1
+                yield next_result.result()
+            metrics.observe("web.crawl.pages", pages)
+            logger.info(f"Crawl finished: {pages} pages in {time.perf_counter() - started:.1f}s")
+        finally:
+            # also reached when the client disconnects mid-crawl
+            tasks = workers + ([done] if done is not None else [])
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
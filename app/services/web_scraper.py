@@ -0,0 +1,240 @@
+import asyncio
+import ipaddress
+import re
+import socket
+import time
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlparse
+from fastapi import HTTPException
+from config import Config
+from services.prompt_packer import count_tokens
+from utils.cache import TTLCache
+from utils.logger import logger
+from utils.metrics import metrics
+
+# page furniture that is never the content someone wants to paste into a prompt
+NOISE_XPATH = ("//script|//style|//noscript|//template|//svg|//iframe|//form|//nav|//header|//footer|//aside"
+               "|//*[@role='navigation' or @role='banner' or @role='contentinfo' or @aria-hidden='true']|//comment()")
+MAIN_XPATH = "//main|//article|//*[@role='main']"
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr", "table", "pre", "blockquote",
+              "h1", "h2", "h3", "h4", "h5", "h6", "dt", "dd", "hr", "figcaption"}
+INLINE_WHITESPACE = re.compile(r'[ \t\r\f\v\xa0]+')
+
+def compact_lines(text: str) -> str:
+    lines = (INLINE_WHITESPACE.sub(' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+def extract_page(body: bytes, encoding: Optional[str], base_url: str) -> dict:
+    """
+    Title, links and readable text of an HTML page: scripts, styles, navigation, headers and footers
+    are dropped, and when the page marks up its main content (<main>, <article>) only that is kept.
+    Block elements become line breaks. Runs on the parse pool, never on the event loop.
+    """
+    # deferred, lxml is only needed on the parse pool
+    import lxml.html
+    from lxml import etree
+    empty = {"content": "", "title": "", "links": []}
+    if not body.strip():
+        return empty
+    try:
+        document = lxml.html.document_fromstring(body.decode(encoding, errors='replace') if encoding else body)
+    except (etree.ParserError, ValueError):
+        # e.g. a decoded string that still carries an XML encoding declaration
+        try:
+            document = lxml.html.document_fromstring(body)
+        except etree.ParserError:
+            # "Document is empty": nothing but comments or an undecodable body
+            return empty
+    title = compact_lines(document.findtext('.//title') or '')
+    # links are collected before the navigation is dropped, a crawl follows exactly those
+    document.make_links_absolute(base_url, handle_failures='discard')
+    links = list(dict.fromkeys(document.xpath('//a/@href')))
+    for element in document.xpath(NOISE_XPATH):
+        element.drop_tree()
+    main = document.xpath(MAIN_XPATH)
+    root = max(main, key=lambda element: len(element.text_content())) if main else document.find('body')
+    if root is None:
+        root = document
+
+    parts = []
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        tag = element.tag if isinstance(element.tag, str) else None
+        if event == "start":
+            if tag in BLOCK_TAGS:
+                parts.append('\n')
+            if element.text and tag:
+                parts.append(element.text)
+        else:
+            if tag in BLOCK_TAGS:
+                parts.append('\n')
+            if element.tail and element is not root:
+                parts.append(element.tail)
+    return {"content": compact_lines(''.join(parts)), "title": title, "links": links}
+
+def parse_page(body: bytes, encoding: Optional[str], content_type: str, base_url: str) -> dict:
+    if content_type == "text/plain":
+        page = {"content": compact_lines(body.decode(encoding or "utf-8", errors="replace")), "title": "", "links": []}
+    else:
+        page = extract_page(body, encoding, base_url)
+    page["tokens"] = count_tokens(page["content"])
+    return page
+
+async def ensure_public_host(url: httpx.URL):
+    """Refuses hosts that resolve to a private, loopback, link-local or otherwise non-public address"""
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(url.host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise HTTPException(status_code=400, detail=f"Could not resolve {url.host}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            metrics.increment("web.scrape.blocked_hosts")
+            raise HTTPException(status_code=400, detail=f"{url.host} resolves to a non-public address")
+
+def extract_sitemap_urls(body: bytes) -> tuple[list, bool]:
+    """<loc> entries of a sitemap, and whether it is a sitemap index pointing at further sitemaps"""
+    from lxml import etree
+    root = etree.fromstring(body, etree.XMLParser(resolve_entities=False, no_network=True, recover=True))
+    if root is None:
+        return [], False
+    locations = [loc.text.strip() for loc in root.iter('{*}loc') if loc.text]
+    return locations, etree.QName(root).localname == 'sitemapindex'
+
+class WebScraper:
+    """
+    Fetches pages on one pooled async client with connect/read timeouts, an overall deadline and a
+    cap on the bytes read. Parsing runs on a small thread pool. Results are cached per URL: within
+    WEB_SCRAPE_CACHE_FRESH_SECONDS they are served as is, after that revalidated with the page's
+    ETag / Last-Modified. Every request, redirects included, goes only to hosts with public addresses.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.parse_pool = ThreadPoolExecutor(max_workers=Config.WEB_SCRAPE_PARSE_WORKERS, thread_name_prefix="html-parse")
+        self.cache = TTLCache(Config.WEB_SCRAPE_CACHE_MAX_ENTRIES, Config.WEB_SCRAPE_CACHE_TTL_SECONDS)
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(Config.WEB_SCRAPE_READ_TIMEOUT_SECONDS, connect=Config.WEB_SCRAPE_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=Config.WEB_SCRAPE_MAX_CONNECTIONS),
+                follow_redirects=True,
+                max_redirects=5,
+                # runs for every request, redirects included
+                event_hooks={"request": [lambda request: ensure_public_host(request.url)]},
+                headers={"User-Agent": "nextech-shannon-api/1.0", "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9"}
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _read_capped(self, response: httpx.Response) -> tuple[bytes, bool]:
+        chunks, size = [], 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= Config.WEB_SCRAPE_MAX_BYTES:
+                metrics.increment("web.scrape.truncated")
+                return b''.join(chunks)[:Config.WEB_SCRAPE_MAX_BYTES], True
+        return b''.join(chunks), False
+
+    async def _fetch(self, url: str, headers: dict) -> Optional[dict]:
+        async with self.client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and headers:
+                return None
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "").split(';')[0].strip().lower()
+            if content_type and not (content_type.startswith("text/") or content_type in ("application/xhtml+xml", "application/xml")):
+                raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+            body, truncated = await self._read_capped(response)
+            return {
+                "url": str(response.url),
+                "body": body,
+                "encoding": response.charset_encoding,
+                "content_type": content_type,
+                "truncated": truncated,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified")
+            }
+
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> Optional[dict]:
+        """Raw page within the overall deadline; None when a conditional request came back 304"""
+        if urlparse(url).scheme not in ("http", "https"):
+            raise HTTPException(status_code=400, detail="Only http and https URLs can be scraped")
+        started = time.perf_counter()
+        try:
+            page = await asyncio.wait_for(self._fetch(url, headers or {}), Config.WEB_SCRAPE_TOTAL_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Timed out scraping {url}")
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=500, detail=f"Error scraping the web: {str(e)}")
+        metrics.observe("web.scrape.fetch_ms", (time.perf_counter() - started) * 1000)
+        return page
+
+    def is_fresh(self, url: str) -> bool:
+        cached = self.cache.get(url)
+        return cached is not None and time.monotonic() - cached["validated_at"] < Config.WEB_SCRAPE_CACHE_FRESH_SECONDS
+
+    async def scrape_page(self, url: str) -> dict:
+        """Final URL, title, text, token count and links of a page"""
+        headers = {}
+        cached = self.cache.get(url)
+        if cached is not None:
+            if self.is_fresh(url):
+                metrics.increment("web.scrape.cache.fresh_hits")
+                return cached["page"]
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self.fetch(url, headers)
+        if response is None:
+            metrics.increment("web.scrape.cache.revalidated")
+            cached["validated_at"] = time.monotonic()
+            self.cache.set(url, cached)
+            return cached["page"]
+
+        started = time.perf_counter()
+        future = self.parse_pool.submit(parse_page, response["body"], response["encoding"], response["content_type"], response["url"])
+        page = {"url": response["url"], **await asyncio.wrap_future(future), "truncated": response["truncated"]}
+        parse_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("web.scrape.parse_ms", parse_ms)
+        logger.info(f"Scraped {url}: {len(response['body'])} bytes{' (truncated)' if response['truncated'] else ''}, "
+                    f"{page['tokens']} tokens of text, parsed in {parse_ms:.0f} ms")
+
+        metrics.increment("web.scrape.cache.misses")
+        self.cache.set(url, {
+            "page": page,
+            "etag": response["etag"],
+            "last_modified": response["last_modified"],
+            "validated_at": time.monotonic()
+        })
+        return page
+
+    async def scrape(self, url: str) -> dict:
+        page = await self.scrape_page(url)
+        return {"content": page["content"], "truncated": page["truncated"]}
+
+    async def sitemap_urls(self, url: str, limit: int) -> list:
+        """Page URLs listed in a sitemap, following one level of sitemap index"""
+        response = await self.fetch(url)
+        urls, is_index = await asyncio.wrap_future(self.parse_pool.submit(extract_sitemap_urls, response["body"]))
+        if not is_index:
+            return urls[:limit]
+        pages = []
+        for sitemap in urls:
+            if len(pages) >= limit:
+                break
+            response = await self.fetch(sitemap)
+            nested, _ = await asyncio.wrap_future(self.parse_pool.submit(extract_sitemap_urls, response["body"]))
+            pages.extend(nested)
+        return pages[:limit]
+
+web_scraper = WebScraper()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import pytest
+from memory_storage import MemoryStorage
+
+# Config reads the environment on import
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("AZURE_STORAGE_ACCOUNT_NAME", "test")
+os.environ.setdefault("MAX_TOKENS", "128000")
+os.environ.setdefault("SEARCH_INDEX_PATH", os.path.join(tempfile.mkdtemp(), "search.db"))
+
+class WordEncoding:
+    """One token per whitespace separated word"""
+
+    def encode(self, text: str) -> list:
+        return text.split()
+
+    def decode(self, tokens: list) -> str:
+        return " ".join(tokens)
+
+@pytest.fixture(scope="module")
+def word_tokenizer():
+    # the tests check how tokens are budgeted, not how text is split into them, and tiktoken
+    # downloads its BPE ranks on first use
+    from services import context_index, prompt_packer
+    with pytest.MonkeyPatch.context() as patch:
+        for module in (prompt_packer, context_index):
+            patch.setattr(module, "get_encoding", lambda model="gpt-4": WordEncoding())
+        yield
+
+@pytest.fixture
+def memory_storage(monkeypatch):
+    import services
+    from services.conversation_service import conversation_cache
+    storage = MemoryStorage()
+    storage.install(monkeypatch)
+    conversation_cache.clear()
+    yield storage
+    conversation_cache.clear()
@@ -0,0 +1,97 @@
+"""Local HTTP servers for tests: an Azure OpenAI compatible one that answers from a script, and any ASGI app"""
+import asyncio
+import json
+import socket
+import threading
+import time
+from collections import deque
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class Reply:
+    def __init__(self, status: int = 200, content: str = "ok", delay: float = 0.0, headers: dict = None):
+        self.status = status
+        self.content = content
+        self.delay = delay
+        self.headers = headers or {}
+
+class BackgroundServer:
+    """Serves an ASGI app on a free local port from a background thread while the context is open"""
+
+    def __init__(self, app):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}/"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+class ScriptedLLM(BackgroundServer):
+    """
+    Answers each completion request with the next scripted Reply, or with `default` once the script
+    runs out, and records when every request arrived and what it asked
+    """
+
+    def __init__(self, default: Reply = None):
+        self.script = deque()
+        self.default = default or Reply()
+        self.requests = []  # (arrived_at, last message content)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        app = FastAPI()
+        app.post("/openai/deployments/{deployment}/chat/completions")(self.complete)
+        super().__init__(app)
+
+    def arrivals(self) -> list:
+        return [arrived_at for arrived_at, _ in self.requests]
+
+    async def complete(self, request: Request):
+        payload = await request.json()
+        self.requests.append((time.monotonic(), payload["messages"][-1]["content"]))
+        reply = self.script.popleft() if self.script else self.default
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(reply.delay)
+        finally:
+            self.in_flight -= 1
+        if reply.status != 200:
+            return JSONResponse({"error": {"code": str(reply.status)}}, status_code=reply.status, headers=reply.headers)
+        if not payload.get("stream"):
+            return JSONResponse({"choices": [{"message": {"role": "assistant", "content": reply.content}, "finish_reason": "stop"}]},
+                                headers=reply.headers)
+
+        async def events():
+            for word in reply.content.split(" "):
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}, 'finish_reason': None}]})}\n\n"
+            yield f"data: {json.dumps({'choices': [{'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream", headers=reply.headers)
+
+def route_llm_calls(monkeypatch, stubs: list, max_concurrency: int = 16, tokens_per_minute: int = 0,
+                    failure_threshold: int = 3, ejection_seconds: float = 30, weights: list = None):
+    """Points llm_service at the stubs (anything with a url), with admission and endpoint state of its own; returns the pool"""
+    from services import llm_service
+    from services.llm_admission import LLMAdmissionController
+    from services.llm_endpoints import LLMEndpoint, LLMEndpointPool
+    weights = weights or [1.0] * len(stubs)
+    pool = LLMEndpointPool([LLMEndpoint(f"stub-{i}", stub.url, "key", "2024-02-15-preview", "gpt-4o", weight)
+                            for i, (stub, weight) in enumerate(zip(stubs, weights))], failure_threshold, ejection_seconds)
+    monkeypatch.setattr(llm_service, "endpoint_pool", pool)
+    monkeypatch.setattr(llm_service, "admission", LLMAdmissionController(max_concurrency, tokens_per_minute, max_backoff_seconds=5))
+    monkeypatch.setattr(llm_service.Config, "LLM_CACHE_ENABLED", False)
+    return pool
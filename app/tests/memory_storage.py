@@ -0,0 +1,149 @@
+"""In-memory table and blob clients with the etag semantics of Azure storage, for tests"""
+import itertools
+import re
+import sys
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+_etags = itertools.count(1)
+
+def new_etag() -> str:
+    return f'W/"{next(_etags)}"'
+
+class Entity(dict):
+    def __init__(self, data: dict, etag: str):
+        super().__init__(data)
+        self.metadata = {"etag": etag}
+
+def check_etag(current: str, etag: str, match_condition):
+    if match_condition == MatchConditions.IfNotModified and etag != current:
+        raise ResourceModifiedError("The update condition specified in the request was not satisfied")
+
+class MemoryTable:
+    def __init__(self):
+        self.rows = {}
+        self.calls = 0
+
+    def _key(self, entity: dict) -> tuple:
+        return entity["PartitionKey"], entity["RowKey"]
+
+    def _store(self, key: tuple, data: dict) -> dict:
+        etag = new_etag()
+        self.rows[key] = (etag, dict(data))
+        return {"etag": etag}
+
+    def create_entity(self, entity: dict) -> dict:
+        self.calls += 1
+        if self._key(entity) in self.rows:
+            raise ResourceExistsError("The specified entity already exists")
+        return self._store(self._key(entity), entity)
+
+    def upsert_entity(self, entity: dict, mode=None, **kwargs) -> dict:
+        self.calls += 1
+        current = self.rows.get(self._key(entity), (None, {}))[1]
+        return self._store(self._key(entity), {**current, **entity} if str(mode).endswith("MERGE") else entity)
+
+    def update_entity(self, entity: dict, mode=None, etag: str = None, match_condition=None, **kwargs) -> dict:
+        self.calls += 1
+        key = self._key(entity)
+        if key not in self.rows:
+            raise ResourceNotFoundError("The specified resource does not exist")
+        current_etag, current = self.rows[key]
+        check_etag(current_etag, etag, match_condition)
+        return self._store(key, {**current, **entity} if str(mode).endswith("MERGE") else entity)
+
+    def get_entity(self, partition_key: str, row_key: str, **kwargs) -> Entity:
+        self.calls += 1
+        try:
+            etag, data = self.rows[(partition_key, row_key)]
+        except KeyError:
+            raise ResourceNotFoundError("The specified resource does not exist")
+        return Entity(data, etag)
+
+    def delete_entity(self, partition_key: str, row_key: str, **kwargs):
+        self.calls += 1
+        self.rows.pop((partition_key, row_key), None)
+
+    def submit_transaction(self, operations: list):
+        calls = self.calls
+        for operation, entity in operations:
+            getattr(self, f"{operation}_entity")(entity)
+        self.calls = calls + 1
+
+    def query_entities(self, query_filter: str, select: list = None, **kwargs) -> list:
+        self.calls += 1
+        conditions = re.findall(r"(\w+) eq '([^']*)'", query_filter)
+        return [
+            Entity({field: data.get(field) for field in select} if select else data, etag)
+            for etag, data in list(self.rows.values())
+            if all(str(data.get(field, "")) == value for field, value in conditions)
+        ]
+
+    def list_entities(self, **kwargs) -> list:
+        return [Entity(data, etag) for etag, data in self.rows.values()]
+
+class Download:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def readall(self) -> bytes:
+        return self.data
+
+class MemoryBlob:
+    def __init__(self, container, name: str):
+        self.container = container
+        self.name = name
+
+    def upload_blob(self, data, overwrite: bool = False, etag: str = None, match_condition=None, **kwargs) -> dict:
+        self.container.calls += 1
+        if self.name in self.container.blobs:
+            if not overwrite:
+                raise ResourceExistsError("The specified blob already exists")
+            check_etag(self.container.blobs[self.name][0], etag, match_condition)
+        blob_etag = new_etag()
+        self.container.blobs[self.name] = (blob_etag, data.encode("utf-8") if isinstance(data, str) else data)
+        return {"etag": blob_etag}
+
+    def download_blob(self, etag: str = None, match_condition=None, **kwargs) -> Download:
+        self.container.calls += 1
+        if self.name not in self.container.blobs:
+            raise ResourceNotFoundError("The specified blob does not exist")
+        blob_etag, data = self.container.blobs[self.name]
+        check_etag(blob_etag, etag, match_condition)
+        return Download(data)
+
+    def delete_blob(self, **kwargs):
+        self.container.calls += 1
+        if self.container.blobs.pop(self.name, None) is None:
+            raise ResourceNotFoundError("The specified blob does not exist")
+
+class MemoryContainer:
+    def __init__(self):
+        self.blobs = {}
+        self.calls = 0
+
+    def get_blob_client(self, name: str) -> MemoryBlob:
+        return MemoryBlob(self, name)
+
+    def delete_blob(self, name: str, **kwargs):
+        self.get_blob_client(name).delete_blob()
+
+class MemoryStorage:
+    def __init__(self):
+        self.tables = {}
+        self.containers = {}
+
+    def table(self, name: str) -> MemoryTable:
+        return self.tables.setdefault(name, MemoryTable())
+
+    def container(self, name: str) -> MemoryContainer:
+        return self.containers.setdefault(name, MemoryContainer())
+
+    def install(self, monkeypatch):
+        # services import the client factories by name
+        for module in list(sys.modules.values()):
+            if getattr(module, "__name__", "").startswith("services"):
+                if hasattr(module, "get_table_client"):
+                    monkeypatch.setattr(module, "get_table_client", self.table)
+                if hasattr(module, "get_blob_container_client"):
+                    monkeypatch.setattr(module, "get_blob_container_client", self.container)
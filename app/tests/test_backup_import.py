@@ -0,0 +1,100 @@
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from config import Config
+from memory_storage import MemoryTable
+from services import backup_service as backup_module
+from services.backup_service import BackupService, export_line
+
+LINES = [
+    export_line("project", {"project_id": "p1", "name": "Release"}),
+    export_line("conversation", {"conversation_id": "c1", "project_id": "p1", "description": "Release plan"}),
+    export_line("message", {"message_id": "m1", "conversation_id": "c1", "role": "user", "content": "Plan it", "sequence": 0}),
+    export_line("message", {"message_id": "m2", "conversation_id": "c1", "role": "assistant", "content": "Sure", "sequence": 1}),
+    export_line("context", {"message_id": "m1", "type": "file", "name": "notes.md", "content": "notes"}),
+    export_line("context", {"project_id": "p1", "type": "file", "name": "spec.md", "content": "spec"}),
+]
+
+async def chunks():
+    for line in LINES:
+        yield line.encode()
+
+def import_user(service: BackupService) -> dict:
+    return asyncio.run(service.import_user("bob", chunks()))
+
+@pytest.fixture
+def indexed(monkeypatch):
+    calls = []
+    async def index_conversation(conversation_id, *args):
+        calls.append(conversation_id)
+    monkeypatch.setattr(backup_module.search_index, "index_conversation", index_conversation)
+    async def add_messages(*args):
+        pass
+    monkeypatch.setattr(backup_module.search_index, "add_messages", add_messages)
+    return calls
+
+def row_keys(memory_storage, table_name: str) -> set:
+    return {row_key for _, row_key in memory_storage.table(table_name).rows}
+
+def test_parents_are_written_before_children(memory_storage, indexed, monkeypatch):
+    projects = lambda: row_keys(memory_storage, Config.AZURE_STORAGE_PROJECTS_TABLE_NAME)
+    conversations = lambda: row_keys(memory_storage, Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME)
+    messages = lambda: row_keys(memory_storage, Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+    submit_transaction = MemoryTable.submit_transaction
+    written = []
+
+    def checked_submit_transaction(table, operations):
+        for _, entity in operations:
+            # every row's parents are already in storage
+            if entity.get("project_id"):
+                assert entity["project_id"] in projects()
+            if entity.get("conversation_id") and entity["PartitionKey"] != "conversations":
+                assert entity["conversation_id"] in conversations()
+            if entity.get("message_id") and entity["PartitionKey"] == "contexts":
+                assert entity["message_id"] in messages()
+            written.append(entity["PartitionKey"])
+        submit_transaction(table, operations)
+    monkeypatch.setattr(MemoryTable, "submit_transaction", checked_submit_transaction)
+
+    # batches of two: the messages fill theirs while the project and conversation are still queued
+    result = import_user(BackupService(batch_size=2))
+    assert result["imported"] == {"project": 1, "conversation": 1, "message": 2, "context": 2}
+    assert written == ["projects", "conversations", "messages", "messages", "contexts", "contexts"]
+    assert indexed == list(conversations())
+
+def test_conversation_is_indexed_only_once_written(memory_storage, indexed, monkeypatch):
+    submit_transaction = MemoryTable.submit_transaction
+
+    def failing_submit_transaction(table, operations):
+        if operations[0][1]["PartitionKey"] == "conversations":
+            raise RuntimeError("storage unavailable")
+        submit_transaction(table, operations)
+    monkeypatch.setattr(MemoryTable, "submit_transaction", failing_submit_transaction)
+
+    with pytest.raises(HTTPException) as error:
+        import_user(BackupService(batch_size=2))
+    assert error.value.status_code == 500
+    assert indexed == []
+
+def test_batches_stay_under_the_transaction_size_limit(memory_storage, indexed, monkeypatch):
+    submit_transaction = MemoryTable.submit_transaction
+    batches = []
+
+    def measured_submit_transaction(table, operations):
+        batches.append(sum(len(json.dumps(entity, default=str).encode("utf-8")) for _, entity in operations))
+        submit_transaction(table, operations)
+    monkeypatch.setattr(MemoryTable, "submit_transaction", measured_submit_transaction)
+
+    # a dozen long messages: one 100 row batch would be well over the 4 MiB Azure accepts
+    lines = LINES[:2] + [
+        export_line("message", {"message_id": f"m{i}", "conversation_id": "c1", "role": "user", "content": "x" * 600_000, "sequence": i})
+        for i in range(12)
+    ]
+    async def chunks():
+        for line in lines:
+            yield line.encode()
+    result = asyncio.run(BackupService().import_user("bob", chunks()))
+    assert result["imported"]["message"] == 12
+    assert max(batches) <= Config.IMPORT_BATCH_MAX_BYTES < 4 * 1024 * 1024
+    assert len(memory_storage.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME).rows) == 12
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from config import Config
+from models import Context, Message
+from services.context_index import ContextIndex
+from services.llm_service import SYSTEM_PROMPT, build_chat_messages_for_api
+
+pytestmark = pytest.mark.usefixtures("word_tokenizer")
+
+TOPICS = ["billing", "invoices", "onboarding", "permissions", "exports", "reporting", "scheduling", "notifications"]
+
+def project_contexts() -> list:
+    # one large document per topic, together well over CONTEXT_RETRIEVAL_MIN_TOKENS
+    documents = [
+        Context(context_id=f"doc-{topic}", type="file", name=f"{topic}.md", project_id="p1",
+                content="\n\n".join(f"{topic} rule {i}: " + " ".join(["detail"] * 150) for i in range(10)))
+        for topic in TOPICS
+    ]
+    pinned = Context(context_id="glossary", type="file", name="glossary.md", content="glossary of terms", project_id="p1", pinned=True)
+    description = Context(type="project_description", name="Portal", content="The customer portal", project_id="p1")
+    return documents + [pinned, description]
+
+def prompt_for(index: ContextIndex, question: str) -> tuple[list, list]:
+    contexts = project_contexts()
+    assert sum(len(context.content.split()) for context in contexts) > Config.CONTEXT_RETRIEVAL_MIN_TOKENS
+    kept, retrieved = asyncio.run(index.select("p1", contexts, question))
+    messages = [
+        Message(role="user", content="How does billing work?", sequence=0),
+        Message(role="assistant", content="It is monthly.", sequence=1),
+        Message(role="user", content=question, sequence=2)
+    ]
+    return build_chat_messages_for_api(messages, kept, layout="stable_prefix", turn_contexts=retrieved), retrieved
+
+def test_retrieved_chunks_leave_the_prefix_unchanged():
+    index = ContextIndex()
+    first, first_chunks = prompt_for(index, "How are invoices numbered?")
+    second, second_chunks = prompt_for(index, "Who gets notifications about scheduling?")
+    assert {chunk.content for chunk in first_chunks} != {chunk.content for chunk in second_chunks}
+
+    # the system prompt and the always-sent contexts, byte for byte the same on both turns
+    assert first[0] == second[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert first[1] == second[1]
+    assert "glossary of terms" in first[1]["content"] and "The customer portal" in first[1]["content"]
+    assert not any(topic in first[1]["content"] for topic in TOPICS)
+    # the retrieved chunks ride on the question
+    assert "invoices rule 9" in first[-1]["content"] and "invoices rule 9" not in second[-1]["content"]
+    assert "notifications rule 9" in second[-1]["content"] and "notifications rule 9" not in first[-1]["content"]
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from config import Config
+from models import Conversation, Message
+from services import conversation_service as conversation_module
+from services.conversation_service import ConversationService
+from utils.cache import TTLCache
+
+@pytest.fixture(params=[False, True], ids=["tables", "snapshots"])
+def service(request, memory_storage, monkeypatch):
+    monkeypatch.setattr(Config, "CONVERSATION_SNAPSHOTS_ENABLED", request.param)
+    return ConversationService()
+
+def create_conversation(service: ConversationService) -> str:
+    conversation = Conversation(username="alice", description="Plans", messages=[
+        Message(role="user", content="hello", sequence=0),
+        Message(role="assistant", content="hi", sequence=1)
+    ])
+    return asyncio.run(service.save_conversation(conversation)).conversation_id
+
+def turn(sequence: int) -> list:
+    return [Message(role="user", content=f"question {sequence}", sequence=sequence),
+            Message(role="assistant", content=f"answer {sequence}", sequence=sequence + 1)]
+
+def in_other_worker(monkeypatch, call):
+    # another process has a cache of its own
+    with monkeypatch.context() as patch:
+        patch.setattr(conversation_module, "conversation_cache", TTLCache(16, 900))
+        return call()
+
+def test_unchanged_conversation_is_served_from_cache(service, memory_storage):
+    conversation_id = create_conversation(service)
+    first = asyncio.run(service.get_cached_conversation(conversation_id))
+    messages_table = memory_storage.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+    reads = messages_table.calls
+    second = asyncio.run(service.get_cached_conversation(conversation_id))
+    assert second is first
+    assert messages_table.calls == reads
+
+def test_own_append_updates_the_cache(service, memory_storage):
+    conversation_id = create_conversation(service)
+    asyncio.run(service.get_cached_conversation(conversation_id))
+    asyncio.run(service.append_messages(conversation_id, turn(2)))
+    messages_table = memory_storage.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+    reads = messages_table.calls
+    conversation = asyncio.run(service.get_cached_conversation(conversation_id))
+    assert [message.sequence for message in conversation.messages] == [0, 1, 2, 3]
+    assert messages_table.calls == reads
+
+def test_append_from_another_worker_is_seen(service, monkeypatch):
+    conversation_id = create_conversation(service)
+    cached = asyncio.run(service.get_cached_conversation(conversation_id))
+    in_other_worker(monkeypatch, lambda: asyncio.run(ConversationService().append_messages(conversation_id, turn(2))))
+    conversation = asyncio.run(service.get_cached_conversation(conversation_id))
+    assert [message.sequence for message in conversation.messages] == [0, 1, 2, 3]
+    # the object handed out earlier is left alone
+    assert [message.sequence for message in cached.messages] == [0, 1]
+
+def test_interleaved_appends_from_two_workers(service, monkeypatch):
+    conversation_id = create_conversation(service)
+    asyncio.run(service.get_cached_conversation(conversation_id))
+    in_other_worker(monkeypatch, lambda: asyncio.run(ConversationService().append_messages(conversation_id, turn(2))))
+    # this worker's cache is stale: its own append must not paper over the other worker's turn
+    asyncio.run(service.append_messages(conversation_id, turn(4)))
+    conversation = asyncio.run(service.get_cached_conversation(conversation_id))
+    assert [message.sequence for message in conversation.messages] == [0, 1, 2, 3, 4, 5]
+
+def test_deleted_conversation_is_not_served(service, memory_storage):
+    conversation_id = create_conversation(service)
+    asyncio.run(service.get_cached_conversation(conversation_id))
+    memory_storage.table(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME).delete_entity("conversations", conversation_id)
+    with pytest.raises(Exception) as error:
+        asyncio.run(service.get_cached_conversation(conversation_id))
+    assert error.value.status_code == 404
+
+@pytest.fixture
+def snapshots(memory_storage, monkeypatch):
+    monkeypatch.setattr(Config, "CONVERSATION_SNAPSHOTS_ENABLED", True)
+    return memory_storage
+
+def stored_entity(memory_storage, conversation_id: str) -> dict:
+    return memory_storage.table(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME).get_entity("conversations", conversation_id)
+
+def test_save_builds_the_snapshot_from_the_saved_conversation(snapshots, monkeypatch):
+    service = ConversationService()
+    async def read_back(conversation_id):
+        raise AssertionError("the messages were read back to build the snapshot")
+    monkeypatch.setattr(service.message_service, "get_messages_by_conversation_id", read_back)
+    conversation_id = create_conversation(service)
+    assert stored_entity(snapshots, conversation_id)["snapshot_etag"]
+
+    # another worker loads the conversation from the snapshot alone
+    messages_table = snapshots.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+    reads = messages_table.calls
+    conversation = in_other_worker(monkeypatch, lambda: asyncio.run(ConversationService().get_cached_conversation(conversation_id)))
+    assert [(message.sequence, message.content) for message in conversation.messages] == [(0, "hello"), (1, "hi")]
+    assert messages_table.calls == reads
+
+def test_save_racing_another_write_marks_the_snapshot_stale(snapshots, monkeypatch):
+    service = ConversationService()
+    conversation_id = create_conversation(service)
+    conversation = asyncio.run(service.get_cached_conversation(conversation_id)).model_copy(deep=True)
+    conversation.messages += turn(2)
+    write = conversation_module.conversation_snapshots.write
+
+    def write_after_another_worker(conversation_id, messages):
+        # another worker writes to the conversation between our entity write and the snapshot
+        snapshots.table(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME).update_entity(
+            {"PartitionKey": "conversations", "RowKey": conversation_id, "description": "Renamed"}, mode="MERGE")
+        return write(conversation_id, messages)
+    monkeypatch.setattr(conversation_module.conversation_snapshots, "write", write_after_another_worker)
+    asyncio.run(service.save_conversation(conversation))
+    monkeypatch.setattr(conversation_module.conversation_snapshots, "write", write)
+
+    assert stored_entity(snapshots, conversation_id)["snapshot_etag"] == ""
+    # the next read goes to the tables
+    messages_table = snapshots.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+    reads = messages_table.calls
+    conversation = asyncio.run(service.get_cached_conversation(conversation_id))
+    assert [message.sequence for message in conversation.messages] == [0, 1, 2, 3]
+    assert messages_table.calls > reads
@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from models import Conversation, Message
+from services import conversation_service as conversation_module
+from services.conversation_service import ConversationService
+from services.title_service import PLACEHOLDER_DESCRIPTION
+
+@pytest.fixture
+def title_requests(monkeypatch):
+    requests = []
+    monkeypatch.setattr(conversation_module.title_worker, "enqueue", lambda conversation_id, *args: requests.append(conversation_id) or True)
+    return requests
+
+def start_conversation(service: ConversationService) -> Conversation:
+    return asyncio.run(service.save_conversation(Conversation(username="alice", messages=[Message(role="user", content="Plan the release", sequence=0)])))
+
+def next_turn(conversation: Conversation, description: str) -> Conversation:
+    messages = [message.model_copy() for message in conversation.messages] + [Message(role="assistant", content="Here is a plan", sequence=1)]
+    return conversation.model_copy(update={"description": description, "messages": messages})
+
+def stored_description(memory_storage, conversation_id: str) -> str:
+    return memory_storage.table("conversations").get_entity("conversations", conversation_id).get("description")
+
+def test_placeholder_from_client_keeps_generated_title(memory_storage, title_requests):
+    service = ConversationService()
+    conversation = start_conversation(service)
+    assert conversation.description == PLACEHOLDER_DESCRIPTION
+    assert title_requests == [conversation.conversation_id]
+    assert asyncio.run(service.set_generated_description(conversation.conversation_id, "Release plan"))
+
+    # the client still shows the placeholder and sends it back with the next turn
+    saved = asyncio.run(service.save_conversation(next_turn(conversation, PLACEHOLDER_DESCRIPTION)))
+    assert stored_description(memory_storage, conversation.conversation_id) == "Release plan"
+    assert saved.description == "Release plan"
+    # no second title request for a conversation that already has one
+    assert title_requests == [conversation.conversation_id]
+
+def test_placeholder_before_title_is_generated_still_requests_it(memory_storage, title_requests):
+    service = ConversationService()
+    conversation = start_conversation(service)
+    saved = asyncio.run(service.save_conversation(next_turn(conversation, PLACEHOLDER_DESCRIPTION)))
+    assert saved.description == PLACEHOLDER_DESCRIPTION
+    assert title_requests == [conversation.conversation_id] * 2
+
+def test_rename_by_user_is_stored(memory_storage, title_requests):
+    service = ConversationService()
+    conversation = start_conversation(service)
+    asyncio.run(service.set_generated_description(conversation.conversation_id, "Release plan"))
+    asyncio.run(service.save_conversation(next_turn(conversation, "Q3 release")))
+    assert stored_description(memory_storage, conversation.conversation_id) == "Q3 release"
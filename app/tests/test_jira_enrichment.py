@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+from integrations.jira import JiraIntegration
+from models.chat import User
+from services import jira_enrichment
+
+def test_only_keys_of_configured_projects_are_found():
+    text = "SHN-123 breaks UTF-16 input, hash with SHA-256 and log ISO-8601 dates like OPS-42 and SHN-123 do"
+    assert JiraIntegration().find_story_keys(text, 5, {"SHN", "OPS"}) == ["SHN-123", "OPS-42"]
+    assert JiraIntegration().find_story_keys(text, 5, set()) == []
+
+@pytest.fixture
+def jira(monkeypatch):
+    fetched = []
+    async def get_story_details(story_key, user):
+        fetched.append(story_key)
+        if story_key == "SHN-404":
+            raise Exception("Issue does not exist")
+        return {"key": story_key, "fields": {"summary": "Export fails", "description": "Steps to reproduce"}}
+    monkeypatch.setattr(jira_enrichment, "PROJECT_KEYS", frozenset({"SHN"}))
+    monkeypatch.setattr(jira_enrichment.jira_integration, "get_story_details", get_story_details)
+    monkeypatch.setattr(jira_enrichment.user_service, "get_user_info", lambda username: User(username=username, email="alice@example.com", first_name="Alice", last_name="Doe", api_keys={"JIRA": "key"}))
+    jira_enrichment.story_cache.clear()
+    jira_enrichment.failed_keys.clear()
+    return fetched
+
+def test_stories_are_fetched_once(jira):
+    first = asyncio.run(jira_enrichment.jira_story_contexts("Why does SHN-101 fail on UTF-16?", "alice"))
+    second = asyncio.run(jira_enrichment.jira_story_contexts("Still SHN-101", "alice"))
+    assert [context.name for context in first] == [context.name for context in second] == ["SHN-101: Export fails"]
+    assert jira == ["SHN-101"]
+
+def test_failed_keys_are_not_retried(jira):
+    for _ in range(3):
+        assert asyncio.run(jira_enrichment.jira_story_contexts("What about SHN-404?", "alice")) == []
+    assert jira == ["SHN-404"]
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from config import Config
+from controllers import llm_controller
+from models import Conversation, Message
+from services import llm_service
+from services.auth_service import AuthService
+from services.conversation_service import ConversationService
+from services.llm_admission import LLMAdmissionController
+from llm_stub import Reply, ScriptedLLM, route_llm_calls
+
+pytestmark = pytest.mark.usefixtures("word_tokenizer")
+
+def payload(content: str) -> dict:
+    return llm_service.build_api_payload([{"role": "user", "content": content}], max_tokens=100)
+
+async def call(content: str, username: str = "alice"):
+    return await llm_service.call_llm_api(payload(content), use_cache=False, username=username)
+
+def test_concurrency_limit(monkeypatch):
+    with ScriptedLLM(Reply(delay=0.2)) as stub:
+        route_llm_calls(monkeypatch, [stub], max_concurrency=2)
+
+        async def burst():
+            return await asyncio.gather(*(call(f"question {i}", f"user-{i}") for i in range(6)))
+        assert asyncio.run(burst()) == ["ok"] * 6
+    assert stub.max_in_flight == 2
+    assert len(stub.requests) == 6
+
+def test_waiting_users_are_served_round_robin(monkeypatch):
+    with ScriptedLLM(Reply(delay=0.1)) as stub:
+        route_llm_calls(monkeypatch, [stub], max_concurrency=1)
+
+        async def burst():
+            # alice queues a batch before bob asks once
+            calls = [asyncio.create_task(call(f"alice {i}", "alice")) for i in range(4)]
+            await asyncio.sleep(0.02)
+            calls.append(asyncio.create_task(call("bob 0", "bob")))
+            await asyncio.gather(*calls)
+        asyncio.run(burst())
+    order = [content for _, content in stub.requests]
+    # alice's first call was admitted straight away, then the waiting users take turns
+    assert order.index("bob 0") == 2
+
+def test_token_budget_holds_requests_back():
+    async def scenario():
+        admission = LLMAdmissionController(max_concurrency=10, tokens_per_minute=6000)
+        async with admission.admit("alice", 6000):
+            pass
+        started = time.monotonic()
+        # the bucket refills at 100 tokens a second
+        async with admission.admit("bob", 50):
+            return time.monotonic() - started
+    assert 0.4 <= asyncio.run(scenario()) < 2
+
+def test_retry_after_pauses_every_request(monkeypatch):
+    throttled = Reply(status=429, headers={"retry-after-ms": "500", "retry-after": "1"})
+    with ScriptedLLM() as stub:
+        stub.script.append(throttled)
+        route_llm_calls(monkeypatch, [stub])
+
+        async def scenario():
+            first = asyncio.create_task(call("first", "alice"))
+            # arrives while admission is paused after the 429
+            await asyncio.sleep(0.1)
+            second = asyncio.create_task(call("second", "bob"))
+            return await asyncio.gather(first, second)
+        assert asyncio.run(scenario()) == ["ok", "ok"]
+    (throttled_at, _), *retries = stub.requests
+    assert len(retries) == 2
+    # Retry-After is honoured for the retry and for the request that came in meanwhile
+    assert all(arrived_at - throttled_at >= 0.5 for arrived_at, _ in retries)
+
+def test_rate_limit_is_reported_once_retries_run_out(monkeypatch):
+    with ScriptedLLM(Reply(status=429, headers={"retry-after-ms": "200"})) as stub:
+        route_llm_calls(monkeypatch, [stub])
+        monkeypatch.setattr(Config, "LLM_MAX_RETRIES", 2)
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(call("question"))
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 1
+    assert len(stub.requests) == 3
+
+def test_description_endpoint_passes_rate_limits_through(monkeypatch):
+    with ScriptedLLM(Reply(status=429, headers={"retry-after-ms": "100"})) as stub:
+        route_llm_calls(monkeypatch, [stub])
+        monkeypatch.setattr(Config, "LLM_MAX_RETRIES", 0)
+        app = FastAPI()
+        app.include_router(llm_controller.router, prefix="/api")
+        app.dependency_overrides[AuthService.verify_jwt_token] = lambda: {"username": "alice"}
+        response = TestClient(app).post("/api/llm-query/description", json={"prompt": "Plan the release"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+def test_stream_rate_limited_before_first_token_saves_nothing(memory_storage, monkeypatch):
+    conversation = asyncio.run(ConversationService().save_conversation(Conversation(username="alice", description="Release", messages=[
+        Message(role="user", content="hello", sequence=0),
+        Message(role="assistant", content="hi", sequence=1)
+    ])))
+    with ScriptedLLM(Reply(status=429, headers={"retry-after-ms": "100"})) as stub:
+        route_llm_calls(monkeypatch, [stub])
+        monkeypatch.setattr(Config, "LLM_MAX_RETRIES", 0)
+        app = FastAPI()
+        app.include_router(llm_controller.router, prefix="/api")
+        app.dependency_overrides[AuthService.verify_jwt_token] = lambda: {"username": "alice"}
+        body = {"conversation_id": conversation.conversation_id, "message": {"role": "user", "content": "and then?", "sequence": 2}}
+        response = TestClient(app).post("/api/llm-query/stream/", json=body)
+    events = [json.loads(line[6:]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1]["status"] == 429 and events[-1]["message_ids"] is None
+    # the client sends the turn again, so it must not already be stored
+    time.sleep(0.2)
+    messages_table = memory_storage.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+    assert sorted(data["sequence"] for _, data in messages_table.rows.values()) == [0, 1]
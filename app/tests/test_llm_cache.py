@@ -0,0 +1,64 @@
+import asyncio
+import json
+import os
+import time
+from services.llm_cache import LLMResponseCache, cache_key
+from services.llm_endpoints import LLMEndpoint, LLMEndpointPool
+
+def write_entry(cache: LLMResponseCache, key: str, content: str, age_seconds: float):
+    created_at = time.time() - age_seconds
+    path = cache._path(key)
+    path.write_text(json.dumps({"created_at": created_at, "content": content}), encoding='utf-8')
+    os.utime(path, (created_at, created_at))
+
+def test_disk_hit_keeps_its_remaining_ttl(tmp_path):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60, directory=str(tmp_path))
+    write_entry(cache, "key", "cached", age_seconds=59.8)
+    assert asyncio.run(cache.get("key")) == "cached"
+    time.sleep(0.3)
+    # expired in memory as well as on disk, not kept for another full TTL
+    assert cache.memory.get("key") is None
+    assert asyncio.run(cache.get("key")) is None
+    assert not cache._path("key").exists()
+
+def test_disk_tier_evicts_oldest_entries(tmp_path):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=3600, directory=str(tmp_path), disk_max_entries=10)
+    for i in range(10):
+        write_entry(cache, f"old-{i}", "x", age_seconds=100 - i)
+    for i in range(5):
+        asyncio.run(cache.set(f"new-{i}", "y"))
+    keys = {path.stem for path in tmp_path.glob("*.json")}
+    assert len(keys) <= 10
+    assert {f"new-{i}" for i in range(5)} <= keys
+    # whatever was evicted is older than whatever was kept
+    evicted = {f"old-{i}" for i in range(10)} - keys
+    assert evicted and max(int(key.split("-")[1]) for key in evicted) < min(int(key.split("-")[1]) for key in keys if key.startswith("old-"))
+
+def test_disk_tier_stays_under_its_byte_limit(tmp_path):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=3600, directory=str(tmp_path), disk_max_bytes=10_000)
+    for i in range(50):
+        asyncio.run(cache.set(f"key-{i}", "z" * 900))
+    assert sum(path.stat().st_size for path in tmp_path.glob("*.json")) <= 10_000
+    assert cache._path("key-49").exists()
+
+def test_sweep_removes_expired_entries(tmp_path):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60, directory=str(tmp_path), disk_max_entries=3)
+    for i in range(3):
+        write_entry(cache, f"expired-{i}", "x", age_seconds=120)
+    write_entry(cache, "fresh", "x", age_seconds=1)
+    asyncio.run(cache.set("new", "y"))
+    assert {path.stem for path in tmp_path.glob("*.json")} == {"fresh", "new"}
+
+def test_key_depends_on_the_deployments_and_model():
+    payload = {"messages": [{"role": "user", "content": "question"}], "temperature": 0}
+    key = cache_key(payload, ["gpt-4o", "gpt-4o-eu"])
+    # the order endpoints are configured in, or streaming, makes no difference
+    assert cache_key({**payload, "stream": True}, ["gpt-4o-eu", "gpt-4o"]) == key
+    assert cache_key(payload, ["gpt-4o-mini"]) != key
+    assert cache_key(payload, ["gpt-4o", "gpt-4o-mini"]) != key
+    assert cache_key({**payload, "model": "gpt-4o-mini"}, ["gpt-4o", "gpt-4o-eu"]) != key
+
+def test_pool_reports_its_deployments():
+    endpoints = [LLMEndpoint(name, f"https://{name}.example.com/", "key", "2024-06-01", deployment)
+                 for name, deployment in [("east", "gpt-4o"), ("west", "gpt-4o"), ("north", "gpt-4o-mini")]]
+    assert LLMEndpointPool(endpoints, 3, 30).deployments == ["gpt-4o", "gpt-4o", "gpt-4o-mini"]
@@ -0,0 +1,66 @@
+import asyncio
+import time
+import pytest
+from models import Message
+from services import llm_service
+from llm_stub import Reply, ScriptedLLM, route_llm_calls
+
+pytestmark = pytest.mark.usefixtures("word_tokenizer")
+
+def call(content: str = "question") -> str:
+    payload = llm_service.build_api_payload([{"role": "user", "content": content}], max_tokens=100)
+    return asyncio.run(llm_service.call_llm_api(payload, use_cache=False, username="alice"))
+
+def test_fails_over_in_order(monkeypatch):
+    with ScriptedLLM(Reply(status=500)) as failing, \
+            ScriptedLLM(Reply(status=429, headers={"retry-after-ms": "5000"})) as throttled, \
+            ScriptedLLM(Reply(content="answer")) as healthy:
+        route_llm_calls(monkeypatch, [failing, throttled, healthy])
+        started = time.monotonic()
+        assert call() == "answer"
+        elapsed = time.monotonic() - started
+    arrivals = [(stub.arrivals()[0], name) for stub, name in ((failing, "failing"), (throttled, "throttled"), (healthy, "healthy"))]
+    assert [name for _, name in sorted(arrivals)] == ["failing", "throttled", "healthy"]
+    # with a healthy endpoint left, a 429 moves on instead of waiting out its Retry-After
+    assert elapsed < 5
+
+def test_stream_fails_over_before_the_first_token(monkeypatch):
+    with ScriptedLLM(Reply(status=503)) as failing, ScriptedLLM(Reply(content="streamed answer")) as healthy:
+        route_llm_calls(monkeypatch, [failing, healthy])
+
+        async def stream():
+            return [token async for token in llm_service.chat_with_llm_stream([Message(role="user", content="question")], use_cache=False)]
+        assert "".join(asyncio.run(stream())).split() == ["streamed", "answer"]
+    assert len(failing.requests) == 1 and len(healthy.requests) == 1
+
+def test_slow_endpoint_gets_less_traffic(monkeypatch):
+    with ScriptedLLM(Reply(delay=0.5)) as slow, ScriptedLLM(Reply(delay=0.02)) as fast:
+        route_llm_calls(monkeypatch, [slow, fast])
+
+        async def rounds():
+            for round in range(6):
+                await asyncio.gather(*(llm_service.call_llm_api(llm_service.build_api_payload(
+                    [{"role": "user", "content": f"round {round}"}], max_tokens=100), use_cache=False) for _ in range(5)))
+        asyncio.run(rounds())
+    served = lambda stub, round: sum(content == f"round {round}" for _, content in stub.requests)
+    # both share the first rounds while their latencies are unknown, then the slow one is left with little
+    assert served(slow, 0) > 0 and served(fast, 0) > 0
+    assert sum(served(fast, round) for round in (3, 4, 5)) >= 2 * sum(served(slow, round) for round in (3, 4, 5))
+
+def test_failing_endpoint_is_ejected_then_probed(monkeypatch):
+    with ScriptedLLM() as flaky, ScriptedLLM() as steady:
+        flaky.script.extend([Reply(status=500), Reply(status=500)])
+        # the flaky endpoint is preferred whenever it is available
+        pool = route_llm_calls(monkeypatch, [flaky, steady], failure_threshold=2, ejection_seconds=0.5, weights=[10, 1])
+        call()
+        call()
+        assert len(flaky.requests) == 2 and len(steady.requests) == 2
+        assert pool.endpoints[0].ejected_until > time.monotonic()
+        # ejected: traffic goes around it until the cooldown is over
+        call()
+        assert len(flaky.requests) == 2 and len(steady.requests) == 3
+        time.sleep(0.6)
+        # back as a probe, which succeeds and clears its failures
+        call()
+        assert len(flaky.requests) == 3 and len(steady.requests) == 3
+        assert pool.endpoints[0].consecutive_failures == 0
@@ -0,0 +1,51 @@
+import asyncio
+import time
+import pytest
+from utils import profiling as profiling_module
+from utils.profiling import CaptureRule, ProfileStore, ProfilingMiddleware, StackSampler
+
+def capture(store: ProfileStore) -> str:
+    return store.save({"mode": "cprofile"}, lambda path: path.write_bytes(b""))["capture_id"]
+
+@pytest.mark.parametrize("max_captures", [1, 3])
+def test_store_keeps_the_newest_captures(tmp_path, max_captures):
+    store = ProfileStore(str(tmp_path), max_captures)
+    capture_ids = [capture(store) for _ in range(5)]
+    assert [meta["capture_id"] for meta in store.list()] == capture_ids[::-1][:max_captures]
+    # the profile files go with their metadata
+    assert len(list(tmp_path.glob("*.pstats"))) == max_captures
+
+def test_store_rejects_keeping_no_captures(tmp_path):
+    with pytest.raises(ValueError):
+        ProfileStore(str(tmp_path), 0)
+
+def test_sampler_is_joined_off_the_event_loop(tmp_path, monkeypatch):
+    join = StackSampler.join
+    def slow_join(self):
+        time.sleep(0.3)
+        join(self)
+    monkeypatch.setattr(StackSampler, "join", slow_join)
+    monkeypatch.setattr(profiling_module.profiling, "store", ProfileStore(str(tmp_path), 5))
+    monkeypatch.setattr(profiling_module.profiling, "rule", CaptureRule("sampling", "^/slow", 0, time.monotonic() + 60, 1, 1))
+
+    async def app(scope, receive, send):
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+    async def scenario():
+        async def send(message):
+            pass
+        ticks = []
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+        task = asyncio.create_task(ticker())
+        await ProfilingMiddleware(app)({"type": "http", "method": "GET", "path": "/slow"}, None, send)
+        task.cancel()
+        return max(later - earlier for earlier, later in zip(ticks, ticks[1:]))
+
+    longest_stall = asyncio.run(scenario())
+    assert longest_stall < 0.2
+    assert len(profiling_module.profiling.store.list()) == 1
@@ -0,0 +1,145 @@
+from hypothesis import given, settings, strategies as st
+import pytest
+from models import Context, Message
+from services.prompt_packer import IMAGE_TOKEN_COST, TOKENS_PER_REPLY, count_message_tokens, pack_chat_messages
+
+pytestmark = pytest.mark.usefixtures("word_tokenizer")
+
+# a context's content is determined by its index, so equal indexes are duplicates of each other
+CONTEXT_WORDS = [1, 5, 20, 80, 200]
+
+@st.composite
+def contexts(draw, prefix: str):
+    kind = draw(st.sampled_from(["text", "file", "url", "image"]))
+    index = draw(st.integers(0, len(CONTEXT_WORDS) - 1))
+    return Context(
+        context_id=f"{prefix}-{draw(st.uuids())}",
+        type=kind,
+        content=f"ctx{index} " + " ".join(["w"] * CONTEXT_WORDS[index]),
+        pinned=draw(st.booleans())
+    )
+
+@st.composite
+def conversations(draw):
+    count = draw(st.integers(0, 12))
+    sequences = draw(st.permutations(range(count)))
+    messages = [
+        Message(
+            message_id=f"m{sequence}",
+            content=f"m{sequence} " + " ".join(["w"] * draw(st.integers(0, 60))),
+            role=draw(st.sampled_from(["user", "assistant"])),
+            sequence=sequence,
+            contexts=draw(st.lists(contexts("message"), max_size=3))
+        )
+        for sequence in sequences
+    ]
+    project_contexts = [context.model_copy(update={"pinned": False}) for context in draw(st.lists(contexts("project"), max_size=3))]
+    return messages, project_contexts
+
+layouts = st.sampled_from(["legacy", "stable_prefix"])
+
+def prompt_parts(result) -> list:
+    parts = []
+    for chat_message in result.prefix + result.messages:
+        content = chat_message["content"]
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(part["text"] if part["type"] == "text" else part["image_url"]["url"] for part in content)
+    return parts
+
+def rendered(context: Context) -> str:
+    return f"data:image/jpeg;base64,{context.content}" if context.type == "image" else f"{context.type}: {context.content}"
+
+def occurrences(context: Context, parts: list) -> int:
+    needle = rendered(context)
+    if context.type == "image":
+        return parts.count(needle)
+    # contexts are joined with ", " and end the message
+    return sum(part.count(needle + ", ") + part.endswith(needle) for part in parts)
+
+def latest_user_sequence(messages: list):
+    return max((message.sequence for message in messages if message.role == "user"), default=None)
+
+def pack(messages, project_contexts, max_tokens, reserved_tokens, layout):
+    try:
+        return pack_chat_messages(messages, project_contexts, max_tokens=max_tokens, reserved_tokens=reserved_tokens, layout=layout)
+    except ValueError as e:
+        # only when the latest user turn and the pinned contexts alone don't fit
+        assert "too long" in str(e)
+        return None
+
+@settings(max_examples=300, deadline=None)
+@given(conversations(), st.integers(300, 4000), st.integers(0, 200), layouts)
+def test_fits_the_window(conversation, max_tokens, reserved_tokens, layout):
+    messages, project_contexts = conversation
+    result = pack(messages, project_contexts, max_tokens, reserved_tokens, layout)
+    if result is None:
+        return
+    assert result.used_tokens <= result.max_input_tokens
+    tokens = sum(count_message_tokens(chat_message) for chat_message in result.prefix + result.messages)
+    assert result.used_tokens == tokens + reserved_tokens + TOKENS_PER_REPLY
+
+@settings(max_examples=300, deadline=None)
+@given(conversations(), st.integers(300, 4000), layouts)
+def test_keeps_the_latest_user_turn_and_the_newest_history(conversation, max_tokens, layout):
+    messages, project_contexts = conversation
+    result = pack(messages, project_contexts, max_tokens, 0, layout)
+    if result is None:
+        return
+    latest_user = latest_user_sequence(messages)
+    dropped = set(result.dropped_message_sequences)
+    kept = sorted(message.sequence for message in messages if message.sequence not in dropped)
+    assert len(dropped) == len(result.dropped_message_sequences)
+    assert latest_user not in dropped
+    # kept messages come out oldest first, with their own content
+    assert [chat_message["role"] for chat_message in result.messages] == [message.role for message in sorted(messages, key=lambda m: m.sequence) if message.sequence in kept]
+    for sequence, part in zip(kept, [chat_message["content"] if isinstance(chat_message["content"], str) else chat_message["content"][0]["text"] for chat_message in result.messages]):
+        assert part.split(" ", 1)[0] == f"m{sequence}"
+    # history is dropped oldest first
+    if dropped:
+        assert max(dropped) < min((sequence for sequence in kept if sequence != latest_user), default=max(dropped) + 1)
+
+@settings(max_examples=300, deadline=None)
+@given(conversations(), st.integers(300, 4000), layouts)
+def test_pinned_contexts_are_always_sent(conversation, max_tokens, layout):
+    messages, project_contexts = conversation
+    result = pack(messages, project_contexts, max_tokens, 0, layout)
+    if result is None or latest_user_sequence(messages) is None:
+        return
+    parts = prompt_parts(result)
+    pinned = project_contexts + [context for message in messages for context in message.contexts if context.pinned]
+    for context in pinned:
+        assert occurrences(context, parts) == 1
+
+@settings(max_examples=300, deadline=None)
+@given(conversations(), st.integers(300, 4000), layouts)
+def test_each_context_is_sent_once_or_reported_dropped(conversation, max_tokens, layout):
+    messages, project_contexts = conversation
+    result = pack(messages, project_contexts, max_tokens, 0, layout)
+    if result is None:
+        return
+    parts = prompt_parts(result)
+    all_contexts = project_contexts + [context for message in messages for context in message.contexts]
+    missing = set()
+    for context in all_contexts:
+        sent = occurrences(context, parts)
+        assert sent <= 1
+        if not sent:
+            missing.add((context.type, context.content))
+    by_id = {context.context_id: (context.type, context.content) for context in all_contexts}
+    reported = [by_id[context_id] for context_id in result.dropped_contexts]
+    assert len(reported) == len(set(reported))
+    assert set(reported) == missing
+
+@settings(max_examples=100, deadline=None)
+@given(conversations(), layouts)
+def test_nothing_is_dropped_when_everything_fits(conversation, layout):
+    messages, project_contexts = conversation
+    everything = sum(len(message.content.split()) + 10 for message in messages) + sum(
+        IMAGE_TOKEN_COST + len(context.content.split()) + 2
+        for context in project_contexts + [context for message in messages for context in message.contexts]
+    )
+    result = pack_chat_messages(messages, project_contexts, max_tokens=everything * 2 + 100, layout=layout)
+    assert result.dropped_message_sequences == []
+    assert result.dropped_contexts == [] or latest_user_sequence(messages) is None
@@ -0,0 +1,25 @@
+import asyncio
+from services.search_index import SearchIndex
+
+def messages(count: int, text: str = "deployment notes") -> list:
+    return [(f"m{i}", "user", f"{text} {i}") for i in range(count)]
+
+def reindex_changes(index: SearchIndex, count: int) -> int:
+    """Rows the second save of an unchanged conversation with count messages writes, triggers included"""
+    asyncio.run(index.index_conversation(f"c{count}", "alice", "Release", "2024-01-01", messages(count)))
+    connection = index._connect()
+    before = connection.total_changes
+    asyncio.run(index.index_conversation(f"c{count}", "alice", "Release", "2024-01-02", messages(count)))
+    return connection.total_changes - before
+
+def test_unchanged_messages_are_not_rewritten():
+    index = SearchIndex(":memory:")
+    assert reindex_changes(index, 50) == reindex_changes(index, 1)
+
+def test_changed_message_is_reindexed():
+    index = SearchIndex(":memory:")
+    asyncio.run(index.index_conversation("c1", "alice", "Release", "2024-01-01", messages(3)))
+    asyncio.run(index.index_conversation("c1", "alice", "Release", "2024-01-02",
+                                         messages(2) + [("m2", "user", "rollback procedure")]))
+    assert [match["message_id"] for result in asyncio.run(index.search("alice", "rollback", 10)) for match in result["matches"]] == ["m2"]
+    assert [match["message_id"] for result in asyncio.run(index.search("alice", "deployment", 10)) for match in result["matches"]] == ["m0", "m1"]
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+from config import Config
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules whose setup takes hundreds of milliseconds, they are loaded on first use or by the warm-up
+DEFERRED_MODULES = ("tiktoken", "lxml.html", "bs4")
+
+IMPORT_APP = """
+import json, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({"seconds": time.perf_counter() - started, "modules": sorted(sys.modules)}))
+"""
+
+def import_app(cwd) -> dict:
+    # a fresh interpreter each time, the test process has most of the app imported already
+    env = {**os.environ, "PYTHONPATH": APP_DIR}
+    completed = subprocess.run([sys.executable, "-c", IMPORT_APP], cwd=cwd, env=env, capture_output=True, text=True, timeout=60, check=True)
+    # the app logs to stdout as well
+    return json.loads(next(line for line in completed.stdout.splitlines() if line.startswith('{"seconds"')))
+
+def test_app_imports_within_budget(tmp_path):
+    # the best of a few runs, the first one may be paying for a cold disk cache
+    runs = [import_app(tmp_path) for _ in range(3)]
+    seconds = min(run["seconds"] for run in runs)
+    assert seconds < Config.IMPORT_TIME_BUDGET_SECONDS, f"importing the app took {seconds:.2f}s"
+
+def test_heavy_modules_are_not_imported(tmp_path):
+    modules = import_app(tmp_path)["modules"]
+    assert [module for module in DEFERRED_MODULES if module in modules] == []
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from config import Config
+from controllers import llm_controller
+from models import Conversation, Message
+from services.auth_service import AuthService
+from services.conversation_service import ConversationService
+from utils.metrics import metrics
+from llm_stub import BackgroundServer, route_llm_calls
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "loadtest"))
+import stub_openai
+
+pytestmark = pytest.mark.usefixtures("word_tokenizer")
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+def api_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(llm_controller.router, prefix="/api")
+    app.dependency_overrides[AuthService.verify_jwt_token] = lambda: {"username": "alice"}
+    return app
+
+async def read_then_disconnect(url: str, body: dict, content_events: int) -> list:
+    received = []
+    async with httpx.AsyncClient(timeout=10) as client:
+        async with client.stream("POST", url, json=body) as response:
+            assert response.status_code == 200
+            async for line in response.aiter_lines():
+                if line.startswith("data: ") and "content" in line:
+                    received.append(json.loads(line[6:])["content"])
+                    if len(received) == content_events:
+                        # leaving the block closes the connection with the stream half read
+                        break
+    return received
+
+def test_client_disconnect_cancels_upstream_and_saves_partial_turn(memory_storage, monkeypatch):
+    # 200 tokens at 20 a second: the completion is far from done when the client leaves
+    monkeypatch.setattr(stub_openai.settings, "tokens_per_second", 20)
+    monkeypatch.setattr(stub_openai.settings, "ttft_ms", 50)
+    monkeypatch.setattr(stub_openai.settings, "jitter", 0)
+    monkeypatch.setattr(stub_openai.settings, "completion_tokens", 200)
+    monkeypatch.setattr(Config, "SSE_COALESCE_MS", 0)
+    monkeypatch.setattr(Config, "SSE_DISCONNECT_POLL_SECONDS", 0.1)
+    conversation = asyncio.run(ConversationService().save_conversation(Conversation(username="alice", description="Streaming", messages=[
+        Message(role="user", content="hello", sequence=0),
+        Message(role="assistant", content="hi", sequence=1)
+    ])))
+    cancelled = stub_openai.stats["cancelled"]
+    cancelled_streams = metrics.snapshot()["counters"].get("llm.stream.cancelled", 0)
+
+    with BackgroundServer(stub_openai.app) as stub, BackgroundServer(api_app()) as api:
+        route_llm_calls(monkeypatch, [stub])
+        body = {"conversation_id": conversation.conversation_id, "message": {"role": "user", "content": "tell me more", "sequence": 2}}
+        received = asyncio.run(read_then_disconnect(f"{api.url}api/llm-query/stream/", body, content_events=5))
+        assert len(received) == 5
+
+        # the upstream completion is closed rather than left to run to the end
+        assert wait_for(lambda: stub_openai.stats["cancelled"] == cancelled + 1)
+        messages_table = memory_storage.table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME)
+        saved = lambda: [data for _, data in messages_table.rows.values()
+                         if data["conversation_id"] == conversation.conversation_id and data["sequence"] >= 2]
+        assert wait_for(lambda: len(saved()) == 2)
+
+    user_turn, reply = sorted(saved(), key=lambda data: data["sequence"])
+    assert (user_turn["role"], user_turn["content"], user_turn["is_partial"]) == ("user", "tell me more", False)
+    assert reply["role"] == "assistant" and reply["is_partial"]
+    # what the client saw is what was kept, and no more than the stub had sent
+    assert reply["content"].startswith("".join(received))
+    assert len(reply["content"].split()) < stub_openai.settings.completion_tokens
+    assert metrics.snapshot()["counters"].get("llm.stream.cancelled", 0) == cancelled_streams + 1
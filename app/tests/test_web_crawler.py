@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from config import Config
+from services import web_crawler
+from services.web_crawler import WebCrawler
+
+class FakeScraper:
+    """pages maps each URL to (content, links); redirects maps a URL to the one it lands on"""
+
+    def __init__(self, pages: dict, redirects: dict):
+        self.pages = pages
+        self.redirects = redirects
+        self.fetched = []
+
+    def is_fresh(self, url: str) -> bool:
+        return False
+
+    async def scrape_page(self, url: str) -> dict:
+        self.fetched.append(url)
+        content, links = self.pages[url]
+        return {"url": self.redirects.get(url, url), "title": content, "content": content, "links": links,
+                "tokens": 1, "truncated": False}
+
+@pytest.fixture
+def site(monkeypatch):
+    monkeypatch.setattr(Config, "WEB_CRAWL_HOST_DELAY_SECONDS", 0)
+    monkeypatch.setattr(Config, "WEB_CRAWL_CONCURRENCY", 1)
+
+    def install(pages: dict, redirects: dict = None) -> FakeScraper:
+        scraper = FakeScraper({f"https://example.com/docs/{path}": (content, [f"https://example.com/docs/{link}" for link in links])
+                               for path, (content, links) in pages.items()},
+                              {f"https://example.com/docs/{path}": f"https://example.com/docs/{target}"
+                               for path, target in (redirects or {}).items()})
+        monkeypatch.setattr(web_crawler, "web_scraper", scraper)
+        return scraper
+    return install
+
+def crawl(max_pages: int, depth: int) -> list:
+    async def collect():
+        return [page async for page in WebCrawler(max_pages, depth).run(seed_url="https://example.com/docs/")]
+    return asyncio.run(collect())
+
+def test_duplicate_pages_do_not_expand_their_links(site):
+    scraper = site({
+        "": ("index", ["a", "copy"]),
+        "a": ("same text", []),
+        "copy": ("same text", ["only-linked-from-copy"]),
+        "only-linked-from-copy": ("more", [])
+    })
+    pages = crawl(max_pages=10, depth=2)
+    assert {"url": "https://example.com/docs/copy", "duplicate_of": "https://example.com/docs/a"} in pages
+    assert "https://example.com/docs/only-linked-from-copy" not in scraper.fetched
+
+def test_redirect_targets_do_not_use_up_max_pages(site):
+    scraper = site({
+        "": ("index", ["old"]),
+        "old": ("moved", ["b"]),
+        "b": ("b", ["c"]),
+        "c": ("c", [])
+    }, redirects={"old": "new"})
+    pages = crawl(max_pages=4, depth=3)
+    assert len(scraper.fetched) == 4
+    assert [page["url"] for page in pages][-1] == "https://example.com/docs/c"
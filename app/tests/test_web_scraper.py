@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import socket
+import httpx
+import pytest
+from fastapi import HTTPException
+from services.web_scraper import extract_page, parse_page
+
+@pytest.mark.parametrize("body", [b"", b"   \n\t ", b"<!-- nothing here -->"])
+@pytest.mark.parametrize("encoding", [None, "utf-8"])
+def test_empty_page(body, encoding):
+    assert extract_page(body, encoding, "https://example.com/") == {"content": "", "title": "", "links": []}
+
+def test_empty_page_has_no_tokens(word_tokenizer):
+    assert parse_page(b"", "utf-8", "text/html", "https://example.com/")["tokens"] == 0
+
+def test_page_content_title_and_links():
+    body = (b"<html><head><title>Release notes</title></head><body><nav><a href='/home'>Home</a></nav>"
+            b"<main><h1>Version 2</h1><p>Faster <a href='changes'>imports</a>.</p></main></body></html>")
+    page = extract_page(body, "utf-8", "https://example.com/docs/")
+    assert page == {
+        "content": "Version 2\nFaster imports.",
+        "title": "Release notes",
+        "links": ["https://example.com/home", "https://example.com/docs/changes"]
+    }
+
+@pytest.fixture
+def web(monkeypatch):
+    """A scraper whose requests are answered by `web.pages`, with example.com resolving to a public address"""
+    from services import web_scraper as web_scraper_module
+    pages = {}
+    requested = []
+
+    def handle(request):
+        requested.append(str(request.url))
+        return pages.get(str(request.url), httpx.Response(404))
+    resolve = socket.getaddrinfo
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, *args, **kwargs: resolve(
+        "93.184.215.14" if host == "example.com" else host, *args, **kwargs))
+    monkeypatch.setattr(web_scraper_module.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handle)))
+    scraper = web_scraper_module.WebScraper()
+    scraper.pages, scraper.requested = pages, requested
+    return scraper
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1:8000/", "http://10.1.2.3/", "http://169.254.169.254/latest/meta-data/", "http://[::1]/"])
+def test_private_addresses_are_refused(web, url):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(web.fetch(url))
+    assert error.value.status_code == 400
+    assert web.requested == []
+
+def test_redirects_to_private_addresses_are_refused(web):
+    web.pages["https://example.com/"] = httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data/"})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(web.fetch("https://example.com/"))
+    assert error.value.status_code == 400
+    assert web.requested == ["https://example.com/"]
+
+def test_public_hosts_are_fetched(web):
+    web.pages["https://example.com/"] = httpx.Response(200, text="<p>hello</p>", headers={"content-type": "text/html"})
+    assert asyncio.run(web.fetch("https://example.com/"))["body"] == b"<p>hello</p>"
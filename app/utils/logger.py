@@ -1,44 +1,174 @@
-import logging
-import sys
-import traceback
-from pathlib import Path
-from logging.handlers import RotatingFileHandler
-
-# Create logs directory if it doesn't exist
-logs_dir = Path("logs")
-logs_dir.mkdir(exist_ok=True)
-
-class CustomLogger(logging.Logger):
-    def error(self, msg, *args, **kwargs):
-        super().error(msg, *args, **kwargs)
-        # if we have an exception argument, print the stack trace
-        # if 'exc_info' in kwargs and kwargs['exc_info']:
-        super().error(f"Stack trace: {traceback.format_exc()}")
-
-# Configure logging
-def setup_logger(name: str) -> logging.Logger:
-    logger = CustomLogger(name)
-    logger.setLevel(logging.DEBUG)
-
-    # Format for our log messages
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-
-    # Console Handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # File Handler
-    file_handler = RotatingFileHandler(
-        logs_dir / "app.log",
-        maxBytes=10485760,  # 10MB
-        backupCount=5
-    )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    return logger
-
-logger = setup_logger(__name__)
+import atexit
+import copy
+import datetime
+import json
+import logging
+import queue
+import sys
+from collections import defaultdict
+from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import Config
+from utils.metrics import metrics
+
+# Create logs directory if it doesn't exist
+logs_dir = Path("logs")
+logs_dir.mkdir(exist_ok=True)
+
+REDACTED = "***"
+SENSITIVE_KEYS = {"authorization", "password", "secret", "token", "key", "api_keys", "connection_string", "signupcode"}
+SENSITIVE_SUFFIXES = ("_key", "apikey", "_password", "_secret", "_token")
+MAX_STRING_CHARS = 200
+MAX_ITEMS = 20
+# LogRecord attributes; anything else on a record came in through `extra` and goes into the JSON as a field
+RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+def is_sensitive(key) -> bool:
+    normalized = str(key).lower().replace('-', '_')
+    return normalized in SENSITIVE_KEYS or normalized.endswith(SENSITIVE_SUFFIXES)
+
+def truncate(value, max_chars: int = None) -> str:
+    text = value if isinstance(value, str) else str(value)
+    max_chars = max_chars or Config.LOG_MAX_FIELD_CHARS
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+def _shorten(value, depth: int = 0):
+    if hasattr(value, 'model_dump'):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        if depth >= 4:
+            return f"{{{len(value)} keys}}"
+        items = list(value.items())
+        shortened = {k: REDACTED if is_sensitive(k) else _shorten(v, depth + 1) for k, v in items[:MAX_ITEMS]}
+        if len(items) > MAX_ITEMS:
+            shortened["..."] = f"{len(items) - MAX_ITEMS} more keys"
+        return shortened
+    if isinstance(value, (list, tuple)):
+        if depth >= 4:
+            return f"[{len(value)} items]"
+        shortened = [_shorten(v, depth + 1) for v in value[:MAX_ITEMS]]
+        if len(value) > MAX_ITEMS:
+            shortened.append(f"... {len(value) - MAX_ITEMS} more items")
+        return shortened
+    if isinstance(value, str):
+        # long strings are message bodies, contexts or base64 images: keep the start and the size
+        return truncate(value, MAX_STRING_CHARS)
+    return value
+
+def loggable(value) -> str:
+    """
+    Log-safe rendering of payloads, entities and models: secrets are masked, long strings and lists
+    are cut short, so the cost of a log line no longer grows with the size of what it describes
+    """
+    return truncate(_shorten(value))
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DebugSampler(logging.Filter):
+    """Keeps every n-th DEBUG record per source module, where 1/n is the module's sample rate"""
+
+    def __init__(self, default_rate: float, rates: dict):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates
+        self.counts = defaultdict(int)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.rates.get(record.module, self.default_rate)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        self.counts[record.module] += 1
+        return (self.counts[record.module] - 1) % round(1 / rate) == 0
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them, so building JSON and rendering
+    tracebacks happens off the event loop. Records are dropped (and counted) when the queue is full.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("logging.dropped")
+
+class CustomLogger(logging.Logger):
+    def error(self, msg, *args, **kwargs):
+        # attach the stack trace only when an exception is actually being handled
+        if 'exc_info' not in kwargs and sys.exc_info()[0] is not None:
+            kwargs['exc_info'] = True
+        # report the caller's location rather than this override
+        kwargs['stacklevel'] = kwargs.get('stacklevel', 1) + 1
+        super().error(msg, *args, **kwargs)
+
+def parse_sample_rates(value: str) -> dict:
+    # "llm_service=0.1,conversation_service=0.5"
+    rates = {}
+    for pair in filter(None, (part.strip() for part in value.split(','))):
+        module, _, rate = pair.partition('=')
+        rates[module.strip()] = float(rate)
+    return rates
+
+def build_handlers() -> list:
+    # Format for our log messages
+    if Config.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Console Handler
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    # File Handler
+    file_handler = RotatingFileHandler(
+        logs_dir / "app.log",
+        maxBytes=10485760,  # 10MB
+        backupCount=5
+    )
+    file_handler.setFormatter(formatter)
+    return [console_handler, file_handler]
+
+# Configure logging
+def setup_logger(name: str) -> logging.Logger:
+    logger = CustomLogger(name)
+    logger.setLevel(Config.LOG_LEVEL)
+    logger.addFilter(DebugSampler(Config.LOG_DEBUG_SAMPLE_RATE, parse_sample_rates(Config.LOG_DEBUG_SAMPLE_RATES)))
+
+    # callers only enqueue; a listener thread formats and writes
+    log_queue = queue.Queue(Config.LOG_QUEUE_MAX_SIZE)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener = QueueListener(log_queue, *build_handlers(), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return logger
+
+logger = setup_logger(__name__)
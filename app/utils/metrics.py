@@ -0,0 +1,44 @@
+import threading
+from collections import defaultdict
+
+class Metrics:
+    """In-process counters, gauges and summaries, exposed through the admin metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._summaries = {}
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            summary = self._summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def average(self, name: str, default: float = 0.0) -> float:
+        with self._lock:
+            summary = self._summaries.get(name)
+            return summary["sum"] / summary["count"] if summary and summary["count"] else default
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {
+                    name: {**summary, "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0}
+                    for name, summary in self._summaries.items()
+                }
+            }
+
+metrics = Metrics()
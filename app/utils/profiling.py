@@ -0,0 +1,230 @@
+import asyncio
+import cProfile
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from config import Config
+from utils.logger import logger
+from utils.metrics import metrics
+
+class CaptureRule:
+    """Which requests to profile, set by an admin and switched off again after expires_at"""
+
+    def __init__(self, mode: str, route: str, min_duration_ms: float, expires_at: float, max_captures: int,
+                 sample_interval_ms: float):
+        self.mode = mode
+        self.route = route
+        self.route_pattern = re.compile(route)
+        self.min_duration_ms = min_duration_ms
+        self.expires_at = expires_at
+        self.remaining = max_captures
+        self.sample_interval_ms = sample_interval_ms
+
+    def matches(self, path: str) -> bool:
+        return self.remaining > 0 and time.monotonic() < self.expires_at and self.route_pattern.search(path) is not None
+
+    def describe(self) -> dict:
+        return {
+            "mode": self.mode,
+            "route": self.route,
+            "min_duration_ms": self.min_duration_ms,
+            "expires_in_seconds": max(0, round(self.expires_at - time.monotonic())),
+            "remaining_captures": self.remaining,
+            "sample_interval_ms": self.sample_interval_ms
+        }
+
+class StackSampler:
+    """Samples the event loop thread's stack from a helper thread, so awaits between frames are covered too"""
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        # waits up to one sample interval, so callers on the event loop run it in a thread
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def to_speedscope(self, name: str) -> dict:
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                sample.append(index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval_seconds * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": name,
+            "exporter": "nextech-shannon-api"
+        }
+
+class ProfileStore:
+    """On-disk ring of captured profiles: the oldest captures are deleted once max_captures is exceeded"""
+
+    EXTENSIONS = {"cprofile": "pstats", "sampling": "speedscope.json"}
+
+    def __init__(self, directory: str, max_captures: int):
+        if max_captures < 1:
+            raise ValueError(f"max_captures must be at least 1, got {max_captures}")
+        self.directory = Path(directory)
+        self.max_captures = max_captures
+
+    def _meta_paths(self) -> list:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.meta.json"))
+
+    def save(self, meta: dict, write_profile):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # ids start with a timestamp so sorting by name is sorting by age
+        capture_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        meta = {**meta, "capture_id": capture_id, "file": f"{capture_id}.{self.EXTENSIONS[meta['mode']]}"}
+        write_profile(self.directory / meta["file"])
+        (self.directory / f"{capture_id}.meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        meta_paths = self._meta_paths()
+        for old_meta in meta_paths[:max(0, len(meta_paths) - self.max_captures)]:
+            old = json.loads(old_meta.read_text(encoding="utf-8"))
+            (self.directory / old["file"]).unlink(missing_ok=True)
+            old_meta.unlink(missing_ok=True)
+        return meta
+
+    def list(self) -> list:
+        return [json.loads(path.read_text(encoding="utf-8")) for path in reversed(self._meta_paths())]
+
+    def get(self, capture_id: str) -> Optional[tuple[dict, Path]]:
+        path = self.directory / f"{capture_id}.meta.json"
+        # capture ids come from the URL, only accept ones we could have generated
+        if not re.fullmatch(r"[0-9T]+-[0-9a-f]{8}", capture_id) or not path.exists():
+            return None
+        meta = json.loads(path.read_text(encoding="utf-8"))
+        return meta, self.directory / meta["file"]
+
+class ProfilingControl:
+    """The active CaptureRule, if any, and where captures go"""
+
+    def __init__(self, store: ProfileStore):
+        self.store = store
+        self.rule: Optional[CaptureRule] = None
+        self.busy = False
+
+    def enable(self, rule: CaptureRule):
+        self.rule = rule
+        logger.info(f"Profiling enabled: {rule.describe()}")
+
+    def disable(self):
+        self.rule = None
+        logger.info("Profiling disabled")
+
+profiling = ProfilingControl(ProfileStore(Config.PROFILE_DIR, Config.PROFILE_MAX_CAPTURES))
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles the requests matched by the current CaptureRule. Without a rule the
+    only cost per request is one attribute check. The whole response is covered, including the body
+    of streaming responses. Only one request is profiled at a time: cProfile sees the entire event loop,
+    so concurrent requests show up in each other's profiles anyway.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        rule = profiling.rule
+        if rule is None or scope["type"] != "http" or profiling.busy or not rule.matches(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        if rule.mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # another profiler (a debugger, coverage) already owns the hook
+                await self.app(scope, receive, send)
+                return
+        else:
+            profiler = StackSampler(threading.get_ident(), rule.sample_interval_ms / 1000)
+            profiler.start()
+        profiling.busy = True
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if rule.mode == "cprofile":
+                profiler.disable()
+            else:
+                profiler.stop()
+                await asyncio.to_thread(profiler.join)
+            profiling.busy = False
+            if duration_ms >= rule.min_duration_ms:
+                rule.remaining -= 1
+                await asyncio.to_thread(self._save, rule, profiler, scope, status.get("code"), duration_ms)
+
+    def _save(self, rule: CaptureRule, profiler, scope, status_code: Optional[int], duration_ms: float):
+        name = f"{scope['method']} {scope['path']}"
+        if rule.mode == "cprofile":
+            write_profile = profiler.dump_stats
+        else:
+            write_profile = lambda path: path.write_text(json.dumps(profiler.to_speedscope(name)), encoding="utf-8")
+        try:
+            meta = profiling.store.save({
+                "mode": rule.mode,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round(duration_ms, 1),
+                "created_at": datetime.now().isoformat()
+            }, write_profile)
+            metrics.increment("profiling.captures")
+            logger.info(f"Captured {rule.mode} profile {meta['capture_id']} for {name} ({duration_ms:.0f} ms)")
+        except Exception as e:
+            logger.error(f"Error saving profile for {name}: {str(e)}")
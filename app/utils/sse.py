@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+_END = object()
+
+class ClientDisconnected(Exception):
+    """Raised from SSEStream.events when the client has gone away"""
+
+def format_sse_event(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+def format_sse_comment(text: str) -> str:
+    return f": {text}\n\n"
+
+class SSEStream:
+    """
+    Frames a token stream as server-sent events.
+    Tokens are coalesced into one event until coalesce_ms has passed since the first buffered token
+    or coalesce_bytes have accumulated, and a keep-alive comment is sent whenever the upstream has
+    been silent for heartbeat_seconds so proxies don't close the connection.
+    When is_disconnected is given it is polled every disconnect_poll_seconds, so a client that
+    went away is noticed even while nothing is being written to it.
+    """
+
+    def __init__(self, coalesce_ms: float, coalesce_bytes: int, heartbeat_seconds: float,
+                 is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None, disconnect_poll_seconds: float = 1.0):
+        self.coalesce_seconds = coalesce_ms / 1000
+        self.coalesce_bytes = coalesce_bytes
+        self.heartbeat_seconds = heartbeat_seconds
+        self.is_disconnected = is_disconnected
+        self.disconnect_poll_seconds = disconnect_poll_seconds
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.event_count = 0
+        self.token_count = 0
+        self.text = []
+
+    def event(self, payload: dict, event: Optional[str] = None) -> str:
+        self.event_count += 1
+        return format_sse_event(json.dumps(payload), event, self.event_count)
+
+    def timing(self) -> dict:
+        now = time.perf_counter()
+        return {
+            "time_to_first_token_ms": round((self.first_token_at - self.started_at) * 1000) if self.first_token_at else None,
+            "duration_ms": round((now - self.started_at) * 1000),
+            "tokens": self.token_count,
+            "events": self.event_count
+        }
+
+    def _flush(self, buffer: list) -> str:
+        content = ''.join(buffer)
+        buffer.clear()
+        return self.event({"content": content})
+
+    async def events(self, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for token in tokens:
+                    await queue.put(token)
+            except Exception as e:
+                await queue.put(e)
+            finally:
+                # also runs when the pump is cancelled, so the upstream response is closed right away
+                if hasattr(tokens, 'aclose'):
+                    await tokens.aclose()
+                await queue.put(_END)
+
+        pump_task = asyncio.create_task(pump())
+        buffer = []
+        buffered_bytes = 0
+        flush_at = None
+        sent_at = checked_at = time.perf_counter()
+        try:
+            while True:
+                now = time.perf_counter()
+                if self.is_disconnected is not None and now - checked_at >= self.disconnect_poll_seconds:
+                    checked_at = now
+                    if await self.is_disconnected():
+                        raise ClientDisconnected()
+                deadline = flush_at if buffer else sent_at + self.heartbeat_seconds
+                if self.is_disconnected is not None:
+                    deadline = min(deadline, checked_at + self.disconnect_poll_seconds)
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0, deadline - now))
+                except asyncio.TimeoutError:
+                    now = time.perf_counter()
+                    if buffer and now >= flush_at:
+                        buffered_bytes = 0
+                        sent_at = now
+                        yield self._flush(buffer)
+                    elif not buffer and now - sent_at >= self.heartbeat_seconds:
+                        sent_at = now
+                        yield format_sse_comment("keep-alive")
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                now = time.perf_counter()
+                if self.first_token_at is None:
+                    self.first_token_at = now
+                if not buffer:
+                    flush_at = now + self.coalesce_seconds
+                self.token_count += 1
+                self.text.append(item)
+                buffer.append(item)
+                buffered_bytes += len(item.encode('utf-8'))
+                if buffered_bytes >= self.coalesce_bytes or now >= flush_at:
+                    buffered_bytes = 0
+                    sent_at = now
+                    yield self._flush(buffer)
+            if buffer:
+                yield self._flush(buffer)
+        finally:
+            # closing the pump also closes the upstream generator and its HTTP response
+            pump_task.cancel()
+            try:
+                await pump_task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,129 @@
+"""
+Jira REST stub for local testing of the Jira integration.
+
+Serves GET /rest/api/latest/search and /rest/api/latest/issue/{key} over a generated set of issues
+with wiki markup (or, with --adf, Atlassian document) descriptions, with a configurable latency and
+page size cap. GET /stats reports request counts and the highest number of concurrent searches.
+Point the API at it with JIRA_BASE_URL=http://localhost:8200
+
+    python jira_stub.py --port 8200 --issues 250 --latency-ms 200 --max-page-size 50
+"""
+import argparse
+import asyncio
+import random
+import re
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+class StubSettings:
+    issues = 250
+    project = "SHN"
+    latency_ms = 200.0
+    max_page_size = 50  # Jira Cloud caps maxResults, the client has to follow the returned value
+    adf = False
+
+settings = StubSettings()
+app = FastAPI()
+stats = {"searches": 0, "issue_requests": 0, "in_flight": 0, "max_in_flight": 0}
+
+def wiki_description(number: int) -> str:
+    return (
+        f"h2. Story {number}\n"
+        f"As a *user* I want feature {number} so that _things_ work.\n\n"
+        "* first requirement\n"
+        "** nested detail with {{code}}\n"
+        f"* see [the spec|https://example.com/spec/{number}]\n\n"
+        "{code:python}\nprint('hello')\n{code}\n"
+        "||Field||Value||\n|priority|high|\n"
+    )
+
+def adf_description(number: int) -> dict:
+    text = lambda value, **extra: {"type": "text", "text": value, **extra}
+    return {"type": "doc", "version": 1, "content": [
+        {"type": "heading", "attrs": {"level": 2}, "content": [text(f"Story {number}")]},
+        {"type": "paragraph", "content": [
+            text("As a "), text("user", marks=[{"type": "strong"}]), text(f" I want feature {number}.")
+        ]},
+        {"type": "bulletList", "content": [
+            {"type": "listItem", "content": [{"type": "paragraph", "content": [text("first requirement")]}]},
+            {"type": "listItem", "content": [{"type": "paragraph", "content": [
+                text("the spec", marks=[{"type": "link", "attrs": {"href": f"https://example.com/spec/{number}"}}])
+            ]}]}
+        ]},
+        {"type": "codeBlock", "content": [text("print('hello')")]}
+    ]}
+
+def make_issue(number: int) -> dict:
+    key = f"{settings.project}-{number}"
+    return {
+        "id": str(10000 + number),
+        "key": key,
+        "fields": {
+            "summary": f"Generated story {number}",
+            "description": adf_description(number) if settings.adf else wiki_description(number)
+        }
+    }
+
+def matching_numbers(jql: str) -> list:
+    numbers = list(range(1, settings.issues + 1))
+    keys = re.search(r'key\s+in\s*\(([^)]*)\)', jql, re.IGNORECASE)
+    if keys:
+        wanted = {key.strip().strip('"\'') for key in keys.group(1).split(',')}
+        numbers = [n for n in numbers if f"{settings.project}-{n}" in wanted]
+    return numbers
+
+async def simulated_latency():
+    await asyncio.sleep(max(0.0, settings.latency_ms / 1000 * random.uniform(0.8, 1.2)))
+
+@app.get("/rest/api/latest/search")
+async def search(request: Request):
+    params = request.query_params
+    start_at = int(params.get("startAt", 0))
+    max_results = min(int(params.get("maxResults", 50)), settings.max_page_size)
+    stats["searches"] += 1
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await simulated_latency()
+        numbers = matching_numbers(params.get("jql", ""))
+        page = numbers[start_at:start_at + max_results]
+        return {
+            "startAt": start_at,
+            "maxResults": max_results,
+            "total": len(numbers),
+            "issues": [make_issue(n) for n in page]
+        }
+    finally:
+        stats["in_flight"] -= 1
+
+@app.get("/rest/api/latest/issue/{key}")
+async def issue(key: str):
+    stats["issue_requests"] += 1
+    await simulated_latency()
+    match = re.fullmatch(rf"{settings.project}-(\d+)", key)
+    if not match or not 1 <= int(match.group(1)) <= settings.issues:
+        return JSONResponse({"errorMessages": ["Issue does not exist"]}, status_code=404)
+    return make_issue(int(match.group(1)))
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Jira REST stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--issues", type=int, default=settings.issues)
+    parser.add_argument("--project", default=settings.project)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms)
+    parser.add_argument("--max-page-size", type=int, default=settings.max_page_size)
+    parser.add_argument("--adf", action="store_true", help="serve descriptions as Atlassian documents")
+    args = parser.parse_args()
+    for name, value in vars(args).items():
+        if hasattr(settings, name):
+            setattr(settings, name, value)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
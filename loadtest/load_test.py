@@ -0,0 +1,181 @@
+"""
+Streaming load generator for /api/llm-query/stream/.
+
+Keeps --concurrency streams open until --requests have completed and reports p50/p95/p99 time to
+first token, gap between content events and request duration, plus aggregate throughput.
+
+    python load_test.py --secret-key $SECRET_KEY --concurrency 20 --requests 200 --output baseline.json
+
+With --baseline the report is compared with an earlier one, which must have been recorded on the
+same Python minor version: the interpreter alone moves these numbers.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import platform
+import time
+import httpx
+import jwt
+
+def percentile(values: list, pct: float):
+    # nearest-rank, so the reported value is one that was actually observed
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)], 2)
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 2) if values else None
+    }
+
+def make_token(secret_key: str, username: str) -> str:
+    payload = {
+        "username": username,
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+        "is_admin": False
+    }
+    return jwt.encode(payload, secret_key, algorithm="HS256")
+
+async def read_events(response: httpx.Response):
+    event, data = None, []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
+async def run_stream(client: httpx.AsyncClient, url: str, headers: dict, body: dict) -> dict:
+    result = {"ok": False, "ttft_ms": None, "gaps_ms": [], "tokens": 0, "duration_ms": None, "error": None}
+    started = time.perf_counter()
+    last_event_at = None
+    try:
+        async with client.stream("POST", url, headers=headers, json=body) as response:
+            if response.status_code != 200:
+                await response.aread()
+                result["error"] = f"HTTP {response.status_code}"
+                return result
+            async for event, data in read_events(response):
+                now = time.perf_counter()
+                if event == "error":
+                    result["error"] = json.loads(data).get("error")
+                    return result
+                if event == "done":
+                    done = json.loads(data)
+                    result["tokens"] = (done.get("usage") or {}).get("completion_tokens") or done.get("timing", {}).get("tokens", 0)
+                    result["ok"] = True
+                    continue
+                if result["ttft_ms"] is None:
+                    result["ttft_ms"] = (now - started) * 1000
+                else:
+                    result["gaps_ms"].append((now - last_event_at) * 1000)
+                last_event_at = now
+    except httpx.HTTPError as e:
+        result["error"] = type(e).__name__
+    finally:
+        result["duration_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+async def run(args) -> dict:
+    token = args.token or make_token(args.secret_key, args.username)
+    headers = {"Authorization": f"Bearer {token}", "X-LLM-Cache": "bypass"}
+    body = {"messages": [{"role": "user", "content": args.prompt, "sequence": 0}]}
+    remaining = args.requests
+    results = []
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            results.append(await run_stream(client, args.url, headers, body))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout), limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    succeeded = [result for result in results if result["ok"]]
+    errors = {}
+    for result in results:
+        if not result["ok"]:
+            errors[str(result["error"])] = errors.get(str(result["error"]), 0) + 1
+    return {
+        "label": args.label,
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "machine": platform.machine()},
+        "settings": {"url": args.url, "concurrency": args.concurrency, "requests": args.requests},
+        "elapsed_seconds": round(elapsed, 2),
+        "succeeded": len(succeeded),
+        "errors": errors,
+        "time_to_first_token_ms": summarize([result["ttft_ms"] for result in succeeded if result["ttft_ms"] is not None]),
+        "inter_event_gap_ms": summarize([gap for result in succeeded for gap in result["gaps_ms"]]),
+        "duration_ms": summarize([result["duration_ms"] for result in succeeded]),
+        "throughput": {
+            "requests_per_second": round(len(succeeded) / elapsed, 2),
+            "tokens_per_second": round(sum(result["tokens"] for result in succeeded) / elapsed, 2)
+        }
+    }
+
+def python_minor(version: str) -> str:
+    return ".".join(version.split(".")[:2])
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Relative change of each latency percentile and of the throughput, in percent of the baseline"""
+    changes = {}
+    for metric in ("time_to_first_token_ms", "inter_event_gap_ms", "duration_ms"):
+        changes[metric] = {
+            pct: round((report[metric][pct] - baseline[metric][pct]) / baseline[metric][pct] * 100, 1)
+            for pct in ("p50", "p95", "p99") if report[metric][pct] and baseline[metric][pct]
+        }
+    changes["throughput"] = {
+        key: round((report["throughput"][key] - value) / value * 100, 1)
+        for key, value in baseline["throughput"].items() if value
+    }
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the streaming chat endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api/llm-query/stream/")
+    parser.add_argument("--token", help="JWT to send; generated from --secret-key when omitted")
+    parser.add_argument("--secret-key")
+    parser.add_argument("--username", default="loadtest")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--prompt", default="Summarize the benefits of streaming responses in two paragraphs.")
+    parser.add_argument("--label", default="local")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare the report with this earlier report, e.g. baseline.json")
+    args = parser.parse_args()
+    if not args.token and not args.secret_key:
+        parser.error("either --token or --secret-key is required")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        recorded_on = baseline.get("environment", {}).get("python", "unknown")
+        if python_minor(recorded_on) != python_minor(platform.python_version()):
+            parser.error(f"{args.baseline} was recorded on Python {recorded_on}, this is Python {platform.python_version()}; "
+                         f"run the API and the load test on Python {python_minor(recorded_on)} or record a new baseline")
+    report = asyncio.run(run(args))
+    if baseline is not None:
+        report["compared_with"] = {"baseline": args.baseline, "change_percent": compare(report, baseline)}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Event-loop time spent in logging per streamed chat request.
+
+Runs chat_with_llm_stream against a mocked deployment with a realistic request (long history, an
+inline image, several project contexts) and adds up the time spent inside logging calls and in
+rendering what they log, first through the queue pipeline and then with the old setup: text
+lines written synchronously by the calling thread and payloads rendered with str().
+
+    cd app && python ../loadtest/logging_benchmark.py --requests 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("AZURE_STORAGE_ACCOUNT_NAME", "benchmark")
+os.environ.setdefault("MAX_TOKENS", "128000")
+os.environ.setdefault("AZURE_OPENAI_URL", "http://stub/")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+# log lines go to stdout, keep the real stdout for the report
+report_stream = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+
+import httpx
+from models import Message, Context
+from services import llm_service
+from utils import logger as logger_module
+from utils.logger import CustomLogger
+
+timings = {"seconds": 0.0, "calls": 0}
+
+def timed(function):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings["seconds"] += time.perf_counter() - started
+            timings["calls"] += 1
+    return wrapper
+
+def stub_handler(request: httpx.Request) -> httpx.Response:
+    chunks = "".join(
+        "data: " + json.dumps({"choices": [{"delta": {"content": f" word{i}"}, "finish_reason": None}]}) + "\n\n"
+        for i in range(200)
+    )
+    return httpx.Response(200, content=(chunks + "data: [DONE]\n\n").encode())
+
+def build_request():
+    image = Context(type="image", name="screenshot.jpg", content="A" * 200_000)
+    messages = [
+        Message(role="user" if i % 2 == 0 else "assistant", content=f"message {i} " + "lorem ipsum " * 200, sequence=i)
+        for i in range(20)
+    ]
+    messages.append(Message(role="user", content="What is in this picture?", sequence=20, contexts=[image]))
+    contexts = [Context(type="file", name=f"spec-{i}.md", content="requirement " * 2000, project_id="p") for i in range(5)]
+    return messages, contexts
+
+async def run_requests(count: int) -> float:
+    messages, contexts = build_request()
+    timings.update(seconds=0.0, calls=0)
+    for _ in range(count):
+        async for _ in llm_service.chat_with_llm_stream(messages, contexts, use_cache=False, stream_info={}):
+            pass
+    return timings["seconds"] / count
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logging cost per streamed chat request")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    original_init = httpx.AsyncClient.__init__
+    def init(self, *a, **k):
+        k["transport"] = httpx.MockTransport(stub_handler)
+        original_init(self, *a, **k)
+    httpx.AsyncClient.__init__ = init
+
+    CustomLogger._log = timed(CustomLogger._log)
+    llm_service.loggable = timed(llm_service.loggable)
+    llm_service.truncate = timed(llm_service.truncate)
+    logger = logger_module.logger
+
+    asyncio.run(run_requests(2))  # warm up imports, encodings and connection setup
+    pipeline = asyncio.run(run_requests(args.requests))
+
+    # the previous setup: synchronous text handlers and whole payloads rendered into the message
+    queue_handlers = logger.handlers
+    text_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    direct_handlers = logger_module.build_handlers()
+    for handler in direct_handlers:
+        handler.setFormatter(text_formatter)
+    logger.handlers = direct_handlers
+    llm_service.loggable = timed(str)
+    llm_service.truncate = timed(str)
+    synchronous = asyncio.run(run_requests(args.requests))
+    logger.handlers = queue_handlers
+
+    report = {
+        "requests": args.requests,
+        "logging_ms_per_request": {
+            "queue_pipeline": round(pipeline * 1000, 3),
+            "synchronous_full_payloads": round(synchronous * 1000, 3)
+        }
+    }
+    print(json.dumps(report, indent=2), file=report_stream)
+
+if __name__ == "__main__":
+    main()
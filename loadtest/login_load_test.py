@@ -0,0 +1,78 @@
+"""
+Concurrent logins while a chat stream is open.
+
+Opens one /api/llm-query/stream/ request, then fires --logins concurrent POST /api/login/ calls
+and reports login latency and status codes together with the largest gap between events on the
+open stream. With password hashing on the event loop the stream stalls for the whole burst; with
+it offloaded the gap stays close to the stub's token interval.
+
+    python login_load_test.py --secret-key $SECRET_KEY --username alice --password secret --logins 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+import httpx
+from load_test import make_token, read_events, summarize
+
+async def watch_stream(client: httpx.AsyncClient, url: str, token: str, gaps: list, started: asyncio.Event):
+    headers = {"Authorization": f"Bearer {token}", "X-LLM-Cache": "bypass"}
+    body = {"messages": [{"role": "user", "content": "Write a long story.", "sequence": 0}]}
+    last_event_at = None
+    async with client.stream("POST", url, headers=headers, json=body) as response:
+        async for event, data in read_events(response):
+            now = time.perf_counter()
+            if last_event_at is not None:
+                gaps.append((now - last_event_at) * 1000)
+            else:
+                started.set()
+            last_event_at = now
+            if event in ("done", "error"):
+                break
+
+async def login(client: httpx.AsyncClient, url: str, username: str, password: str) -> tuple:
+    started = time.perf_counter()
+    response = await client.post(url, json={"username": username, "password": password})
+    return response.status_code, (time.perf_counter() - started) * 1000
+
+async def run(args) -> dict:
+    token = args.token or make_token(args.secret_key, args.username)
+    gaps = []
+    stream_started = asyncio.Event()
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=httpx.Timeout(120),
+                                 limits=httpx.Limits(max_connections=args.logins + 1)) as client:
+        stream = asyncio.create_task(watch_stream(client, "/api/llm-query/stream/", token, gaps, stream_started))
+        await asyncio.wait_for(stream_started.wait(), 30)
+        gaps.clear()  # only gaps during the burst count
+        started = time.perf_counter()
+        results = await asyncio.gather(*(login(client, "/api/login/", args.username, args.password) for _ in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        # let the stream deliver its next event, so a stall that lasted the whole burst is counted too
+        await asyncio.sleep(1)
+        burst_gaps = list(gaps)
+        stream.cancel()
+        await asyncio.gather(stream, return_exceptions=True)
+    return {
+        "logins": args.logins,
+        "elapsed_seconds": round(elapsed, 2),
+        "status_codes": dict(Counter(status for status, _ in results)),
+        "login_ms": summarize([ms for _, ms in results]),
+        "stream_gap_ms_during_logins": summarize(burst_gaps)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent logins against an open chat stream")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", help="JWT for the stream; generated from --secret-key when omitted")
+    parser.add_argument("--secret-key")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+    if not args.token and not args.secret_key:
+        parser.error("either --token or --secret-key is required")
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Prompt packing time for long conversations.
+
+Builds a conversation of --messages turns (every few user turns attach one of ten specs, so most
+attachments repeat an earlier one, and the first turn carries a pinned context) and packs it into a
+few window sizes, reporting the median packing time and how many texts were tokenized. Packing
+stops at the window, so the time follows the size of the kept history rather than the length of
+the conversation; with a window everything fits into it is linear in the history, the 1,000 message
+run taking about twice the 500 message one.
+
+    cd app && python ../loadtest/packing_benchmark.py --messages 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("AZURE_STORAGE_ACCOUNT_NAME", "benchmark")
+os.environ.setdefault("MAX_TOKENS", "128000")
+
+from models import Message, Context
+from services import prompt_packer
+
+class CountingEncoding:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return self.encoding.encode(text)
+
+    def decode(self, tokens):
+        return self.encoding.decode(tokens)
+
+def build_conversation(count: int) -> list:
+    messages = []
+    for sequence in range(count):
+        role = "user" if sequence % 2 == 0 else "assistant"
+        contexts = []
+        if role == "user" and sequence % 6 == 0:
+            spec = (sequence // 6) % 10
+            contexts.append(Context(context_id=f"spec-{sequence}", type="file", content=f"spec {spec} " + "requirement text " * 150))
+        if sequence == 0:
+            contexts.append(Context(context_id="pinned", type="url", content="pinned reference " * 200, pinned=True))
+        content = f"question {sequence} " + "about the design " * 40 if role == "user" else f"answer {sequence} " + "explaining the design " * 90
+        messages.append(Message(message_id=f"m{sequence}", content=content, role=role, sequence=sequence, contexts=contexts))
+    return messages
+
+def measure(messages: list, project_contexts: list, max_tokens: int, repeats: int, counter: CountingEncoding) -> dict:
+    timings = []
+    for _ in range(repeats):
+        counter.calls = 0
+        started = time.perf_counter()
+        result = prompt_packer.pack_chat_messages(messages, project_contexts, max_tokens=max_tokens, reserved_tokens=500, layout="stable_prefix")
+        timings.append(time.perf_counter() - started)
+    return {
+        "max_tokens": max_tokens,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "tokenized_texts": counter.calls,
+        "kept_messages": len(result.messages),
+        "dropped_messages": len(result.dropped_message_sequences),
+        "dropped_contexts": len(result.dropped_contexts),
+        "deduplicated_contexts": result.deduplicated_contexts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prompt packing time")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[8000, 128000, 1000000])
+    args = parser.parse_args()
+
+    counter = CountingEncoding(prompt_packer.get_encoding())
+    prompt_packer.get_encoding = lambda model="gpt-4": counter
+    project_contexts = [Context(context_id=f"project-{i}", type="file", content=f"project doc {i} " + "background " * 300) for i in range(3)]
+    report = {"messages": args.messages, "runs": {}}
+    for count in (args.messages // 2, args.messages):
+        messages = build_conversation(count)
+        report["runs"][str(count)] = [measure(messages, project_contexts, max_tokens, args.repeats, counter) for max_tokens in args.max_tokens]
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Event writes and client CPU of the streaming endpoint with and without token coalescing.
+
+Starts the stub and two API instances, one with SSE_COALESCE_MS=0 (an event per token, as before
+coalescing) and one with the configured SSE_COALESCE_MS/SSE_COALESCE_BYTES, and reads --streams
+concurrent streams from each. Reports the events and network reads per stream, the CPU seconds this
+process spent reading the streams and, on Linux, the CPU seconds of the API process.
+
+    cd app && python ../loadtest/sse_benchmark.py --streams 100 --tokens-per-second 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+import httpx
+from load_test import make_token, summarize
+
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_openai.py")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def process_cpu_seconds(pid: int):
+    # utime and stime from /proc, in clock ticks
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+def start(command: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(command, cwd=os.getcwd(), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_until_listening(port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server on port {port} exited with {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+async def read_stream(client: httpx.AsyncClient, url: str, headers: dict, body: dict) -> dict:
+    result = {"ok": False, "events": 0, "reads": 0, "bytes": 0}
+    buffer = b""
+    async with client.stream("POST", url, headers=headers, json=body) as response:
+        async for chunk in response.aiter_raw():
+            result["reads"] += 1
+            result["bytes"] += len(chunk)
+            buffer += chunk
+            *events, buffer = buffer.split(b"\n\n")
+            for event in events:
+                result["events"] += 1
+                if event.startswith(b"id:") and b"\nevent: done" in event:
+                    result["ok"] = True
+    return result
+
+async def drive(url: str, token: str, streams: int, prompt: str) -> tuple[list, float, float]:
+    headers = {"Authorization": f"Bearer {token}", "X-LLM-Cache": "bypass"}
+    body = {"messages": [{"role": "user", "content": prompt, "sequence": 0}]}
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=streams)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120), limits=limits) as client:
+        cpu_started, started = time.process_time(), time.perf_counter()
+        results = await asyncio.gather(*(read_stream(client, url, headers, body) for _ in range(streams)))
+        return results, time.process_time() - cpu_started, time.perf_counter() - started
+
+def run(label: str, coalesce_ms: float, args, env: dict, token: str) -> dict:
+    port = free_port()
+    api = start([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                {**env, "SSE_COALESCE_MS": str(coalesce_ms)})
+    try:
+        wait_until_listening(port, api)
+        url = f"http://127.0.0.1:{port}/api/llm-query/stream/"
+        # one stream first so lazy initialization isn't measured
+        asyncio.run(drive(url, token, 1, args.prompt))
+        api_cpu_started = process_cpu_seconds(api.pid)
+        results, client_cpu, elapsed = asyncio.run(drive(url, token, args.streams, args.prompt))
+        api_cpu = process_cpu_seconds(api.pid)
+    finally:
+        api.terminate()
+        api.wait()
+    return {
+        "label": label,
+        "coalesce_ms": coalesce_ms,
+        "succeeded": sum(result["ok"] for result in results),
+        "events_per_stream": summarize([result["events"] for result in results]),
+        "reads_per_stream": summarize([result["reads"] for result in results]),
+        "total_events": sum(result["events"] for result in results),
+        "total_bytes": sum(result["bytes"] for result in results),
+        "client_cpu_seconds": round(client_cpu, 3),
+        "api_cpu_seconds": round(api_cpu - api_cpu_started, 3) if api_cpu is not None else None,
+        "elapsed_seconds": round(elapsed, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SSE writes and client CPU with and without coalescing")
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--coalesce-ms", type=float, default=float(os.getenv("SSE_COALESCE_MS", 50)))
+    parser.add_argument("--prompt", default="Summarize the benefits of streaming responses in two paragraphs.")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = start([sys.executable, STUB, "--port", str(stub_port), "--tokens-per-second", str(args.tokens_per_second),
+                  "--completion-tokens", str(args.completion_tokens), "--ttft-ms", str(args.ttft_ms)], dict(os.environ))
+    secret_key = secrets.token_hex(16)
+    env = {
+        **os.environ,
+        "SECRET_KEY": secret_key,
+        "AZURE_STORAGE_ACCOUNT_NAME": os.getenv("AZURE_STORAGE_ACCOUNT_NAME", "benchmark"),
+        "MAX_TOKENS": os.getenv("MAX_TOKENS", "128000"),
+        "AZURE_OPENAI_URL": f"http://127.0.0.1:{stub_port}/",
+        "AZURE_OPENAI_API_KEY": "stub",
+        "LLM_MAX_CONCURRENCY": str(args.streams),
+        "LLM_CACHE_ENABLED": "false",
+        "JIRA_ENRICHMENT_ENABLED": "false"
+    }
+    try:
+        wait_until_listening(stub_port, stub)
+        token = make_token(secret_key, "sse-benchmark")
+        report = {
+            "streams": args.streams,
+            "stub": {"tokens_per_second": args.tokens_per_second, "completion_tokens": args.completion_tokens},
+            "runs": [run("event per token", 0, args, env, token), run("coalesced", args.coalesce_ms, args, env, token)]
+        }
+    finally:
+        stub.terminate()
+        stub.wait()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
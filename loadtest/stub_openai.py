@@ -0,0 +1,139 @@
+"""
+Azure OpenAI compatible stub for local testing and load tests.
+
+Serves POST /openai/deployments/{model}/chat/completions in streaming and non-streaming mode with
+a configurable time to first token, token rate and failure injection, so the chat path can be
+exercised without a real deployment. Point the API at it with AZURE_OPENAI_URL=http://localhost:8100/
+
+    python stub_openai.py --port 8100 --tokens-per-second 50 --ttft-ms 300 --error-rate 0.01 --throttle-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+class StubSettings:
+    tokens_per_second = 50.0
+    ttft_ms = 300.0
+    jitter = 0.2  # +/- fraction applied to every delay
+    completion_tokens = 200
+    error_rate = 0.0  # share of requests answered with a 500
+    throttle_rate = 0.0  # share of requests answered with a 429
+    retry_after_ms = 1000
+    midstream_error_rate = 0.0  # share of streams that are cut off halfway
+
+settings = StubSettings()
+app = FastAPI()
+stats = {"requests": 0, "streams": 0, "errors": 0, "throttled": 0, "cancelled": 0}
+
+WORDS = ("the quick brown fox jumps over the lazy dog while a stub model pretends to think about "
+         "latency throughput and tail percentiles of streaming completions").split()
+
+def jittered(seconds: float) -> float:
+    return max(0.0, seconds * random.uniform(1 - settings.jitter, 1 + settings.jitter))
+
+def completion_length(payload: dict) -> int:
+    return max(1, min(settings.completion_tokens, payload.get("max_tokens") or settings.completion_tokens))
+
+def chunk(completion_id: str, model: str, content: str = None, finish_reason: str = None) -> str:
+    delta = {"content": content} if content is not None else {}
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }) + "\n\n"
+
+def usage(payload: dict, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in payload.get("messages", []))
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+@app.post("/openai/deployments/{model}/chat/completions")
+async def chat_completions(model: str, request: Request):
+    payload = await request.json()
+    stats["requests"] += 1
+    roll = random.random()
+    if roll < settings.throttle_rate:
+        stats["throttled"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": "429", "message": "Rate limit is exceeded."}},
+            headers={"retry-after-ms": str(settings.retry_after_ms), "retry-after": str(max(1, settings.retry_after_ms // 1000))}
+        )
+    if roll < settings.throttle_rate + settings.error_rate:
+        stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": {"code": "500", "message": "Injected failure"}})
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    tokens = completion_length(payload)
+    token_seconds = 1 / settings.tokens_per_second if settings.tokens_per_second else 0
+
+    if not payload.get("stream"):
+        await asyncio.sleep(jittered(settings.ttft_ms / 1000) + tokens * token_seconds)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(random.choice(WORDS) for _ in range(tokens))},
+                "finish_reason": "stop" if tokens < (payload.get("max_tokens") or tokens + 1) else "length"
+            }],
+            "usage": usage(payload, tokens)
+        }
+
+    stats["streams"] += 1
+    cut_off_at = tokens // 2 if random.random() < settings.midstream_error_rate else None
+
+    async def stream():
+        try:
+            await asyncio.sleep(jittered(settings.ttft_ms / 1000))
+            yield chunk(completion_id, model, content="")
+            for i in range(tokens):
+                if i == cut_off_at:
+                    stats["errors"] += 1
+                    raise RuntimeError("Injected mid-stream failure")
+                if i:
+                    await asyncio.sleep(jittered(token_seconds))
+                yield chunk(completion_id, model, content=("" if i == 0 else " ") + random.choice(WORDS))
+            yield chunk(completion_id, model, finish_reason="stop")
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({"id": completion_id, "choices": [], "usage": usage(payload, tokens)}) + "\n\n"
+            yield "data: [DONE]\n\n"
+        except asyncio.CancelledError:
+            stats["cancelled"] += 1
+            raise
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+def main():
+    parser = argparse.ArgumentParser(description="Azure OpenAI compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--ttft-ms", type=float, default=settings.ttft_ms)
+    parser.add_argument("--jitter", type=float, default=settings.jitter)
+    parser.add_argument("--completion-tokens", type=int, default=settings.completion_tokens)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=settings.throttle_rate)
+    parser.add_argument("--retry-after-ms", type=int, default=settings.retry_after_ms)
+    parser.add_argument("--midstream-error-rate", type=float, default=settings.midstream_error_rate)
+    args = parser.parse_args()
+    for name, value in vars(args).items():
+        if hasattr(settings, name):
+            setattr(settings, name, value)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
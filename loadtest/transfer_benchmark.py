@@ -0,0 +1,183 @@
+"""
+Export and import throughput on a seeded dataset.
+
+Seeds in-memory tables and a blob container that sleep --latency-ms on every storage call, then
+exports the user's data and imports it into another account, first one storage request at a time
+(no read-ahead, one row per write) and then with the configured read-ahead and batched writes.
+Reports records per second and the number of storage calls.
+
+    cd app && python ../loadtest/transfer_benchmark.py --conversations 200 --messages 20 --latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("AZURE_STORAGE_ACCOUNT_NAME", "benchmark")
+os.environ.setdefault("MAX_TOKENS", "128000")
+os.environ.setdefault("SEARCH_INDEX_PATH", os.path.join(tempfile.mkdtemp(), "search.db"))
+
+# log lines go to stdout, keep the real stdout for the report
+report_stream = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+
+from config import Config
+from services import backup_service as backup_module
+from services.backup_service import BackupService
+
+INDEXED_FIELDS = ("username", "conversation_id", "message_id", "project_id")
+
+class LatencyTable:
+    """Stands in for a TableClient: every call costs one round trip, queries are indexed lookups"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.index = defaultdict(list)
+        self.calls = 0
+
+    def _round_trip(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def add(self, entity: dict):
+        for field in INDEXED_FIELDS:
+            if entity.get(field):
+                self.index[(field, entity[field])].append(dict(entity))
+
+    def create_entity(self, entity):
+        self._round_trip()
+        self.add(entity)
+
+    def submit_transaction(self, operations):
+        self._round_trip()
+        for _, entity in operations:
+            self.add(entity)
+
+    def query_entities(self, query_filter, **kwargs):
+        self._round_trip()
+        conditions = [condition for condition in re.findall(r"(\w+) eq '([^']*)'", query_filter) if condition[0] != "PartitionKey"]
+        return list(self.index[conditions[0]])
+
+class LatencyBlob:
+    def __init__(self, container, name: str):
+        self.container = container
+        self.name = name
+
+    def upload_blob(self, data, **kwargs):
+        self.container._round_trip()
+        self.container.blobs[self.name] = data
+
+    def download_blob(self, **kwargs):
+        self.container._round_trip()
+        data = self.container.blobs[self.name]
+        return type("Download", (), {"readall": lambda _: data.encode()})()
+
+class LatencyContainer(LatencyTable):
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.blobs = {}
+
+    def get_blob_client(self, name: str):
+        return LatencyBlob(self, name)
+
+def install_storage(latency: float) -> dict:
+    stores = {}
+    get_table = lambda name: stores.setdefault(name, LatencyTable(latency))
+    get_container = lambda name: stores.setdefault(name, LatencyContainer(latency))
+    for module in list(sys.modules.values()):
+        if getattr(module, "__name__", "").startswith("services."):
+            if hasattr(module, "get_table_client"):
+                module.get_table_client = get_table
+            if hasattr(module, "get_blob_container_client"):
+                module.get_blob_container_client = get_container
+    return stores
+
+def seed(stores: dict, args) -> int:
+    latency = args.latency_ms / 1000
+    table = lambda name: stores.setdefault(name, LatencyTable(latency))
+    container = stores.setdefault(Config.AZURE_STORAGE_CONTEXTS_BLOB_CONTAINER, LatencyContainer(latency))
+    projects, conversations = table(Config.AZURE_STORAGE_PROJECTS_TABLE_NAME), table(Config.AZURE_STORAGE_CONVERSATIONS_TABLE_NAME)
+    messages, contexts = table(Config.AZURE_STORAGE_MESSAGES_TABLE_NAME), table(Config.AZURE_STORAGE_CONTEXTS_TABLE_NAME)
+    records = 0
+    for p in range(args.projects):
+        project_id = f"project-{p}"
+        projects.add({"PartitionKey": "projects", "RowKey": project_id, "name": f"Project {p}", "username": "seed", "is_public": False})
+        for i in range(args.project_contexts):
+            context_id = f"{project_id}-context-{i}"
+            contexts.add({"PartitionKey": "contexts", "RowKey": context_id, "name": f"spec-{i}.md", "type": "file",
+                                         "blob_name": f"{context_id}.json", "project_id": project_id, "pinned": False})
+            container.blobs[f"{context_id}.json"] = json.dumps({"content": "requirement " * 500})
+        records += 1 + args.project_contexts
+    for c in range(args.conversations):
+        conversation_id = f"conversation-{c}"
+        conversations.add({"PartitionKey": "conversations", "RowKey": conversation_id, "conversation_id": conversation_id,
+                                               "username": "seed", "description": f"Conversation {c}", "project_id": f"project-{c % args.projects}",
+                                               "updated_at": "2024-01-01T00:00:00"})
+        for m in range(args.messages):
+            message_id = f"{conversation_id}-message-{m}"
+            messages.add({"PartitionKey": "messages", "RowKey": message_id, "message_id": message_id, "conversation_id": conversation_id,
+                                         "content": "lorem ipsum " * 100, "sequence": m, "role": "user" if m % 2 == 0 else "assistant", "is_partial": False})
+        records += 1 + args.messages
+    return records
+
+async def export(service: BackupService, username: str) -> list:
+    return [line async for line in service.export_user(username)]
+
+async def import_lines(service: BackupService, username: str, lines: list) -> dict:
+    async def chunks():
+        for line in lines:
+            yield line.encode()
+    return await service.import_user(username, chunks())
+
+def run(service: BackupService, stores: dict, records: int, username: str) -> dict:
+    calls_before = sum(store.calls for store in stores.values())
+    started = time.perf_counter()
+    lines = asyncio.run(export(service, "seed"))
+    export_seconds = time.perf_counter() - started
+    export_calls = sum(store.calls for store in stores.values()) - calls_before
+    started = time.perf_counter()
+    result = asyncio.run(import_lines(service, username, lines))
+    import_seconds = time.perf_counter() - started
+    import_calls = sum(store.calls for store in stores.values()) - calls_before - export_calls
+    assert sum(result["imported"].values()) == records, result
+    return {
+        "export_records_per_second": round(records / export_seconds),
+        "export_storage_calls": export_calls,
+        "import_records_per_second": round(records / import_seconds),
+        "import_storage_calls": import_calls
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure export and import throughput")
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--project-contexts", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    stores = install_storage(args.latency_ms / 1000)
+    records = seed(stores, args)
+
+    sequential = run(BackupService(workers=1, prefetch=1, batch_size=1), stores, records, "sequential")
+    pipelined = run(backup_module.backup_service, stores, records, "pipelined")
+
+    report = {
+        "records": records,
+        "latency_ms": args.latency_ms,
+        "one_request_at_a_time": sequential,
+        "pipelined_and_batched": {**pipelined, "prefetch": Config.EXPORT_PREFETCH, "workers": Config.EXPORT_READ_WORKERS,
+                                  "batch_size": Config.IMPORT_BATCH_SIZE}
+    }
+    print(json.dumps(report, indent=2), file=report_stream)
+
+if __name__ == "__main__":
+    main()